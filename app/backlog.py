@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+def _update_date(update: Update) -> Optional[datetime]:
+    """Время отправки обновления, если Telegram его сообщает.
+
+    У нажатий на кнопки собственного времени нет (message.date — это время
+    сообщения с кнопкой), поэтому их возраст неизвестен и они не отбрасываются.
+    """
+    for event in (update.message, update.edited_message):
+        if event is not None:
+            return event.date
+    return None
+
+
+async def drain_pending_updates(
+    bot: Bot,
+    dp: Dispatcher,
+    max_age: float,
+    concurrency: int,
+) -> Tuple[int, int]:
+    """Обрабатывает обновления, накопившиеся, пока бот был остановлен.
+
+    Обновления забираются пачками через getUpdates и передаются в диспетчер
+    не более чем по concurrency одновременно. Сообщения старше max_age секунд
+    пропускаются. Последний запрос подтверждает все полученные обновления,
+    поэтому дальнейший polling/вебхук их не получит повторно.
+    Возвращает (обработано, пропущено).
+    """
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    allowed_updates = dp.resolve_used_update_types()
+    tasks = set()
+    replayed = skipped = 0
+    offset = None
+
+    async def process(update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке отложенного обновления {update.update_id}: {e}")
+        finally:
+            semaphore.release()
+
+    while True:
+        updates = await bot.get_updates(
+            offset=offset, timeout=0, limit=100, allowed_updates=allowed_updates
+        )
+        if not updates:
+            break
+        now = datetime.now(timezone.utc)
+        for update in updates:
+            sent_at = _update_date(update)
+            if sent_at is not None and (now - sent_at).total_seconds() > max_age:
+                skipped += 1
+                continue
+            # Задачи стартуют в порядке update_id, семафор ограничивает параллельность
+            await semaphore.acquire()
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            replayed += 1
+        offset = updates[-1].update_id + 1
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    logger.info(
+        f"Отложенные обновления: обработано {replayed}, пропущено устаревших {skipped}, "
+        f"за {time.monotonic() - started:.2f} с"
+    )
+    return replayed, skipped
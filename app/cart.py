@@ -0,0 +1,71 @@
+from typing import Dict, List, Mapping, Optional
+
+from .catalog import get_catalog
+
+
+class Cart:
+    """Корзина пользователя с поддерживаемыми на лету суммой и числом товаров.
+
+    total и count обновляются при каждом add/clear, поэтому бейдж корзины,
+    итоги и экран оплаты не пересчитывают корзину целиком.
+    """
+
+    __slots__ = ("items", "count", "version", "_total", "_catalog_version")
+
+    def __init__(self, items: Optional[Mapping[str, int]] = None):
+        self.items: Dict[str, int] = {}
+        self.count = 0
+        # Растёт при каждом изменении — годится как ключ для кешей отрисовки
+        self.version = 0
+        self._total = 0
+        self._catalog_version = get_catalog().version
+        for cake_id, qty in (items or {}).items():
+            self.add(cake_id, qty)
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __repr__(self) -> str:
+        return f"Cart({self.items!r}, total={self.total}, count={self.count})"
+
+    @property
+    def total(self) -> int:
+        catalog = get_catalog()
+        if self._catalog_version != catalog.version:
+            # Каталог перезагружен — цены могли измениться, пересчитываем один раз
+            self._total = catalog.items_total(self.items)
+            self._catalog_version = catalog.version
+        return self._total
+
+    def qty(self, cake_id: str) -> int:
+        return self.items.get(cake_id, 0)
+
+    def add(self, cake_id: str, qty: int = 1) -> int:
+        """Добавляет qty штук позиции и возвращает её новое количество"""
+        total = self.total
+        new_qty = self.items.get(cake_id, 0) + qty
+        self.items[cake_id] = new_qty
+        self.count += qty
+        self._total = total + get_catalog().price(cake_id) * qty
+        self.version += 1
+        return new_qty
+
+    def drop_unknown(self) -> List[str]:
+        """Убирает позиции, которых больше нет в каталоге, и возвращает их id"""
+        catalog = get_catalog()
+        stale = [cake_id for cake_id in self.items if catalog.get(cake_id) is None]
+        for cake_id in stale:
+            # Цена снятой позиции уже 0, поэтому сумма не меняется
+            self.count -= self.items.pop(cake_id)
+        if stale:
+            self.version += 1
+        return stale
+
+    def clear(self) -> None:
+        self.items.clear()
+        self.count = 0
+        self._total = 0
+        self.version += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.items)
@@ -1,57 +1,125 @@
-from dataclasses import dataclass
-from typing import List, Optional
-
-
-@dataclass(frozen=True)
-class Cake:
-    id: str
-    name: str
-    price: int  # в рублях
-    description: str
-    photo_url: str  # URL фотографии торта
-
-
-CATALOG: List[Cake] = [
-    Cake(
-        id="honey",
-        name="Медовик",
-        price=1200,
-        description="Классический медовый торт со сметанным кремом, 1 кг",
-        photo_url="https://images.unsplash.com/photo-1578985545062-69928b1d9587?w=800&h=600&fit=crop&crop=center"
-    ),
-    Cake(
-        id="napoleon",
-        name="Наполеон",
-        price=1500,
-        description="Слоёный торт с заварным кремом, 1 кг",
-        photo_url="https://images.unsplash.com/photo-1565958011703-44f9829ba187?w=800&h=600&fit=crop&crop=center"
-    ),
-    Cake(
-        id="chocolate",
-        name="Шоколадный",
-        price=1300,
-        description="Насыщенный шоколадный бисквит с ганашем, 1 кг",
-        photo_url="https://images.unsplash.com/photo-1606313564200-e75d5e30476c?w=800&h=600&fit=crop&crop=center"
-    ),
-    Cake(
-        id="cheesecake",
-        name="Чизкейк",
-        price=1400,
-        description="Нью-Йорк на песочной основе, 1 кг",
-        photo_url="https://images.unsplash.com/photo-1533134242443-d4fd215305ad?w=800&h=600&fit=crop&crop=center"
-    ),
-    Cake(
-        id="carrot",
-        name="Морковный",
-        price=1250,
-        description="Пряный морковный бисквит с крем-чизом, 1 кг",
-        photo_url="https://images.unsplash.com/photo-1621303837174-89787a7d4729?w=800&h=600&fit=crop&crop=center"
-    ),
-]
-
-
-def get_cake_by_id(cake_id: str) -> Optional[Cake]:
-    for cake in CATALOG:
-        if cake.id == cake_id:
-            return cake
-    return None
+from dataclasses import dataclass
+from html import escape
+from typing import Dict, Iterator, List, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class Cake:
+    id: str
+    name: str
+    price: int  # в рублях
+    description: str
+    photo_url: str  # URL фотографии торта
+
+
+CATALOG: List[Cake] = [
+    Cake(
+        id="honey",
+        name="Медовик",
+        price=1200,
+        description="Классический медовый торт со сметанным кремом, 1 кг",
+        photo_url="https://images.unsplash.com/photo-1578985545062-69928b1d9587?w=800&h=600&fit=crop&crop=center"
+    ),
+    Cake(
+        id="napoleon",
+        name="Наполеон",
+        price=1500,
+        description="Слоёный торт с заварным кремом, 1 кг",
+        photo_url="https://images.unsplash.com/photo-1565958011703-44f9829ba187?w=800&h=600&fit=crop&crop=center"
+    ),
+    Cake(
+        id="chocolate",
+        name="Шоколадный",
+        price=1300,
+        description="Насыщенный шоколадный бисквит с ганашем, 1 кг",
+        photo_url="https://images.unsplash.com/photo-1606313564200-e75d5e30476c?w=800&h=600&fit=crop&crop=center"
+    ),
+    Cake(
+        id="cheesecake",
+        name="Чизкейк",
+        price=1400,
+        description="Нью-Йорк на песочной основе, 1 кг",
+        photo_url="https://images.unsplash.com/photo-1533134242443-d4fd215305ad?w=800&h=600&fit=crop&crop=center"
+    ),
+    Cake(
+        id="carrot",
+        name="Морковный",
+        price=1250,
+        description="Пряный морковный бисквит с крем-чизом, 1 кг",
+        photo_url="https://images.unsplash.com/photo-1621303837174-89787a7d4729?w=800&h=600&fit=crop&crop=center"
+    ),
+]
+
+
+class CatalogIndex:
+    """Неизменяемый индекс каталога: поиск по id за O(1) и готовые строки для вывода"""
+
+    def __init__(self, cakes: List[Cake], version: int = 1):
+        self.version = version
+        self.cakes = tuple(cakes)
+        self.by_id: Dict[str, Cake] = {cake.id: cake for cake in self.cakes}
+        self.prices: Dict[str, int] = {cake.id: cake.price for cake in self.cakes}
+        # Подпись кнопки в каталоге: «Медовик — 1200₽» (текст кнопок Telegram не разбирает как HTML)
+        self.button_labels: Dict[str, str] = {
+            cake.id: f"{cake.name} — {cake.price}₽" for cake in self.cakes
+        }
+        # Названия для текстов в ParseMode.HTML: «<» и «&» из файла каталога не ломают разметку
+        self.html_names: Dict[str, str] = {cake.id: escape(cake.name) for cake in self.cakes}
+        # Начало строки позиции корзины: «• Медовик × » — для HTML и для простого текста (всплывающих окон)
+        self._line_prefixes: Dict[str, str] = {
+            cake.id: f"• {self.html_names[cake.id]} × " for cake in self.cakes
+        }
+        self._plain_line_prefixes: Dict[str, str] = {cake.id: f"• {cake.name} × " for cake in self.cakes}
+
+    def __iter__(self) -> Iterator[Cake]:
+        return iter(self.cakes)
+
+    def __len__(self) -> int:
+        return len(self.cakes)
+
+    def get(self, cake_id: str) -> Optional[Cake]:
+        return self.by_id.get(cake_id)
+
+    def price(self, cake_id: str) -> int:
+        return self.prices.get(cake_id, 0)
+
+    def item_line(self, cake_id: str, qty: int, html: bool = True) -> Optional[str]:
+        prefix = (self._line_prefixes if html else self._plain_line_prefixes).get(cake_id)
+        if prefix is None:
+            return None
+        return f"{prefix}{qty} = {self.prices[cake_id] * qty}₽"
+
+    def item_lines(self, items: Mapping[str, int], html: bool = True) -> List[str]:
+        """Строки «• Название × N = сумма₽» для позиций корзины, неизвестные id пропускаются.
+
+        html=False — без экранирования, для текста без разметки (answerCallbackQuery).
+        """
+        lines = []
+        for cake_id, qty in items.items():
+            line = self.item_line(cake_id, qty, html)
+            if line is not None:
+                lines.append(line)
+        return lines
+
+    def items_total(self, items: Mapping[str, int]) -> int:
+        prices = self.prices
+        return sum(prices.get(cake_id, 0) * qty for cake_id, qty in items.items())
+
+
+_INDEX = CatalogIndex(CATALOG)
+
+
+def get_catalog() -> CatalogIndex:
+    """Текущая версия каталога. Не кешируйте результат надолго — каталог может перезагружаться."""
+    return _INDEX
+
+
+def reload_catalog(cakes: List[Cake]) -> CatalogIndex:
+    """Атомарно заменяет каталог новым индексом с увеличенной версией"""
+    global _INDEX
+    _INDEX = CatalogIndex(cakes, version=_INDEX.version + 1)
+    return _INDEX
+
+
+def get_cake_by_id(cake_id: str) -> Optional[Cake]:
+    return _INDEX.by_id.get(cake_id)
@@ -0,0 +1,228 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .catalog import Cake, CatalogIndex, get_catalog, reload_catalog
+
+logger = logging.getLogger(__name__)
+
+# callback_data кнопок ограничена 64 байтами, а id торта идёт после «cake:» / «add:»
+_MAX_ID_BYTES = 64 - len("cake:")
+
+_FIELDS = ("id", "name", "price", "description", "photo_url")
+
+# Подпись к фото — не длиннее 1024 символов, из них описание — всё, кроме названия и цены
+_MAX_DESCRIPTION = 900
+
+
+class CatalogError(ValueError):
+    """Файл каталога не читается или содержит ошибки"""
+
+
+def _cake(row: Mapping[str, Any], where: str) -> Cake:
+    values = {key: row.get(key) for key in _FIELDS}
+    cake_id = str(values["id"] or "").strip()
+    name = str(values["name"] or "").strip()
+    if not cake_id:
+        raise CatalogError(f"{where}: не указан id")
+    if len(cake_id.encode()) > _MAX_ID_BYTES:
+        raise CatalogError(f"{where}: id длиннее {_MAX_ID_BYTES} байт")
+    if not name:
+        raise CatalogError(f"{where}: не указано название")
+    price = values["price"]
+    try:
+        if isinstance(price, bool) or (isinstance(price, float) and not price.is_integer()):
+            raise ValueError
+        price = int(str(price).strip()) if isinstance(price, str) else int(price)
+    except (TypeError, ValueError):
+        raise CatalogError(f"{where}: цена должна быть целым числом рублей, а не {values['price']!r}")
+    if price < 0:
+        raise CatalogError(f"{where}: отрицательная цена")
+    description = str(values["description"] or "").strip()
+    if len(description) > _MAX_DESCRIPTION:
+        raise CatalogError(f"{where}: описание длиннее {_MAX_DESCRIPTION} символов (не поместится в подпись к фото)")
+    return Cake(
+        id=cake_id,
+        name=name,
+        price=price,
+        description=description,
+        photo_url=str(values["photo_url"] or "").strip(),
+    )
+
+
+def _rows_json(text: str) -> List[Any]:
+    data = json.loads(text)
+    # Список тортов или {"cakes": [...]}
+    if isinstance(data, dict):
+        data = data.get("cakes")
+    if not isinstance(data, list):
+        raise CatalogError("ожидается список тортов или объект с ключом \"cakes\"")
+    return data
+
+
+def _rows_yaml(text: str) -> List[Any]:
+    try:
+        import yaml
+    except ImportError:
+        raise CatalogError("для каталога в YAML установите PyYAML (pip install pyyaml)")
+    data = yaml.safe_load(text)
+    if isinstance(data, dict):
+        data = data.get("cakes")
+    if not isinstance(data, list):
+        raise CatalogError("ожидается список тортов или словарь с ключом cakes")
+    return data
+
+
+def _rows_csv(text: str) -> List[Any]:
+    # Excel с русской локалью сохраняет CSV через точку с запятой
+    header = text.split("\n", 1)[0]
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    reader = csv.DictReader(io.StringIO(text), delimiter=delimiter)
+    missing = {"id", "name", "price"} - {name.strip() for name in reader.fieldnames or ()}
+    if missing:
+        raise CatalogError(f"в заголовке CSV нет колонок: {', '.join(sorted(missing))}")
+    return [{(key or "").strip(): value for key, value in row.items()} for row in reader]
+
+
+_PARSERS: Dict[str, Callable[[str], List[Any]]] = {
+    ".json": _rows_json,
+    ".yaml": _rows_yaml,
+    ".yml": _rows_yaml,
+    ".csv": _rows_csv,
+}
+
+
+def parse_catalog(text: str, fmt: str) -> List[Cake]:
+    """Торты из текста каталога; fmt — расширение файла (.json, .yaml, .yml, .csv)"""
+    parser = _PARSERS.get(fmt.lower())
+    if parser is None:
+        raise CatalogError(f"неизвестный формат каталога {fmt!r} (поддерживаются: {', '.join(_PARSERS)})")
+    try:
+        rows = parser(text)
+    except CatalogError:
+        raise
+    except Exception as e:
+        raise CatalogError(f"не удалось разобрать файл: {e}")
+    cakes: List[Cake] = []
+    seen = set()
+    for number, row in enumerate(rows, 1):
+        where = f"позиция {number}"
+        if not isinstance(row, Mapping):
+            raise CatalogError(f"{where}: ожидается объект с полями {', '.join(_FIELDS)}")
+        cake = _cake(row, where)
+        if cake.id in seen:
+            raise CatalogError(f"{where}: id {cake.id!r} повторяется")
+        seen.add(cake.id)
+        cakes.append(cake)
+    if not cakes:
+        raise CatalogError("каталог пуст")
+    return cakes
+
+
+def load_catalog_file(path: str) -> List[Cake]:
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+    return parse_catalog(text, os.path.splitext(path)[1])
+
+
+class CatalogWatcher:
+    """Загружает каталог из файла и подменяет его при изменении файла.
+
+    Файл проверяется раз в interval секунд по времени изменения и размеру.
+    Новый каталог разбирается и проверяется целиком в отдельном потоке и
+    только потом атомарно заменяет текущий (reload_catalog — версия растёт,
+    кеши клавиатур и текстов, завязанные на версию, сбрасываются сами).
+    Файл с ошибкой не применяется: бот продолжает работать с последним
+    удачным каталогом, ошибка пишется в лог и видна в /catalog.
+    Файл без изменений в составе (например, после touch) версию не меняет.
+
+    on_reload(index) вызывается после каждой замены каталога.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        interval: float = 5.0,
+        on_reload: Optional[Callable[[CatalogIndex], Awaitable[None]]] = None,
+    ):
+        self.path = path
+        self.interval = interval
+        self.on_reload = on_reload
+        self.last_error: Optional[str] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"reloads": 0, "unchanged": 0, "errors": 0}
+
+    def metrics(self) -> Dict[str, int]:
+        catalog = get_catalog()
+        return {**self.stats, "version": catalog.version, "items": len(catalog)}
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    async def check(self, force: bool = False) -> bool:
+        """Перечитывает файл, если он изменился (или force); True — каталог заменён"""
+        async with self._lock:
+            signature = self._stat()
+            if signature is None:
+                # Об отсутствии файла сообщаем один раз, а не на каждой проверке
+                if self._signature is not None or self.last_error is None or force:
+                    self.last_error = f"файл {self.path} не найден"
+                    self.stats["errors"] += 1
+                    logger.error(f"Каталог: {self.last_error}, остаётся версия {get_catalog().version}")
+                self._signature = None
+                return False
+            if signature == self._signature and not force:
+                return False
+            # Запоминаем и неудачную попытку: тот же файл не разбирается повторно,
+            # а дописанный или исправленный изменит подпись и будет прочитан снова
+            self._signature = signature
+            try:
+                cakes = await asyncio.to_thread(load_catalog_file, self.path)
+            except (OSError, CatalogError) as e:
+                self.last_error = str(e)
+                self.stats["errors"] += 1
+                logger.error(f"Каталог {self.path} не применён: {e}; остаётся версия {get_catalog().version}")
+                return False
+            self.last_error = None
+            if tuple(cakes) == get_catalog().cakes:
+                self.stats["unchanged"] += 1
+                return False
+            index = reload_catalog(cakes)
+            self.stats["reloads"] += 1
+            logger.info(f"Каталог загружен из {self.path}: версия {index.version}, позиций {len(index)}")
+        if self.on_reload is not None:
+            try:
+                await self.on_reload(index)
+            except Exception as e:
+                logger.error(f"Ошибка обработки нового каталога: {e}")
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Ошибка проверки каталога {self.path}: {e}")
+
+    async def start(self) -> None:
+        """Загружает каталог сразу и, если interval > 0, следит за файлом"""
+        await self.check()
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
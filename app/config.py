@@ -38,10 +38,142 @@ MIN_LEAD_HOURS = int(os.getenv("MIN_LEAD_HOURS", "24"))
 # Максимум дней вперёд, доступных для предзаказа
 MAX_DAYS_AHEAD = int(os.getenv("MAX_DAYS_AHEAD", "14"))
 
+# Исключения из цикла (даты через запятую, ГГГГ-ММ-ДД):
+# выходные/праздники и дополнительные рабочие дни
+BAKER_DAYS_OFF = os.getenv("BAKER_DAYS_OFF", "")
+BAKER_EXTRA_WORKDAYS = os.getenv("BAKER_EXTRA_WORKDAYS", "")
+
+# Вместимость слота: сколько «единиц» (по умолчанию — тортов) пекарь успевает к одному слоту
+SLOT_CAPACITY = int(os.getenv("SLOT_CAPACITY", "2"))
+# Исключения через запятую: «2026-10-20 12:00=1» (слот), «2026-10-20=4» (день), «12:00=3» (час)
+SLOT_CAPACITY_OVERRIDES = os.getenv("SLOT_CAPACITY_OVERRIDES", "")
+# Вес тортов в единицах вместимости, если торт сложнее обычного: «napoleon=2»
+CAKE_SLOT_WEIGHTS = os.getenv("CAKE_SLOT_WEIGHTS", "")
+# Сколько минут слот держится за клиентом, пока он оформляет и оплачивает заказ
+SLOT_HOLD_MINUTES = int(os.getenv("SLOT_HOLD_MINUTES", "30"))
+
 # Эффект приветственного сообщения (Telegram message_effect_id)
 # ID эффекта салюта (fireworks) для приветственного сообщения
 WELCOME_EFFECT_ID = os.getenv("WELCOME_EFFECT_ID", "5159385139981059251")
 
+# Стикеры (Telegram file_id): приветствие по /start и благодарность после оплаты
+WELCOME_STICKER_ID = os.getenv(
+    "WELCOME_STICKER_ID", "CAACAgIAAxkBAAEPUWpou_GAnCdMdk0HEhGmGzuw1PBipgACBQADwDZPE_lqX5qCa011NgQ"
+)
+PAYMENT_STICKER_ID = os.getenv(
+    "PAYMENT_STICKER_ID", "CAACAgIAAxkBAAEPUX1ou_UPzrbLgxAAAc6qcrkC74GQj70AAgEdAAJdjShIYFtNtyx1ELs2BA"
+)
+
+# ===================== КЕШ МЕДИА =====================
+# Файл, где хранятся file_id уже загруженных в Telegram фото тортов
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "data/media_cache.json")
+# Прогрев при запуске: загрузить все фото каталога в чат менеджера заранее
+MEDIA_PREWARM = os.getenv("MEDIA_PREWARM", "false").lower() == "true"
+MEDIA_PREWARM_CONCURRENCY = int(os.getenv("MEDIA_PREWARM_CONCURRENCY", "4"))
+
+# ===================== РЕЖИМ ЗАПУСКА =====================
+# polling — опрос getUpdates (удобно локально), webhook — приём обновлений через aiohttp
+RUN_MODE = os.getenv("RUN_MODE", "polling").lower()
+# Публичный https-адрес, на который Telegram будет слать обновления (например, https://my-bot.herokuapp.com)
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token; если пусто — генерируется при запуске
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEB_SERVER_HOST = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+# Heroku передаёт порт в переменной PORT
+WEB_SERVER_PORT = int(os.getenv("WEB_SERVER_PORT", os.getenv("PORT", "8080")))
+
+# Что делать с обновлениями, пришедшими, пока бот был остановлен:
+# drain — обработать (кроме слишком старых), drop — отбросить
+PENDING_UPDATES_MODE = os.getenv("PENDING_UPDATES_MODE", "drain").lower()
+# Сообщения старше этого возраста (в секундах) при запуске не обрабатываются
+PENDING_UPDATE_MAX_AGE = int(os.getenv("PENDING_UPDATE_MAX_AGE", "600"))
+# Сколько отложенных обновлений обрабатывать одновременно
+PENDING_DRAIN_CONCURRENCY = int(os.getenv("PENDING_DRAIN_CONCURRENCY", "8"))
+
+# ===================== ОЧЕРЕДЬ УВЕДОМЛЕНИЙ =====================
+# Каталог, где уведомления менеджеру хранятся до успешной отправки
+NOTIFY_SPOOL_DIR = os.getenv("NOTIFY_SPOOL_DIR", "data/notifications")
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+# Максимальная пауза между повторными попытками отправки, сек
+NOTIFY_MAX_BACKOFF = float(os.getenv("NOTIFY_MAX_BACKOFF", "300"))
+
+# ===================== ЛИМИТЫ BOT API =====================
+# Исходящие запросы ждут в очереди, чтобы не упираться в flood-лимиты Telegram (429)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Запросов в секунду на бота целиком
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "30"))
+# Запросов в секунду в один чат и допустимая пачка подряд
+RATE_LIMIT_PER_CHAT = float(os.getenv("RATE_LIMIT_PER_CHAT", "1"))
+RATE_LIMIT_CHAT_BURST = float(os.getenv("RATE_LIMIT_CHAT_BURST", "5"))
+
+# ===================== ЗАЩИТА ОТ ЧАСТЫХ НАЖАТИЙ =====================
+# Окно (сек), в котором одинаковые нажатия одного пользователя склеиваются или отбрасываются; 0 — отключить
+THROTTLE_WINDOW = float(os.getenv("THROTTLE_WINDOW", "0.3"))
+# Кнопки, нажатия которых суммируются (несколько «В корзину» подряд — одно добавление на N штук)
+THROTTLE_COALESCE_PREFIXES = tuple(
+    p.strip() for p in os.getenv("THROTTLE_COALESCE_PREFIXES", "add:").split(",") if p.strip()
+)
+
+# ===================== ХРАНЕНИЕ КОРЗИН =====================
+# memory — только в памяти процесса, sqlite — файл на диске (переживает перезапуск)
+CART_STORAGE = os.getenv("CART_STORAGE", "memory").lower()
+CART_DB_PATH = os.getenv("CART_DB_PATH", "data/carts.sqlite3")
+# Сколько корзин держать в кеше памяти
+CART_CACHE_SIZE = int(os.getenv("CART_CACHE_SIZE", "10000"))
+# Как часто (в секундах) сбрасывать изменённые корзины на диск
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "1.0"))
+
+# ===================== ХРАНИЛИЩЕ СОСТОЯНИЙ ОФОРМЛЕНИЯ =====================
+# memory — шаги оформления теряются при перезапуске; sqlite — сохраняются на диск
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory").lower()
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "data/fsm.sqlite3")
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+# Через сколько часов без изменений брошенное оформление удаляется
+FSM_SESSION_TTL_HOURS = float(os.getenv("FSM_SESSION_TTL_HOURS", "48"))
+
+# ===================== ОЧИСТКА НЕАКТИВНЫХ КОРЗИН И СЕССИЙ =====================
+# Корзина, которую не открывали столько часов, удаляется
+CART_IDLE_TTL_HOURS = float(os.getenv("CART_IDLE_TTL_HOURS", "168"))
+# Потолок числа корзин и сессий в памяти: сверх него вытесняются самые давние
+CART_MAX_ENTRIES = int(os.getenv("CART_MAX_ENTRIES", "100000"))
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", "100000"))
+# Как часто (в секундах) фоновая задача ищет неактивные записи
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", "300"))
+
+# ===================== МЕТРИКИ =====================
+# Замер времени обработчиков и запросов к Bot API (/metrics и команда /stats)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Отдельный сервер /metrics (0 — не запускать; в режиме вебхука /metrics есть и на его сервере)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# ===================== ПОВТОРНЫЕ ПОДТВЕРЖДЕНИЯ ОПЛАТЫ =====================
+# Сколько подтверждённых заказов помнить и как долго (в секундах),
+# чтобы повторное нажатие «Платёж выполнен» не создавало дубль
+ORDER_IDEMPOTENCY_SIZE = int(os.getenv("ORDER_IDEMPOTENCY_SIZE", "10000"))
+ORDER_IDEMPOTENCY_TTL = float(os.getenv("ORDER_IDEMPOTENCY_TTL", "86400"))
+
+# Журнал оплаченных заказов (JSON-строка на заказ)
+ORDER_JOURNAL_PATH = os.getenv("ORDER_JOURNAL_PATH", "data/orders.jsonl")
+
+# ===================== НАВИГАЦИЯ =====================
+# Переходы между каталогом, карточкой, корзиной и меню правят текущее сообщение,
+# а не удаляют его и не отправляют новое (false — всегда удалять и отправлять)
+EDIT_IN_PLACE = os.getenv("EDIT_IN_PLACE", "true").lower() == "true"
+
+# ===================== ЗАПИСЬ ОБНОВЛЕНИЙ =====================
+# Файл, куда пишутся входящие обновления без персональных данных
+# (для воспроизведения: python -m benchmarks.replay); пусто — запись выключена
+UPDATE_RECORD_PATH = os.getenv("UPDATE_RECORD_PATH", "")
+
+# ===================== КАТАЛОГ =====================
+# Файл каталога (.json, .csv, .yaml/.yml); пусто — встроенный каталог из app/catalog.py
+CATALOG_PATH = os.getenv("CATALOG_PATH", "")
+# Как часто проверять файл на изменения, секунд (0 — только при запуске и по /catalog)
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))
+
 if not BOT_TOKEN:
     raise RuntimeError("Не задан токен бота. Укажите BOT_TOKEN в .env или переменных окружения.")
 
@@ -49,7 +181,7 @@ if not BOT_TOKEN:
 print(f"Конфигурация загружена:")
 print(f"- BOT_TOKEN: {'*' * len(BOT_TOKEN) if BOT_TOKEN else 'НЕ ЗАДАН'}")
 print(f"- MANAGER_CHAT_ID: {MANAGER_CHAT_ID or 'НЕ ЗАДАН'}")
-print(f"- Уведомления о заказах: {'ВКЛЮЧЕНЫ' if ENABLE_ORDER_NOTIFICATIONS else 'ОТКЛЮЧЕНЫ'}")
+print(f"- Уведомления о заказах: {'ВКЛЮЧЕНЫ' if ENABLE_ORDER_NOTIFICATIONS else 'ОТКЛЮЧЕНЫ'} (шаблон {ORDER_NOTIFICATION_TEMPLATE})")
 print(f"- Оплата на карту: {'ВКЛЮЧЕНА' if ENABLE_CARD_PAYMENTS else 'ОТКЛЮЧЕНА'}")
 print(f"- Номер карты: {CARD_NUMBER}")
 print("- Предзаказ и расписание:")
@@ -57,4 +189,17 @@ print(f"  • База цикла: {BAKER_SCHEDULE_START_DATE}")
 print(f"  • Цикл: {WORK_CYCLE_ON_DAYS} на / {WORK_CYCLE_OFF_DAYS} от")
 print(f"  • Часы: {WORKING_HOURS_START}:00–{WORKING_HOURS_END}:00, слот {SLOT_MINUTES} мин")
 print(f"  • Минимальный срок: {MIN_LEAD_HOURS} ч, горизонт: {MAX_DAYS_AHEAD} дней")
+print(f"  • Вместимость слота: {SLOT_CAPACITY}, резерв на оформление: {SLOT_HOLD_MINUTES} мин")
+print(f"  • Выходные вне цикла: {BAKER_DAYS_OFF or 'нет'}; доп. рабочие дни: {BAKER_EXTRA_WORKDAYS or 'нет'}")
+print(f"- Режим запуска: {RUN_MODE}" + (f" ({WEBHOOK_BASE_URL}{WEBHOOK_PATH}, порт {WEB_SERVER_PORT})" if RUN_MODE == "webhook" else ""))
+print(f"- Отложенные обновления при запуске: {PENDING_UPDATES_MODE}" + (f" (не старше {PENDING_UPDATE_MAX_AGE} с)" if PENDING_UPDATES_MODE == "drain" else ""))
+print("- Лимит Bot API: " + (f"{RATE_LIMIT_GLOBAL:g}/с всего, {RATE_LIMIT_PER_CHAT:g}/с на чат" if RATE_LIMIT_ENABLED else "ОТКЛЮЧЁН"))
+print(f"- Хранилище состояний оформления: {FSM_STORAGE}" + (f" ({FSM_DB_PATH}, {FSM_SESSION_TTL_HOURS:g} ч)" if FSM_STORAGE == "sqlite" else ""))
+print("- Метрики: " + (("ВКЛЮЧЕНЫ" + (f", /metrics на {METRICS_HOST}:{METRICS_PORT}" if METRICS_PORT else "")) if METRICS_ENABLED else "ОТКЛЮЧЕНЫ"))
+print(f"- Журнал заказов: {ORDER_JOURNAL_PATH}")
+print(f"- Навигация: {'правка сообщений на месте' if EDIT_IN_PLACE else 'удаление и новая отправка'}")
+print(f"- Запись обновлений: {UPDATE_RECORD_PATH or 'ОТКЛЮЧЕНА'}")
+print("- Каталог: " + (f"{CATALOG_PATH}" + (f" (проверка раз в {CATALOG_RELOAD_INTERVAL:g} с)" if CATALOG_RELOAD_INTERVAL > 0 else "") if CATALOG_PATH else "встроенный"))
+print(f"- Хранилище корзин: {CART_STORAGE}" + (f" ({CART_DB_PATH})" if CART_STORAGE == "sqlite" else ""))
+print(f"- Прогрев фото при запуске: {'ВКЛЮЧЁН' if MEDIA_PREWARM else 'ОТКЛЮЧЁН'}")
 print(f"- Эффект приветствия: {'ЗАДАН' if WELCOME_EFFECT_ID else 'не задан'}")
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Поля индекса пишутся первыми и в этом порядке: при загрузке их достаточно
+# вынуть регулярным выражением, не разбирая весь JSON строки
+_INDEX_FIELDS = ("order_id", "user_id", "phone", "delivery_date")
+_INDEX_PREFIX = re.compile(
+    rb'\{"order_id":"([^"\\]*)","user_id":(-?\d+|null),"phone":(?:"([^"\\]*)"|null),"delivery_date":(?:"([^"\\]*)"|null)[,}]'
+)
+_NOT_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """Ключ для поиска по телефону: последние 10 цифр (+7, 8 и пробелы не важны)"""
+    return _NOT_DIGITS.sub("", phone or "")[-10:]
+
+
+class DaySummary:
+    """Сводка заказов на одну дату получения, пополняемая по одному заказу"""
+
+    def __init__(self, date_iso: str):
+        self.date = date_iso
+        self.orders: List[dict] = []
+        self.revenue = 0
+        # Время слота -> id торта -> количество
+        self.by_slot: Dict[str, Dict[str, int]] = {}
+        self.cakes: Dict[str, int] = {}
+
+    def add(self, record: dict) -> None:
+        self.orders.append(record)
+        self.revenue += record.get("total") or 0
+        slot = self.by_slot.setdefault(record.get("delivery_time") or "—", {})
+        for cake_id, qty in (record.get("items") or {}).items():
+            slot[cake_id] = slot.get(cake_id, 0) + qty
+            self.cakes[cake_id] = self.cakes.get(cake_id, 0) + qty
+
+
+class OrderJournal:
+    """Журнал оплаченных заказов: JSON-строка на заказ, файл только дописывается.
+
+    append() не ждёт диска — запись уходит фоновой задаче, которая пишет
+    накопившиеся строки одной пачкой. В памяти хранятся только смещения
+    строк в файле, разложенные по номеру заказа, пользователю, телефону и
+    дате получения; сами заказы читаются из файла по запросу. При запуске
+    индекс строится заново одним проходом по файлу.
+
+    Сводки по датам (day()) собираются из файла один раз при первом запросе
+    даты, а дальше только пополняются новыми заказами.
+
+    Если запись не удалась (например, кончилось место), пачка повторяется раз
+    в секунду, а файл перед каждой попыткой обрезается до начала пачки —
+    недописанные байты не сдвигают смещения индекса. close() ждёт записи
+    не дольше close_timeout секунд; незаписанные заказы остаются в логе.
+    """
+
+    def __init__(self, path: str, max_days: int = 90, close_timeout: float = 10.0):
+        self.path = path
+        self.max_days = max_days
+        self.close_timeout = close_timeout
+        self._days: "OrderedDict[str, DaySummary]" = OrderedDict()
+        self._size = 0
+        self._by_id: Dict[str, int] = {}
+        self._by_user: Dict[int, List[int]] = {}
+        self._by_phone: Dict[str, List[int]] = {}
+        self._by_date: Dict[str, List[int]] = {}
+        # Уже проиндексированные, но ещё не записанные заказы: смещение -> заказ
+        self._unwritten: Dict[int, dict] = {}
+        self._queue: "asyncio.Queue[Tuple[int, bytes]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, float] = {"appended": 0, "written": 0, "batches": 0, "load_seconds": 0.0}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _index(self, order_id: str, user_id: Optional[int], phone: Optional[str],
+               delivery_date: Optional[str], offset: int) -> None:
+        self._by_id[order_id] = offset
+        if user_id is not None:
+            self._by_user.setdefault(user_id, []).append(offset)
+        phone = normalize_phone(phone)
+        if phone:
+            self._by_phone.setdefault(phone, []).append(offset)
+        if delivery_date:
+            self._by_date.setdefault(delivery_date, []).append(offset)
+
+    def _index_line(self, line: bytes, offset: int) -> None:
+        match = _INDEX_PREFIX.match(line)
+        if match is not None:
+            order_id, user_id, phone, delivery_date = match.groups()
+            self._index(
+                order_id.decode("utf-8"),
+                int(user_id) if user_id != b"null" else None,
+                phone.decode("utf-8") if phone is not None else None,
+                delivery_date.decode("utf-8") if delivery_date is not None else None,
+                offset,
+            )
+        else:
+            # Экранированные символы или чужой порядок полей — разбираем строку целиком
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError(f"ожидается объект заказа, а не {type(record).__name__}")
+            self._index(*(record.get(field) for field in _INDEX_FIELDS), offset)
+
+    def _load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Оборванная при аварии последняя строка: отрезаем её,
+                    # иначе следующий заказ приклеится к ней
+                    logger.warning(f"Журнал заказов {self.path}: отброшена неполная запись в конце файла")
+                    break
+                try:
+                    self._index_line(line, offset)
+                    count += 1
+                except (ValueError, TypeError) as e:
+                    logger.error(f"Журнал заказов {self.path}: пропущена повреждённая запись на смещении {offset}: {e}")
+                offset += len(line)
+        if offset != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self._size = offset
+        return count
+
+    async def load(self) -> int:
+        """Строит индекс по файлу журнала; возвращает число заказов"""
+        started = time.monotonic()
+        count = await asyncio.to_thread(self._load)
+        self.stats["load_seconds"] = time.monotonic() - started
+        logger.info(f"Журнал заказов: {count} заказов за {self.stats['load_seconds']:.2f} с")
+        return count
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._task = asyncio.create_task(self._writer())
+
+    async def close(self) -> None:
+        """Дописывает очередь и останавливает фоновую запись"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), self.close_timeout)
+        except asyncio.TimeoutError:
+            # Диск так и не принял запись: сохраняем заказы хотя бы в логе
+            for offset in sorted(self._unwritten):
+                logger.error(
+                    f"Заказ не записан в журнал {self.path}: "
+                    f"{json.dumps(self._unwritten[offset], ensure_ascii=False)}"
+                )
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def append(self, record: dict) -> None:
+        """Добавляет заказ; запись на диск выполняется в фоне"""
+        record = {**{field: record.get(field) for field in _INDEX_FIELDS}, **record}
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        # Строки пишет одна задача строго по порядку, поэтому смещение известно заранее
+        offset = self._size
+        self._size += len(line)
+        self._unwritten[offset] = record
+        self._index(*(record[field] for field in _INDEX_FIELDS), offset)
+        summary = self._days.get(record["delivery_date"])
+        if summary is not None:
+            summary.add(record)
+        self._queue.put_nowait((offset, line))
+        self.stats["appended"] += 1
+
+    def _write_batch(self, offset: int, lines: List[bytes]) -> None:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size > offset:
+                # Хвост неудачной попытки записать эту же пачку
+                logger.warning(f"Журнал заказов {self.path}: отрезано {size - offset} байт неполной записи")
+                f.truncate(offset)
+            f.seek(offset)
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _writer(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                while True:
+                    try:
+                        await asyncio.to_thread(self._write_batch, batch[0][0], [line for _, line in batch])
+                        break
+                    except OSError as e:
+                        logger.error(f"Не удалось записать журнал заказов {self.path}: {e}, повтор через 1 с")
+                        await asyncio.sleep(1)
+                for offset, _ in batch:
+                    self._unwritten.pop(offset, None)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _read(self, offsets: List[int]) -> List[dict]:
+        records = []
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+
+    async def _fetch(self, offsets: List[int]) -> List[dict]:
+        if not offsets:
+            return []
+        # Ещё не записанные берём из памяти до чтения файла: пока идёт чтение, они могут записаться
+        records = {o: self._unwritten[o] for o in offsets if o in self._unwritten}
+        on_disk = [o for o in offsets if o not in records]
+        if on_disk:
+            records.update(zip(on_disk, await asyncio.to_thread(self._read, on_disk)))
+        return [records[o] for o in offsets]
+
+    async def get(self, order_id: str) -> Optional[dict]:
+        offset = self._by_id.get(order_id)
+        if offset is None:
+            return None
+        return (await self._fetch([offset]))[0]
+
+    async def by_user(self, user_id: int) -> List[dict]:
+        return await self._fetch(list(self._by_user.get(user_id, ())))
+
+    async def by_phone(self, phone: str) -> List[dict]:
+        return await self._fetch(list(self._by_phone.get(normalize_phone(phone), ())))
+
+    async def by_date(self, date_iso: str) -> List[dict]:
+        return await self._fetch(list(self._by_date.get(date_iso, ())))
+
+    async def day(self, date_iso: str) -> DaySummary:
+        """Сводка заказов на дату получения"""
+        summary = self._days.get(date_iso)
+        if summary is not None:
+            self._days.move_to_end(date_iso)
+            return summary
+        while True:
+            offsets = list(self._by_date.get(date_iso, ()))
+            records = await self._fetch(offsets)
+            # Пока читали файл, мог прийти новый заказ на эту дату — тогда собираем заново
+            if len(self._by_date.get(date_iso, ())) == len(offsets):
+                break
+        summary = self._days.get(date_iso)
+        if summary is None:
+            summary = DaySummary(date_iso)
+            for record in records:
+                summary.add(record)
+            self._days[date_iso] = summary
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return summary
+
+    def dates_from(self, from_date: str) -> List[str]:
+        """Даты получения не раньше from_date, по возрастанию"""
+        return sorted(d for d in self._by_date if d >= from_date)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            **self.stats, "orders": len(self._by_id), "pending": self._queue.qsize(),
+            "days_cached": len(self._days),
+        }
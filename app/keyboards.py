@@ -5,22 +5,62 @@ from aiogram.types import (
     KeyboardButton,
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from datetime import datetime
-from .catalog import CATALOG, Cake
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .cart import Cart
+from .catalog import Cake, get_catalog
+
+
+# ===================== КЕШ РАЗМЕТКИ =====================
+# Содержимое клавиатур зависит только от параметров и каталога, поэтому готовые
+# объекты разметки переиспользуются между нажатиями. Ключ — (вид, параметры,
+# версия каталога); при смене версии каталога кеш очищается целиком.
+# Закешированную разметку нельзя изменять на месте.
+
+_MARKUP_CACHE_LIMIT = 1024
+_markup_cache: Dict[Tuple[str, tuple, int], Any] = {}
+_markup_cache_version: Optional[int] = None
+_markup_cache_stats = {"hits": 0, "misses": 0}
+
+
+def markup_cache_info() -> Dict[str, int]:
+    return {**_markup_cache_stats, "size": len(_markup_cache)}
+
+
+def _memoize_markup(func: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(func)
+    def wrapper(*args):
+        global _markup_cache_version
+        version = get_catalog().version
+        if version != _markup_cache_version:
+            _markup_cache.clear()
+            _markup_cache_version = version
+        key = (func.__name__, args, version)
+        markup = _markup_cache.get(key)
+        if markup is not None:
+            _markup_cache_stats["hits"] += 1
+            return markup
+        _markup_cache_stats["misses"] += 1
+        if len(_markup_cache) >= _MARKUP_CACHE_LIMIT:
+            _markup_cache.clear()
+        markup = _markup_cache[key] = func(*args)
+        return markup
+    return wrapper
+
+
+# Клавиатуры не читают корзины сами: состояние корзины передаёт вызывающий
+# обработчик, у которого корзина уже загружена из хранилища.
+
+def main_menu_kb(cart: Optional[Cart] = None) -> ReplyKeyboardMarkup:
+    # Показываем количество товаров в корзине
+    return _main_menu_markup(cart.count if cart else 0)
 
 
-def main_menu_kb(user_id: int = None) -> ReplyKeyboardMarkup:
-    # Показываем количество товаров в корзине
-    if user_id is not None:
-        try:
-            from main import CARTS
-            cart_items = sum(CARTS.get(user_id, {}).values())
-            if cart_items > 0:
-                button_text = f"🛒 Корзина ({cart_items})"
-            else:
-                button_text = "🛒 Корзина"
-        except:
-            button_text = "🛒 Корзина"
+@_memoize_markup
+def _main_menu_markup(cart_count: int) -> ReplyKeyboardMarkup:
+    if cart_count > 0:
+        button_text = f"🛒 Корзина ({cart_count})"
     else:
         button_text = "🛒 Корзина"
     
@@ -36,44 +76,40 @@ def main_menu_kb(user_id: int = None) -> ReplyKeyboardMarkup:
     )
 
 
+@_memoize_markup
 def catalog_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for cake in CATALOG:
-        builder.button(text=f"{cake.name} — {cake.price}₽", callback_data=f"cake:{cake.id}")
+    catalog = get_catalog()
+    for cake in catalog:
+        builder.button(text=catalog.button_labels[cake.id], callback_data=f"cake:{cake.id}")
     builder.adjust(1)
     builder.button(text="⬅️ Назад", callback_data="back:main")
     return builder.as_markup()
 
 
-def cake_card_kb(cake: Cake, user_id: int = None) -> InlineKeyboardMarkup:
+def cake_card_kb(cake: Cake, cart: Optional[Cart] = None) -> InlineKeyboardMarkup:
+    # Показываем количество в корзине, если корзина передана;
+    # для каждого количества кешируется свой вариант клавиатуры
+    current_qty = cart.qty(cake.id) if cart is not None else 0
+    return _cake_card_markup(cake.id, current_qty)
+
+
+@_memoize_markup
+def _cake_card_markup(cake_id: str, current_qty: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    
-    # Показываем количество в корзине, если пользователь указан
-    if user_id is not None:
-        from .catalog import get_cake_by_id
-        # Импортируем здесь, чтобы избежать циклических импортов
-        current_qty = 0
-        try:
-            # Получаем количество из корзины пользователя
-            from main import CARTS
-            current_qty = CARTS.get(user_id, {}).get(cake.id, 0)
-        except:
-            pass
-        
-        if current_qty > 0:
-            button_text = f"➕ В корзину ({current_qty})"
-        else:
-            button_text = "➕ В корзину"
+    if current_qty > 0:
+        button_text = f"➕ В корзину ({current_qty})"
     else:
         button_text = "➕ В корзину"
     
-    builder.button(text=button_text, callback_data=f"add:{cake.id}")
+    builder.button(text=button_text, callback_data=f"add:{cake_id}")
     builder.button(text="⬅️ К каталогу", callback_data="back:catalog")
     builder.button(text="🛒 Открыть корзину", callback_data="open:cart")
     builder.adjust(1)
     return builder.as_markup()
 
 
+@_memoize_markup
 def cart_kb(has_items: bool) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     if has_items:
@@ -83,6 +119,7 @@ def cart_kb(has_items: bool) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@_memoize_markup
 def order_confirmation_kb() -> InlineKeyboardMarkup:
     """Клавиатура подтверждения заказа с кнопкой оплаты"""
     builder = InlineKeyboardBuilder()
@@ -92,10 +129,10 @@ def order_confirmation_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def payment_confirm_kb() -> InlineKeyboardMarkup:
-    """Клавиатура подтверждения оплаты"""
+def payment_confirm_kb(order_id: str) -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения оплаты; номер заказа защищает от повторного подтверждения"""
     builder = InlineKeyboardBuilder()
-    builder.button(text="✅ Платёж выполнен", callback_data="payment:confirm")
+    builder.button(text="✅ Платёж выполнен", callback_data=f"payment:confirm:{order_id}")
     builder.button(text="❌ Отменить", callback_data="payment:cancel")
     builder.adjust(1)
     return builder.as_markup()
@@ -103,6 +140,7 @@ def payment_confirm_kb() -> InlineKeyboardMarkup:
 
 # ===================== ДОБАВЛЕНО: ПРЕДЗАКАЗ =====================
 
+@_memoize_markup
 def delivery_method_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="🚶 Самовывоз", callback_data="delivery:самовывоз")
@@ -112,7 +150,8 @@ def delivery_method_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def dates_kb(date_items: list[str]) -> InlineKeyboardMarkup:
+@_memoize_markup
+def dates_kb(date_items: Tuple[str, ...]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for d in date_items:
         # d приходит в ISO (YYYY-MM-DD). Показываем в формате ДД.ММ.ГГГГ
@@ -0,0 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List
+
+
+class KeyedLock:
+    """Набор asyncio-блокировок по ключу.
+
+    Блокировка создаётся при первом обращении и удаляется, как только её
+    никто не держит и не ждёт, поэтому память не растёт с числом ключей.
+    Ожидающие одного ключа получают блокировку в порядке прихода.
+    """
+
+    def __init__(self):
+        # key -> [блокировка, число держащих и ожидающих]
+        self._locks: Dict[Hashable, List] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def waiting(self, key: Hashable) -> int:
+        entry = self._locks.get(key)
+        return entry[1] if entry is not None else 0
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
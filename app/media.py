@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputMediaPhoto, Message
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """Кеш Telegram file_id: URL фото -> file_id, сохраняется в JSON-файл.
+
+    После первой отправки по URL Telegram возвращает file_id, и дальше фото
+    отправляется по нему — без повторного скачивания картинки серверами Telegram.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file_ids: Dict[str, str] = {}
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._file_ids = json.load(f)
+            logger.info(f"Загружено {len(self._file_ids)} file_id из {self.path}")
+        except FileNotFoundError:
+            self._file_ids = {}
+        except Exception as e:
+            logger.error(f"Не удалось прочитать кеш медиа {self.path}: {e}")
+            self._file_ids = {}
+
+    def _write(self, data: Dict[str, str]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    async def save(self) -> None:
+        try:
+            await asyncio.to_thread(self._write, dict(self._file_ids))
+        except Exception as e:
+            logger.error(f"Не удалось сохранить кеш медиа {self.path}: {e}")
+
+    async def _save_pending(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            await self.save()
+
+    def _schedule_save(self) -> None:
+        # Несколько новых file_id подряд сохраняются одной записью
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_pending())
+
+    def get(self, url: str) -> Optional[str]:
+        return self._file_ids.get(url)
+
+    def remember(self, url: str, file_id: str) -> None:
+        if self._file_ids.get(url) != file_id:
+            self._file_ids[url] = file_id
+            self._schedule_save()
+
+    def forget(self, url: str) -> None:
+        if self._file_ids.pop(url, None) is not None:
+            self._schedule_save()
+
+    def _remember_sent(self, url: str, sent: Message) -> None:
+        if sent.photo:
+            # Самый крупный размер — последний в списке
+            self.remember(url, sent.photo[-1].file_id)
+
+    async def answer_photo(self, message: Message, url: str, **kwargs) -> Message:
+        """message.answer_photo, но по file_id из кеша, если он уже известен"""
+        file_id = self.get(url)
+        if file_id:
+            try:
+                return await message.answer_photo(photo=file_id, **kwargs)
+            except TelegramBadRequest as e:
+                # file_id устарел (например, сменили бота) — отправим по URL заново
+                logger.warning(f"file_id для {url} отклонён: {e}")
+                self.forget(url)
+        sent = await message.answer_photo(photo=url, **kwargs)
+        self._remember_sent(url, sent)
+        return sent
+
+    async def edit_photo(
+        self, bot: Bot, chat_id: int, message_id: int, url: str, caption: str, **kwargs
+    ) -> Union[Message, bool]:
+        """Заменяет фото и подпись уже отправленного сообщения, по file_id из кеша, если он известен"""
+        file_id = self.get(url)
+        if file_id:
+            try:
+                return await bot.edit_message_media(
+                    chat_id=chat_id, message_id=message_id,
+                    media=InputMediaPhoto(media=file_id, caption=caption), **kwargs
+                )
+            except TelegramBadRequest as e:
+                if "not modified" in str(e):
+                    raise
+                logger.warning(f"file_id для {url} отклонён: {e}")
+                self.forget(url)
+        edited = await bot.edit_message_media(
+            chat_id=chat_id, message_id=message_id, media=InputMediaPhoto(media=url, caption=caption), **kwargs
+        )
+        if isinstance(edited, Message):
+            self._remember_sent(url, edited)
+        return edited
+
+    async def prewarm(self, bot: Bot, chat_id: int, urls: Iterable[str], concurrency: int = 4) -> int:
+        """Загружает в Telegram ещё не закешированные фото, отправляя их в chat_id.
+
+        Отправленные служебные сообщения сразу удаляются. Возвращает число новых file_id.
+        """
+        pending = [url for url in dict.fromkeys(urls) if url and url not in self._file_ids]
+        if not pending:
+            return 0
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def upload(url: str) -> bool:
+            async with semaphore:
+                try:
+                    sent = await bot.send_photo(chat_id, photo=url, disable_notification=True)
+                except Exception as e:
+                    logger.error(f"Прогрев фото {url} не удался: {e}")
+                    return False
+                self._remember_sent(url, sent)
+                try:
+                    await bot.delete_message(chat_id, sent.message_id)
+                except Exception:
+                    pass
+                return True
+
+        results = await asyncio.gather(*(upload(url) for url in pending))
+        uploaded = sum(results)
+        logger.info(f"Прогрев фото: загружено {uploaded} из {len(pending)}")
+        return uploaded
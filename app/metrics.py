@@ -0,0 +1,227 @@
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как в Prometheus"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя — выше всех границ (+Inf)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+            lower = self.bounds[i] if i < len(self.bounds) else lower
+        return self.bounds[-1]
+
+
+def _labels_text(labels: Labels, extra: str = "") -> str:
+    parts = [
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """Счётчики и гистограммы процесса в текстовом формате Prometheus.
+
+    Помимо собственных метрик, register_collector() подключает функции
+    metrics() других компонентов (очередь уведомлений, лимиты, кеши) — их
+    значения выводятся как gauge с префиксом компонента.
+    """
+
+    def __init__(self, namespace: str = "bot"):
+        self.namespace = namespace
+        self.started_at = time.time()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        series = self._histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def histograms(self, name: str) -> Dict[Labels, Histogram]:
+        return self._histograms.get(name, {})
+
+    def counters(self, name: str) -> Dict[Labels, float]:
+        return self._counters.get(name, {})
+
+    def register_collector(self, component: str, collect: Callable[[], Dict[str, Any]]) -> None:
+        self._collectors[component] = collect
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Текущие значения подключённых компонентов"""
+        snapshot = {}
+        for component, collect in self._collectors.items():
+            try:
+                snapshot[component] = collect()
+            except Exception as e:
+                logger.error(f"Не удалось собрать метрики {component}: {e}")
+        return snapshot
+
+    def render(self) -> str:
+        ns = self.namespace
+        lines: List[str] = [
+            f"# TYPE {ns}_uptime_seconds gauge",
+            f"{ns}_uptime_seconds {time.time() - self.started_at:.3f}",
+        ]
+        for name, series in self._histograms.items():
+            full = f"{ns}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} histogram")
+            for labels, h in series.items():
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    le = 'le="%g"' % bound
+                    lines.append(f"{full}_bucket{_labels_text(labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{full}_bucket{_labels_text(labels, le)} {h.count}")
+                lines.append(f"{full}_sum{_labels_text(labels)} {h.sum:.6f}")
+                lines.append(f"{full}_count{_labels_text(labels)} {h.count}")
+        for name, series in self._counters.items():
+            full = f"{ns}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} counter")
+            for labels, value in series.items():
+                lines.append(f"{full}{_labels_text(labels)} {value:g}")
+        for component, values in self.collect().items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    full = f"{ns}_{component}_{key}"
+                    lines.append(f"# TYPE {full} gauge")
+                    lines.append(f"{full} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время работы каждого обработчика и число его ошибок.
+
+    Подключается как внутренний middleware (dp.message.middleware(...)):
+    там уже известен выбранный обработчик, а время ожидания в очередях
+    пользователя и склейки нажатий в замер не попадает.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        registry.describe("handler_duration_seconds", "Время работы обработчика")
+        registry.describe("handler_errors_total", "Исключения в обработчиках")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        labels = (("handler", name),)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.registry.inc("handler_errors_total", labels + (("error", type(e).__name__),))
+            raise
+        finally:
+            self.registry.observe("handler_duration_seconds", labels, time.perf_counter() - started)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Число, длительность и ошибки запросов к Bot API по методам.
+
+    Подключается к сессии бота после ограничителя запросов, поэтому
+    меряет сам запрос, без ожидания в очереди лимитов; повтор после 429
+    считается отдельным запросом.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        registry.describe("api_request_duration_seconds", "Длительность запроса к Bot API")
+        registry.describe("api_errors_total", "Ошибки запросов к Bot API")
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        labels = (("method", method.__api_method__),)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.registry.inc("api_errors_total", labels + (("error", type(e).__name__),))
+            raise
+        finally:
+            self.registry.observe("api_request_duration_seconds", labels, time.perf_counter() - started)
+
+
+def add_metrics_route(app: web.Application, registry: MetricsRegistry, path: str = "/metrics") -> None:
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app.router.add_get(path, metrics)
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> web.AppRunner:
+    """Отдельный сервер /metrics для режима polling; остановка — runner.cleanup()"""
+    app = web.Application()
+    add_metrics_route(app, registry)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """Фоновая отправка уведомлений с сохранением на диск и повторами.
+
+    enqueue() записывает уведомление в каталог-спул и сразу возвращает
+    управление; рабочие задачи отправляют его и удаляют файл только после
+    успешной доставки. Неотправленное при остановке уйдёт после следующего
+    запуска. Сетевые ошибки повторяются бесконечно с экспоненциальной
+    задержкой (с учётом retry_after от Telegram); если Telegram отвергает само
+    сообщение, после max_rejects попыток файл переименовывается в *.failed
+    и остаётся в спуле для ручного разбора.
+    """
+
+    def __init__(self, spool_dir: str, workers: int = 2, max_backoff: float = 300, max_rejects: int = 5):
+        self.spool_dir = spool_dir
+        self.workers = max(1, workers)
+        self.max_backoff = max_backoff
+        self.max_rejects = max_rejects
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        self.stats: Dict[str, float] = {
+            "enqueued": 0,
+            "sent": 0,
+            "retries": 0,
+            "failed": 0,
+            "last_delivery_seconds": 0.0,
+        }
+
+    def _path(self, item_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{item_id}.json")
+
+    def _write(self, item_id: str, payload: dict) -> None:
+        path = self._path(item_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read(self, item_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(item_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, item_id: str) -> None:
+        try:
+            os.remove(self._path(item_id))
+        except FileNotFoundError:
+            pass
+
+    def _mark_failed(self, item_id: str) -> None:
+        path = self._path(item_id)
+        if os.path.exists(path):
+            os.replace(path, f"{path}.failed")
+
+    async def enqueue(self, chat_id: int, text: str, **kwargs) -> str:
+        """Сохраняет уведомление на диск и ставит в очередь на отправку"""
+        # Имя файла начинается со времени — при перезапуске порядок сохраняется
+        item_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        payload = {"chat_id": chat_id, "text": text, "kwargs": kwargs, "created_at": time.time()}
+        await asyncio.to_thread(self._write, item_id, payload)
+        self._queue.put_nowait(item_id)
+        self.stats["enqueued"] += 1
+        return item_id
+
+    def metrics(self) -> Dict[str, float]:
+        return {**self.stats, "pending": self._queue.qsize()}
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        os.makedirs(self.spool_dir, exist_ok=True)
+        leftovers = sorted(
+            name[:-len(".json")] for name in os.listdir(self.spool_dir) if name.endswith(".json")
+        )
+        for item_id in leftovers:
+            self._queue.put_nowait(item_id)
+        if leftovers:
+            logger.info(f"Из спула уведомлений восстановлено {len(leftovers)} неотправленных сообщений")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._queue.qsize():
+            logger.warning(f"Остановка с {self._queue.qsize()} неотправленными уведомлениями — они останутся в спуле")
+
+    async def _worker(self) -> None:
+        while True:
+            item_id = await self._queue.get()
+            try:
+                await self._deliver(item_id)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item_id: str) -> None:
+        payload = await asyncio.to_thread(self._read, item_id)
+        if payload is None:
+            return
+        delay = 1.0
+        rejects = 0
+        while True:
+            try:
+                await self._bot.send_message(payload["chat_id"], payload["text"], **payload.get("kwargs", {}))
+                break
+            except TelegramRetryAfter as e:
+                wait = e.retry_after
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                rejects += 1
+                if rejects >= self.max_rejects:
+                    await asyncio.to_thread(self._mark_failed, item_id)
+                    self.stats["failed"] += 1
+                    logger.error(f"Уведомление {item_id} отклонено Telegram и отложено в спул: {e}")
+                    return
+                wait = delay
+                logger.warning(f"Telegram отклонил уведомление {item_id} ({e}), повтор через {wait:.0f} с")
+            except Exception as e:
+                wait = delay
+                logger.warning(f"Не удалось отправить уведомление {item_id} ({e}), повтор через {wait:.0f} с")
+            self.stats["retries"] += 1
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, self.max_backoff)
+        await asyncio.to_thread(self._remove, item_id)
+        self.stats["sent"] += 1
+        # Задержка от постановки в очередь до доставки, включая повторы
+        self.stats["last_delivery_seconds"] = time.time() - payload.get("created_at", time.time())
@@ -0,0 +1,58 @@
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+
+def new_order_id(now: Optional[datetime] = None) -> str:
+    """Короткий номер заказа: дата оформления и случайный хвост, например 260118-4F9A2C"""
+    now = now or datetime.now()
+    return f"{now:%y%m%d}-{secrets.token_hex(3).upper()}"
+
+
+class OrderIdempotencyIndex:
+    """Помнит уже подтверждённые заказы, чтобы повторное нажатие не создавало дубль.
+
+    Ключ — номер заказа, значение — короткий итог обработки, которым
+    отвечают на повторы. Записи живут ttl секунд, а при переполнении
+    вытесняются самые старые, так что индекс не растёт бесконечно.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 86400):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        # order_id -> (записано в, итог); порядок вставки совпадает с порядком истечения
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats: Dict[str, int] = {"recorded": 0, "repeats": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            order_id, (recorded_at, _) = next(iter(entries.items()))
+            if now - recorded_at < self.ttl and len(entries) <= self.max_size:
+                break
+            del entries[order_id]
+            self.stats["evicted"] += 1
+
+    def get(self, order_id: str) -> Optional[str]:
+        """Итог обработки заказа или None, если заказ ещё не подтверждался"""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(order_id)
+        if entry is None:
+            return None
+        self.stats["repeats"] += 1
+        return entry[1]
+
+    def record(self, order_id: str, result: str) -> None:
+        self._entries.pop(order_id, None)
+        self._entries[order_id] = (time.monotonic(), result)
+        self.stats["recorded"] += 1
+        self._expire(time.monotonic())
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "size": len(self._entries)}
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+logger = logging.getLogger(__name__)
+
+# Служебные методы не расходуют лимит: они не отправляют сообщений, а ответ
+# на нажатие кнопки должен уходить сразу, иначе у клиента крутятся часики
+_EXEMPT_METHODS = frozenset({
+    "getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo",
+    "answerCallbackQuery", "getFile",
+})
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас.
+
+    Ожидающие обслуживаются по очереди (FIFO) — никто не обгоняет
+    запрос, пришедший раньше.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def idle(self) -> bool:
+        """Ведро полное и никого не ждёт — его можно выбросить без потери состояния"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.waiters == 0 and self.tokens >= self.capacity and now >= self.paused_until
+
+    async def acquire(self) -> float:
+        """Забирает токен, при необходимости ожидая. Возвращает время ожидания в секундах"""
+        started = time.monotonic()
+        self.waiters += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    if now < self.paused_until:
+                        await asyncio.sleep(self.paused_until - now)
+                        continue
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiters -= 1
+        return time.monotonic() - started
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Ограничитель исходящих запросов к Bot API на уровне сессии бота.
+
+    Каждый запрос берёт токен из общего ведра (лимит бота целиком) и из ведра
+    своего чата, поэтому при наплыве запросы ждут в очереди, а не падают с 429.
+    Если Telegram всё же ответил retry_after, чат (или весь бот для запросов
+    без чата) ставится на паузу и запрос повторяется.
+
+    Подключение: bot.session.middleware(RateLimitMiddleware(...))
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        max_retries: int = 3,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self.stats: Dict[str, float] = {
+            "requests": 0,
+            "delayed": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "retry_after": 0,
+        }
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= 10000:
+                # Выбрасываем вёдра чатов, которые давно ничего не отправляли
+                for key in [k for k, b in self._chat_buckets.items() if b.idle()]:
+                    del self._chat_buckets[key]
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def queue_depth(self) -> int:
+        return self.global_bucket.waiters + sum(b.waiters for b in self._chat_buckets.values())
+
+    def metrics(self) -> Dict[str, float]:
+        return {**self.stats, "queue_depth": self.queue_depth(), "chats_tracked": len(self._chat_buckets)}
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if method.__api_method__ in _EXEMPT_METHODS:
+            return await make_request(bot, method)
+
+        chat_id: Optional[Any] = getattr(method, "chat_id", None)
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        attempt = 0
+        while True:
+            # Сначала очередь своего чата, затем общий лимит
+            waited = await chat_bucket.acquire() if chat_bucket is not None else 0.0
+            waited += await self.global_bucket.acquire()
+            self.stats["requests"] += 1
+            if waited > 0.001:
+                self.stats["delayed"] += 1
+                self.stats["wait_seconds_total"] += waited
+                self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.stats["retry_after"] += 1
+                if attempt > self.max_retries:
+                    raise
+                logger.warning(
+                    f"Flood limit на {method.__api_method__} (чат {chat_id}), пауза {e.retry_after} с"
+                )
+                (chat_bucket or self.global_bucket).pause(e.retry_after)
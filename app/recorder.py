@@ -0,0 +1,190 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Версия формата записи; replay отказывается читать незнакомую
+RECORD_FORMAT = 1
+
+# Какие поля обновлений попадают в запись — всё остальное отбрасывается
+_UPDATE_FIELDS = ("message", "edited_message", "callback_query")
+_MESSAGE_FIELDS = frozenset({
+    "message_id", "date", "chat", "from", "text", "caption", "entities",
+    "caption_entities", "photo", "sticker", "contact", "message_thread_id",
+})
+_CALLBACK_FIELDS = frozenset({"id", "from", "message", "inline_message_id", "chat_instance", "data"})
+_USER_FIELDS = frozenset({"id", "is_bot", "first_name", "language_code", "type"})
+
+# Тексты кнопок главного меню (app/keyboards.main_menu_kb) — по ним выбирается обработчик,
+# поэтому они записываются как есть; любой другой свободный текст маскируется
+_MENU_PREFIXES = ("🍰 Каталог", "🛒 Корзина", "⭐ Отзывы")
+
+# Похоже на телефон: цифры со скобками, пробелами и дефисами
+_PHONE_LIKE = re.compile(r"\+?\d[\d\s()\-]{8,}\d")
+
+
+def _mask(text: str) -> str:
+    """Заменяет буквы на x и цифры на 0, сохраняя длину и форму текста"""
+    return "".join("0" if ch.isdigit() else "x" if ch.isalpha() else ch for ch in text)
+
+
+def _mask_phones(text: str) -> str:
+    return _PHONE_LIKE.sub(
+        lambda m: _mask(m.group()) if sum(ch.isdigit() for ch in m.group()) >= 10 else m.group(), text
+    )
+
+
+def scrub_text(text: str) -> str:
+    """Текст сообщения без персональных данных.
+
+    Команды и кнопки меню сохраняются (в аргументах команд маскируются
+    телефоны), весь остальной текст — имя, телефон, адрес, комментарий —
+    маскируется с сохранением длины.
+    """
+    if text.startswith("/"):
+        return _mask_phones(text)
+    if text.startswith(_MENU_PREFIXES):
+        return text
+    return _mask(text)
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Записывает входящие обновления в файл для последующего воспроизведения.
+
+    Подключается к dp.update как внешний middleware и видит все обновления
+    до склейки нажатий и очередей пользователей. Каждое обновление — строка
+    {"t": секунды от начала записи, "u": обновление}; первая строка сеанса —
+    заголовок с версией формата. Из обновлений остаются только поля, нужные
+    обработчикам: имена и username заменяются, тексты и телефоны маскируются,
+    а id пользователей и чатов — псевдонимы, стабильные в пределах сеанса
+    (ключ псевдонимов случайный и нигде не сохраняется).
+
+    Запись буферизуется и сбрасывается на диск раз в flush_interval секунд.
+    """
+
+    def __init__(self, path: str, manager_chat_id: Optional[int] = None, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._key = secrets.token_bytes(16)
+        self._manager_chat_id = manager_chat_id
+        self._file = None
+        self._started = 0.0
+        self._flushed_at = 0.0
+        self.stats: Dict[str, int] = {"recorded": 0, "skipped": 0, "errors": 0}
+
+    def metrics(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+    def pseudonym(self, value: int) -> int:
+        """Стабильный псевдоним id; знак сохраняется (у групп id отрицательные)"""
+        digest = hmac.new(self._key, str(abs(value)).encode(), hashlib.sha256).digest()
+        alias = int.from_bytes(digest[:4], "big") % 2_000_000_000 + 1
+        return -alias if value < 0 else alias
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._started = self._flushed_at = time.monotonic()
+        header = {
+            "format": RECORD_FORMAT,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "manager_chat_id": (
+                self.pseudonym(self._manager_chat_id) if self._manager_chat_id is not None else None
+            ),
+        }
+        self._write(header)
+        self._file.flush()
+        logger.info(f"Запись обновлений в {self.path}")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _user(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        scrubbed = {k: v for k, v in user.items() if k in _USER_FIELDS}
+        scrubbed["id"] = self.pseudonym(user["id"])
+        if "first_name" in scrubbed:
+            scrubbed["first_name"] = "user"
+        return scrubbed
+
+    def _message(self, message: Dict[str, Any], keep_text: bool = True) -> Dict[str, Any]:
+        scrubbed = {k: v for k, v in message.items() if k in _MESSAGE_FIELDS}
+        scrubbed["chat"] = self._user(message["chat"])
+        if "from" in scrubbed:
+            scrubbed["from"] = self._user(message["from"])
+        for key, entities in (("text", "entities"), ("caption", "caption_entities")):
+            if key in scrubbed:
+                if keep_text:
+                    scrubbed[key] = scrub_text(scrubbed[key])
+                else:
+                    # Сообщение бота под кнопкой: обработчикам нужны только его id и дата
+                    del scrubbed[key]
+                    scrubbed.pop(entities, None)
+        if "contact" in scrubbed:
+            contact = scrubbed["contact"]
+            scrubbed["contact"] = {"phone_number": _mask(contact.get("phone_number", "")), "first_name": "user"}
+            if contact.get("user_id") is not None:
+                scrubbed["contact"]["user_id"] = self.pseudonym(contact["user_id"])
+        return scrubbed
+
+    def scrub(self, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Обновление в виде для записи или None, если такие обновления не записываются"""
+        for kind in _UPDATE_FIELDS:
+            if kind not in update:
+                continue
+            payload = update[kind]
+            if kind == "callback_query":
+                scrubbed = {k: v for k, v in payload.items() if k in _CALLBACK_FIELDS}
+                scrubbed["from"] = self._user(payload["from"])
+                # chat_instance обработчики не читают, но поле обязательно
+                scrubbed["chat_instance"] = str(scrubbed["from"]["id"])
+                if "message" in payload:
+                    scrubbed["message"] = self._message(payload["message"], keep_text=False)
+            else:
+                scrubbed = self._message(payload)
+            return {"update_id": update["update_id"], kind: scrubbed}
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self._file is not None and isinstance(event, Update):
+            try:
+                self.record(event)
+            except Exception as e:
+                # Запись — вспомогательная функция и не должна мешать обработке
+                self.stats["errors"] += 1
+                logger.error(f"Не удалось записать обновление {event.update_id}: {e}")
+        return await handler(event, data)
+
+    def record(self, update: Update) -> None:
+        scrubbed = self.scrub(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+        if scrubbed is None:
+            self.stats["skipped"] += 1
+            return
+        now = time.monotonic()
+        self._write({"t": round(now - self._started, 3), "u": scrubbed})
+        self.stats["recorded"] += 1
+        if now - self._flushed_at >= self.flush_interval:
+            self._file.flush()
+            self._flushed_at = now
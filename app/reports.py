@@ -0,0 +1,181 @@
+import time
+from datetime import date, datetime, timedelta
+from html import escape
+from typing import Dict, Iterable, List, Optional
+
+from .catalog import get_catalog
+from .journal import DaySummary
+from .metrics import MetricsRegistry
+
+# Лимит длины одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+_DAY_WORDS = {"today": 0, "сегодня": 0, "tomorrow": 1, "завтра": 1, "yesterday": -1, "вчера": -1}
+
+
+def parse_day(arg: Optional[str], today: date, default_shift: int = 0) -> Optional[str]:
+    """Дата из аргумента команды: 2026-10-20, 20.10.2026, 20.10, today/tomorrow, сегодня/завтра.
+
+    Без аргумента — today + default_shift дней. Возвращает ISO-дату или None.
+    """
+    arg = (arg or "").strip().lower()
+    if not arg:
+        return (today + timedelta(days=default_shift)).isoformat()
+    if arg in _DAY_WORDS:
+        return (today + timedelta(days=_DAY_WORDS[arg])).isoformat()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(arg, fmt).date().isoformat()
+        except ValueError:
+            pass
+    try:
+        parsed = datetime.strptime(arg, "%d.%m").date().replace(year=today.year)
+    except ValueError:
+        return None
+    return parsed.isoformat()
+
+
+def _cake_name(cake_id: str) -> str:
+    cake = get_catalog().get(cake_id)
+    return cake.name if cake is not None else cake_id
+
+
+def _date_ru(date_iso: str) -> str:
+    y, m, d = date_iso.split("-")
+    return f"{d}.{m}.{y}"
+
+
+def _items_text(items: dict) -> str:
+    return ", ".join(f"{escape(_cake_name(cake_id))} × {qty}" for cake_id, qty in items.items())
+
+
+def format_order(record: dict) -> str:
+    lines = [
+        f"🧾 <b>№{escape(record['order_id'])}</b> — {escape(record.get('delivery_time') or '—')}, "
+        f"{record.get('total', 0)}₽",
+        f"👤 {escape(record.get('full_name') or '—')}, {escape(record.get('phone') or '—')}",
+        f"🍰 {_items_text(record.get('items') or {})}",
+    ]
+    if record.get("delivery_method") == "доставка":
+        lines.append(f"🚚 {escape(record.get('address') or 'адрес не указан')}")
+    if record.get("comment") and record["comment"] != "без комментария":
+        lines.append(f"💬 {escape(record['comment'])}")
+    if record.get("slot_confirmed") is False:
+        lines.append("⚠️ слот переполнен")
+    return "\n".join(lines)
+
+
+def format_day_orders(summary: DaySummary) -> str:
+    if not summary.orders:
+        return f"📅 На {_date_ru(summary.date)} заказов нет."
+    header = (
+        f"📅 <b>Заказы на {_date_ru(summary.date)}</b>: {len(summary.orders)} шт., "
+        f"на сумму {summary.revenue}₽"
+    )
+    orders = sorted(summary.orders, key=lambda r: r.get("delivery_time") or "")
+    return "\n\n".join([header] + [format_order(r) for r in orders])
+
+
+def format_plan(summary: DaySummary) -> str:
+    """План выпечки: что и к какому времени приготовить"""
+    if not summary.orders:
+        return f"🧁 На {_date_ru(summary.date)} выпекать нечего — заказов нет."
+    lines = [f"🧁 <b>План на {_date_ru(summary.date)}</b>", ""]
+    for slot_time in sorted(summary.by_slot):
+        lines.append(f"⏰ <b>{escape(slot_time)}</b>: {_items_text(summary.by_slot[slot_time])}")
+    lines.append("")
+    lines.append(f"Всего: {_items_text(summary.cakes)}")
+    lines.append(f"Заказов: {len(summary.orders)}, сумма {summary.revenue}₽")
+    return "\n".join(lines)
+
+
+def format_found(query: str, records: List[dict], limit: int = 20) -> str:
+    if not records:
+        return f"🔍 По запросу «{escape(query)}» заказов не найдено."
+    # Сначала самые свежие
+    latest = sorted(records, key=lambda r: r.get("created_at") or "", reverse=True)[:limit]
+    header = f"🔍 Найдено заказов: {len(records)}"
+    if len(records) > limit:
+        header += f" (показаны последние {limit})"
+    return "\n\n".join(
+        [header] + [f"📅 {_date_ru(r['delivery_date'])}\n" + format_order(r) if r.get("delivery_date")
+                    else format_order(r) for r in latest]
+    )
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> Iterable[str]:
+    """Режет длинный текст на сообщения по границам строк.
+
+    Строка длиннее limit (например, длинный комментарий к заказу) режется по limit символов.
+    """
+    chunk: List[str] = []
+    size = 0
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if chunk:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+        if chunk and size + len(line) + 1 > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def _seconds_ms(value: float) -> str:
+    return f"{value * 1000:.0f} мс"
+
+
+def format_stats(registry: MetricsRegistry, paid_orders: int, top: int = 10) -> str:
+    """Сводка метрик для команды /stats"""
+    uptime = int(time.time() - registry.started_at)
+    lines = [f"📊 <b>Статистика</b> (работает {uptime // 3600} ч {uptime % 3600 // 60} мин)", ""]
+
+    handlers = sorted(
+        registry.histograms("handler_duration_seconds").items(), key=lambda item: -item[1].count
+    )
+    if handlers:
+        lines.append("<b>Обработчики</b> (вызовов, среднее / p95):")
+        for labels, h in handlers[:top]:
+            name = dict(labels)["handler"]
+            lines.append(f"• {escape(name)}: {h.count}, {_seconds_ms(h.sum / h.count)} / {_seconds_ms(h.quantile(0.95))}")
+        errors = sum(registry.counters("handler_errors_total").values())
+        if errors:
+            lines.append(f"⚠️ Ошибок в обработчиках: {errors:g}")
+        lines.append("")
+
+    api = registry.histograms("api_request_duration_seconds")
+    api_errors: Dict[str, float] = {}
+    for labels, value in registry.counters("api_errors_total").items():
+        method = dict(labels)["method"]
+        api_errors[method] = api_errors.get(method, 0) + value
+    if api:
+        total = sum(h.count for h in api.values())
+        lines.append(f"<b>Bot API</b>: {total} запросов, ошибок {sum(api_errors.values()):g}")
+        if paid_orders:
+            # Опрос getUpdates идёт независимо от клиентов и в расчёт не входит
+            polling = sum(h.count for labels, h in api.items() if dict(labels)["method"] == "getUpdates")
+            lines.append(f"≈ {(total - polling) / paid_orders:.1f} запросов на оплаченный заказ")
+        for labels, h in sorted(api.items(), key=lambda item: -item[1].count)[:top]:
+            method = dict(labels)["method"]
+            error_rate = api_errors.get(method, 0) / h.count * 100
+            lines.append(
+                f"• {method}: {h.count}, {_seconds_ms(h.sum / h.count)} / {_seconds_ms(h.quantile(0.95))}"
+                + (f", ошибок {error_rate:.1f}%" if error_rate else "")
+            )
+        lines.append("")
+
+    components = registry.collect()
+    if components:
+        lines.append("<b>Компоненты</b>:")
+        for component, values in components.items():
+            shown = ", ".join(
+                f"{key}={value:g}" for key, value in values.items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            )
+            lines.append(f"• {component}: {shown}")
+    return "\n".join(lines).rstrip()
@@ -0,0 +1,155 @@
+import logging
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from .config import (
+    BAKER_SCHEDULE_START_DATE, WORK_CYCLE_ON_DAYS, WORK_CYCLE_OFF_DAYS,
+    WORKING_HOURS_START, WORKING_HOURS_END, SLOT_MINUTES,
+    MIN_LEAD_HOURS, MAX_DAYS_AHEAD, BAKER_DAYS_OFF, BAKER_EXTRA_WORKDAYS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        y, m, d = [int(x) for x in value.strip().split("-")]
+        return date(y, m, d)
+    except Exception:
+        return None
+
+
+def _parse_date_list(raw: str) -> FrozenSet[date]:
+    """Разбирает список дат через запятую: «2026-12-31,2027-01-01»"""
+    days = set()
+    for part in raw.split(","):
+        if not part.strip():
+            continue
+        day = _parse_date(part)
+        if day is None:
+            logger.warning(f"Пропущена некорректная дата в расписании: {part!r}")
+        else:
+            days.add(day)
+    return frozenset(days)
+
+
+class ScheduleCalendar:
+    """Календарь предзаказа: рабочие дни и слоты на горизонт MAX_DAYS_AHEAD.
+
+    Таблицы «дата -> слоты» строятся один раз и пересобираются, только когда
+    ближайший слот уходит за минимальный срок заказа или наступает новый день.
+    Поверх цикла «N на / M от» накладываются выходные (days_off) и
+    дополнительные рабочие дни (extra_workdays).
+    """
+
+    def __init__(
+        self,
+        cycle_start: date,
+        on_days: int,
+        off_days: int,
+        hours_start: int,
+        hours_end: int,
+        slot_minutes: int,
+        min_lead_hours: int,
+        max_days_ahead: int,
+        days_off: Iterable[date] = (),
+        extra_workdays: Iterable[date] = (),
+    ):
+        self.cycle_start = cycle_start
+        self.on_days = on_days
+        self.cycle = on_days + off_days
+        self.max_days_ahead = max_days_ahead
+        self.min_lead = timedelta(hours=min_lead_hours)
+        self.days_off = frozenset(days_off)
+        self.extra_workdays = frozenset(extra_workdays)
+
+        # Сетка слотов одинакова для всех рабочих дней: (начало от полуночи, «ЧЧ:ММ»)
+        grid = []
+        step = timedelta(minutes=slot_minutes) if slot_minutes > 0 else None
+        if step is not None:
+            cursor = timedelta(hours=hours_start)
+            end = timedelta(hours=hours_end)
+            while cursor + step <= end:
+                total_minutes = int(cursor.total_seconds()) // 60
+                grid.append((cursor, f"{total_minutes // 60:02d}:{total_minutes % 60:02d}"))
+                cursor += step
+        self._grid: Tuple[Tuple[timedelta, str], ...] = tuple(grid)
+
+        self._dates: Tuple[str, ...] = ()
+        self._slots: Dict[str, Tuple[str, ...]] = {}
+        self._built_at: Optional[datetime] = None
+        self._stale_after: Optional[datetime] = None
+
+    def is_working_day(self, day: date) -> bool:
+        if day in self.days_off:
+            return False
+        if day in self.extra_workdays:
+            return True
+        if self.cycle <= 0:
+            return True
+        return (day - self.cycle_start).days % self.cycle < self.on_days
+
+    def _rebuild(self, now_dt: datetime) -> None:
+        min_dt = now_dt + self.min_lead
+        today = now_dt.date()
+        dates = []
+        slots: Dict[str, Tuple[str, ...]] = {}
+        # Следующий момент, когда набор слотов изменится: ближайший слот
+        # перестанет проходить по минимальному сроку, либо начнутся новые сутки
+        stale_after = datetime.combine(today + timedelta(days=1), dt_time.min) - timedelta(microseconds=1)
+        for i in range(self.max_days_ahead + 1):
+            day = today + timedelta(days=i)
+            if not self.is_working_day(day):
+                continue
+            midnight = datetime.combine(day, dt_time.min)
+            day_slots = []
+            for offset, label in self._grid:
+                slot_dt = midnight + offset
+                if slot_dt >= min_dt:
+                    day_slots.append(label)
+                    stale_after = min(stale_after, slot_dt - self.min_lead)
+            if day_slots:
+                iso = day.isoformat()
+                dates.append(iso)
+                slots[iso] = tuple(day_slots)
+        self._dates = tuple(dates)
+        self._slots = slots
+        self._built_at = now_dt
+        self._stale_after = stale_after
+
+    def _ensure_fresh(self, now_dt: datetime) -> None:
+        if (
+            self._built_at is None
+            or now_dt < self._built_at
+            or now_dt > self._stale_after
+        ):
+            self._rebuild(now_dt)
+
+    def available_dates(self, now_dt: datetime) -> Tuple[str, ...]:
+        """Даты (ISO) в пределах горизонта, на которые есть хотя бы один слот"""
+        self._ensure_fresh(now_dt)
+        return self._dates
+
+    def slots_for_date(self, target_date_iso: str, now_dt: datetime) -> Tuple[str, ...]:
+        """Свободные по времени слоты «ЧЧ:ММ» на дату; пусто, если дата недоступна"""
+        self._ensure_fresh(now_dt)
+        return self._slots.get(target_date_iso, ())
+
+
+def create_schedule() -> ScheduleCalendar:
+    cycle_start = _parse_date(BAKER_SCHEDULE_START_DATE)
+    if cycle_start is None:
+        logger.warning(f"Некорректная BAKER_SCHEDULE_START_DATE={BAKER_SCHEDULE_START_DATE!r}, цикл начат с сегодня")
+        cycle_start = date.today()
+    return ScheduleCalendar(
+        cycle_start=cycle_start,
+        on_days=WORK_CYCLE_ON_DAYS,
+        off_days=WORK_CYCLE_OFF_DAYS,
+        hours_start=WORKING_HOURS_START,
+        hours_end=WORKING_HOURS_END,
+        slot_minutes=SLOT_MINUTES,
+        min_lead_hours=MIN_LEAD_HOURS,
+        max_days_ahead=MAX_DAYS_AHEAD,
+        days_off=_parse_date_list(BAKER_DAYS_OFF),
+        extra_workdays=_parse_date_list(BAKER_EXTRA_WORKDAYS),
+    )
@@ -0,0 +1,159 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message, ReplyKeyboardMarkup
+
+from .media import MediaCache
+from .storage import IdleLRU
+
+logger = logging.getLogger(__name__)
+
+Markup = Union[InlineKeyboardMarkup, ReplyKeyboardMarkup, None]
+
+# Сколько запросов стоил экран до правки на месте: удаление и новая отправка
+_BASELINE_CALLS = 2
+
+
+@dataclass
+class Screen:
+    message_id: Optional[int]
+    photo: bool
+    # Reply-клавиатура, которую чат видит сейчас (её нельзя прикрепить правкой сообщения)
+    keyboard: Optional[ReplyKeyboardMarkup] = None
+
+
+class ScreenRenderer:
+    """Показывает «экраны» навигации (каталог, карточку, корзину, главное меню),
+    по возможности правя текущее сообщение бота вместо удаления и отправки нового.
+
+    Для нажатия инлайн-кнопки правится сообщение с этой кнопкой: текст — через
+    editMessageText, фото — через editMessageMedia. Для кнопок главного меню
+    (сообщение пользователя) сообщение пользователя, как и раньше, удаляется,
+    а правится последний экран чата, если он стоит прямо над ним. Удалить
+    и отправить заново приходится, только когда меняется тип сообщения
+    (текст ↔ фото), нужна новая reply-клавиатура или правка не удалась.
+
+    stats["saved_calls"] — сколько запросов к Bot API сэкономлено по сравнению
+    с удалением и повторной отправкой каждого экрана (с начала работы бота;
+    неудачная правка стоит лишний запрос и уменьшает счётчик).
+    """
+
+    def __init__(self, media: MediaCache, ttl: float, max_entries: int,
+                 sweep_interval: float = 300, edit_in_place: bool = True):
+        self.media = media
+        self.edit_in_place = edit_in_place
+        self.sweep_interval = sweep_interval
+        self._screens = IdleLRU(ttl, max_entries)
+        self._swept_at = time.monotonic()
+        self.stats: Dict[str, int] = {"edited": 0, "replaced": 0, "sent": 0, "edit_failed": 0, "saved_calls": 0}
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "chats": len(self._screens)}
+
+    def _remember(self, chat_id: int, screen: Screen) -> None:
+        self._screens.set(chat_id, screen)
+        now = time.monotonic()
+        if now - self._swept_at >= self.sweep_interval:
+            self._swept_at = now
+            self._screens.sweep()
+
+    def remember_keyboard(self, chat_id: int, keyboard: ReplyKeyboardMarkup) -> None:
+        """Отмечает reply-клавиатуру, отправленную в чат в обход рендерера (например, по /start)"""
+        screen = self._screens.get(chat_id)
+        if screen is not None:
+            screen.keyboard = keyboard
+        else:
+            self._remember(chat_id, Screen(message_id=None, photo=False, keyboard=keyboard))
+
+    async def show(
+        self,
+        event: Union[Message, CallbackQuery],
+        text: str,
+        reply_markup: Markup = None,
+        photo_url: Optional[str] = None,
+    ) -> None:
+        """Показывает экран: text — текст или подпись к фото photo_url"""
+        if isinstance(event, CallbackQuery):
+            anchor = event.message if isinstance(event.message, Message) else None
+            if anchor is None:
+                return
+            chat_id = anchor.chat.id
+            target_id, target_photo = anchor.message_id, bool(anchor.photo)
+            calls = 0
+        else:
+            anchor = event
+            chat_id = event.chat.id
+            # Кнопка главного меню — это сообщение пользователя, убираем его из чата
+            await self._delete(event.bot, chat_id, event.message_id)
+            calls = 1
+            target_id, target_photo = None, False
+        screen = self._screens.get(chat_id)
+        keyboard = screen.keyboard if screen is not None else None
+        if isinstance(event, Message) and screen is not None and screen.message_id == event.message_id - 1:
+            # Править можно только экран прямо над нажатием, иначе правку не будет видно
+            target_id, target_photo = screen.message_id, screen.photo
+
+        if isinstance(reply_markup, ReplyKeyboardMarkup):
+            # Reply-клавиатуру правкой не прикрепить; если чат уже видит такую же, правим без неё
+            editable = reply_markup == keyboard
+            edit_markup = None
+        else:
+            editable = True
+            edit_markup = reply_markup
+        if self.edit_in_place and editable and target_id is not None and target_photo == bool(photo_url):
+            calls += 1
+            if await self._edit(anchor, chat_id, target_id, text, edit_markup, photo_url):
+                self.stats["edited"] += 1
+                self.stats["saved_calls"] += _BASELINE_CALLS - calls
+                self._remember(chat_id, Screen(target_id, bool(photo_url), keyboard))
+                return
+
+        if isinstance(event, CallbackQuery):
+            # Тип сообщения меняется: прежний экран убираем, новый отправляем вниз чата
+            calls += 1
+            await self._delete(event.bot, chat_id, target_id)
+            self.stats["replaced"] += 1
+        else:
+            self.stats["sent"] += 1
+        calls += 1
+        if photo_url:
+            sent = await self.media.answer_photo(anchor, photo_url, caption=text, reply_markup=reply_markup)
+        else:
+            sent = await anchor.answer(text, reply_markup=reply_markup)
+        self.stats["saved_calls"] += _BASELINE_CALLS - calls
+        if isinstance(reply_markup, ReplyKeyboardMarkup):
+            keyboard = reply_markup
+        self._remember(chat_id, Screen(sent.message_id, bool(photo_url), keyboard))
+
+    async def _edit(
+        self, anchor: Message, chat_id: int, message_id: int, text: str,
+        reply_markup: Optional[InlineKeyboardMarkup], photo_url: Optional[str],
+    ) -> bool:
+        try:
+            if photo_url:
+                await self.media.edit_photo(
+                    anchor.bot, chat_id, message_id, photo_url, caption=text, reply_markup=reply_markup
+                )
+            else:
+                await anchor.bot.edit_message_text(
+                    text=text, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup
+                )
+            return True
+        except TelegramBadRequest as e:
+            if "not modified" in str(e):
+                # Экран уже показывает то же самое
+                return True
+            # Сообщение удалено, слишком старое или другого типа — отправим заново
+            self.stats["edit_failed"] += 1
+            logger.debug(f"Не удалось изменить сообщение {message_id} в чате {chat_id}: {e}")
+            return False
+
+    @staticmethod
+    async def _delete(bot, chat_id: int, message_id: int) -> None:
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        except Exception:
+            pass
@@ -0,0 +1,208 @@
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .config import SLOT_CAPACITY, SLOT_CAPACITY_OVERRIDES, CAKE_SLOT_WEIGHTS, SLOT_HOLD_MINUTES
+from .locks import KeyedLock
+
+logger = logging.getLogger(__name__)
+
+SlotKey = Tuple[str, str]  # (дата ISO, «ЧЧ:ММ»)
+
+
+@dataclass
+class _Hold:
+    slot: SlotKey
+    units: int
+    expires_at: float
+
+
+def _parse_overrides(raw: str) -> Tuple[Dict[SlotKey, int], Dict[str, int], Dict[str, int]]:
+    """Разбирает SLOT_CAPACITY_OVERRIDES.
+
+    Формат — пары через запятую: «2026-10-20 12:00=1» (конкретный слот),
+    «2026-10-20=4» (каждый слот этого дня), «12:00=3» (этот час в любой день).
+    """
+    per_slot: Dict[SlotKey, int] = {}
+    per_day: Dict[str, int] = {}
+    per_time: Dict[str, int] = {}
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            key, value = part.split("=", 1)
+            capacity = int(value)
+            key = key.strip()
+            if " " in key:
+                day, hhmm = key.split()
+                per_slot[(day, hhmm)] = capacity
+            elif ":" in key:
+                per_time[key] = capacity
+            else:
+                per_day[key] = capacity
+        except ValueError:
+            logger.warning(f"Пропущено некорректное правило вместимости слота: {part!r}")
+    return per_slot, per_day, per_time
+
+
+def _parse_weights(raw: str) -> Dict[str, int]:
+    """Разбирает CAKE_SLOT_WEIGHTS: «napoleon=2,cheesecake=2»"""
+    weights: Dict[str, int] = {}
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            cake_id, value = part.split("=", 1)
+            weights[cake_id.strip()] = int(value)
+        except ValueError:
+            logger.warning(f"Пропущен некорректный вес торта: {part!r}")
+    return weights
+
+
+class SlotReservations:
+    """Вместимость слотов предзаказа и атомарное резервирование.
+
+    Вместимость слота задаётся в «единицах» (по умолчанию один торт — одна
+    единица, тяжёлые торты можно взвесить через weights). Резерв бывает
+    временным (hold: держится hold_seconds, пока клиент оформляет заказ)
+    и подтверждённым (после оплаты). Занятость слотов хранится в индексе
+    в памяти; проверка и запись выполняются под блокировкой слота.
+    """
+
+    def __init__(
+        self,
+        default_capacity: int,
+        overrides: str = "",
+        weights: Optional[Mapping[str, int]] = None,
+        hold_seconds: float = 1800,
+    ):
+        self.default_capacity = default_capacity
+        self._per_slot, self._per_day, self._per_time = _parse_overrides(overrides)
+        self.weights = dict(weights or {})
+        self.hold_seconds = hold_seconds
+        self._reserved: Dict[SlotKey, int] = {}
+        self._holds: Dict[int, _Hold] = {}
+        self._expiry_heap: List[Tuple[float, int]] = []
+        self._locks = KeyedLock()
+        self._today = date.today().isoformat()
+
+    def capacity(self, date_iso: str, time_str: str) -> int:
+        slot = (date_iso, time_str)
+        if slot in self._per_slot:
+            return self._per_slot[slot]
+        if date_iso in self._per_day:
+            return self._per_day[date_iso]
+        return self._per_time.get(time_str, self.default_capacity)
+
+    def cart_units(self, items: Mapping[str, int]) -> int:
+        weights = self.weights
+        return sum(weights.get(cake_id, 1) * qty for cake_id, qty in items.items())
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, owner = heapq.heappop(heap)
+            hold = self._holds.get(owner)
+            # В куче могут остаться записи о давно заменённых холдах — сверяем срок
+            if hold is not None and hold.expires_at == expires_at:
+                del self._holds[owner]
+                self._unreserve(hold)
+                logger.info(f"Истёк резерв слота {hold.slot} пользователя {owner}")
+        # Раз в сутки выбрасываем прошедшие даты, чтобы индекс не рос бесконечно
+        today = date.today().isoformat()
+        if today != self._today:
+            self._today = today
+            for slot in [s for s in self._reserved if s[0] < today]:
+                del self._reserved[slot]
+            for owner in [o for o, h in self._holds.items() if h.slot[0] < today]:
+                del self._holds[owner]
+
+    def _unreserve(self, hold: _Hold) -> None:
+        left = self._reserved.get(hold.slot, 0) - hold.units
+        if left > 0:
+            self._reserved[hold.slot] = left
+        else:
+            self._reserved.pop(hold.slot, None)
+
+    def remaining(self, date_iso: str, time_str: str, owner: Optional[int] = None) -> int:
+        """Свободная вместимость; резерв самого owner считается свободным для него"""
+        self._expire()
+        slot = (date_iso, time_str)
+        free = self.capacity(date_iso, time_str) - self._reserved.get(slot, 0)
+        if owner is not None:
+            hold = self._holds.get(owner)
+            if hold is not None and hold.slot == slot:
+                free += hold.units
+        return free
+
+    def available_slots(
+        self, date_iso: str, slots: Iterable[str], units: int, owner: Optional[int] = None
+    ) -> Tuple[str, ...]:
+        return tuple(t for t in slots if self.remaining(date_iso, t, owner) >= units)
+
+    async def hold(self, owner: int, date_iso: str, time_str: str, units: int) -> bool:
+        """Временно резервирует слот за owner (прежний временный резерв снимается)"""
+        slot = (date_iso, time_str)
+        async with self._locks.hold(slot):
+            if self.remaining(date_iso, time_str, owner) < units:
+                return False
+            previous = self._holds.pop(owner, None)
+            if previous is not None:
+                self._unreserve(previous)
+            expires_at = time.monotonic() + self.hold_seconds
+            self._holds[owner] = _Hold(slot, units, expires_at)
+            self._reserved[slot] = self._reserved.get(slot, 0) + units
+            heapq.heappush(self._expiry_heap, (expires_at, owner))
+            return True
+
+    async def confirm(self, owner: int, date_iso: str, time_str: str, units: int) -> bool:
+        """Подтверждает резерв после оплаты.
+
+        Если временный резерв уже истёк, пытается занять слот заново.
+        Возвращает False, если слот к этому моменту переполнен — заказ всё равно
+        оплачен и учитывается в занятости, а решать ситуацию должен менеджер.
+        """
+        slot = (date_iso, time_str)
+        self._expire()
+        hold = self._holds.get(owner)
+        if hold is None or hold.slot != slot or hold.units != units:
+            if not await self.hold(owner, date_iso, time_str, units):
+                await self.release(owner)
+                async with self._locks.hold(slot):
+                    self._reserved[slot] = self._reserved.get(slot, 0) + units
+                return False
+        # Подтверждённые единицы остаются в _reserved, временный резерв больше не нужен
+        del self._holds[owner]
+        return True
+
+    async def release(self, owner: int) -> None:
+        """Снимает временный резерв owner (отмена или брошенное оформление)"""
+        hold = self._holds.get(owner)
+        if hold is None:
+            return
+        async with self._locks.hold(hold.slot):
+            if self._holds.get(owner) is hold:
+                del self._holds[owner]
+                self._unreserve(hold)
+
+    def restore(self, date_iso: str, time_str: str, units: int) -> None:
+        """Учитывает уже подтверждённый заказ (например, при загрузке журнала заказов)"""
+        if date_iso < self._today:
+            return
+        slot = (date_iso, time_str)
+        self._reserved[slot] = self._reserved.get(slot, 0) + units
+
+
+def create_slot_reservations() -> SlotReservations:
+    return SlotReservations(
+        default_capacity=SLOT_CAPACITY,
+        overrides=SLOT_CAPACITY_OVERRIDES,
+        weights=_parse_weights(CAKE_SLOT_WEIGHTS),
+        hold_seconds=SLOT_HOLD_MINUTES * 60,
+    )
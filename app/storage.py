@@ -0,0 +1,635 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .cart import Cart
+from .config import CART_STORAGE, CART_DB_PATH, CART_CACHE_SIZE, CART_FLUSH_INTERVAL
+from .config import FSM_STORAGE, FSM_DB_PATH, FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL, FSM_SESSION_TTL_HOURS
+from .config import CART_IDLE_TTL_HOURS, CART_MAX_ENTRIES, FSM_MAX_ENTRIES, SWEEP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Маркер «ключа нет в базе» — кешируем и отрицательные ответы
+_MISSING = object()
+
+
+async def _sweep_periodically(sweep: Callable[[], Awaitable[int]], interval: float, what: str) -> None:
+    """Фоновая задача: раз в interval секунд выбрасывает простаивающие записи"""
+    while True:
+        try:
+            removed = await sweep()
+            if removed:
+                logger.info(f"Очистка {what}: удалено {removed} неактивных записей")
+        except Exception as e:
+            logger.error(f"Ошибка очистки {what}: {e}")
+        await asyncio.sleep(interval)
+
+
+async def _cancel(task: Optional[asyncio.Task]) -> None:
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+class IdleLRU:
+    """Словарь в памяти с потолком по числу записей и сроком простоя.
+
+    Каждое обращение переносит запись в конец, поэтому в начале всегда самые
+    давно не использованные: при превышении max_entries они вытесняются сразу,
+    а sweep() выбрасывает записи, простаивающие дольше ttl секунд.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        # key -> [значение, время последнего обращения]
+        self._items: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.stats: Dict[str, int] = {"evicted_idle": 0, "evicted_overflow": 0}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        entry[1] = time.monotonic()
+        self._items.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._items[key] = [value, time.monotonic()]
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+            self.stats["evicted_overflow"] += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        entry = self._items.pop(key, None)
+        return entry[0] if entry is not None else None
+
+    def sweep(self) -> int:
+        deadline = time.monotonic() - self.ttl
+        removed = 0
+        while self._items:
+            key, (_, touched_at) = next(iter(self._items.items()))
+            if touched_at > deadline:
+                break
+            del self._items[key]
+            removed += 1
+        self.stats["evicted_idle"] += removed
+        return removed
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "live": len(self._items)}
+
+
+class SqliteKV:
+    """Таблица ключ → JSON в SQLite.
+
+    Методы синхронные и вызываются из пула потоков через asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, table: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_many(self, items: Dict[str, Optional[str]], touched: Iterable[str] = ()) -> None:
+        """Записывает пачку одной транзакцией. None в значении — удаление ключа.
+
+        touched — ключи, которые только читали: у них обновляется updated_at.
+        """
+        now = time.time()
+        upserts = [(k, v, now) for k, v in items.items() if v is not None]
+        deletes = [(k,) for k, v in items.items() if v is None]
+        touches = [(now, k) for k in touched]
+        with self._lock, self._conn:
+            if touches:
+                self._conn.executemany(f"UPDATE {self.table} SET updated_at = ? WHERE key = ?", touches)
+            if upserts:
+                self._conn.executemany(
+                    f"INSERT INTO {self.table} (key, value, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    upserts,
+                )
+            if deletes:
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", deletes)
+
+    def purge(self, before: float) -> List[str]:
+        """Удаляет записи, не тронутые с момента before. Возвращает их ключи."""
+        with self._lock, self._conn:
+            keys = [row[0] for row in self._conn.execute(
+                f"SELECT key FROM {self.table} WHERE updated_at < ?", (before,)
+            )]
+            if keys:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE updated_at < ?", (before,))
+        return keys
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindCache:
+    """Ограниченный LRU-кеш поверх SqliteKV с отложенной пакетной записью.
+
+    Запись сразу попадает в кеш и помечается «грязной»; фоновая задача раз в
+    flush_interval секунд сбрасывает все грязные ключи одной транзакцией.
+    Грязные записи не вытесняются из кеша, пока не будут сохранены.
+    encode/decode переводят объекты кеша в JSON-совместимый вид и обратно.
+
+    С track_access=True чтения тоже отмечаются: при сбросе у прочитанных
+    ключей обновляется updated_at, и purge() по нему удаляет записи, к которым
+    давно не обращались, а не те, что давно не менялись.
+    """
+
+    def __init__(
+        self,
+        backend: SqliteKV,
+        max_size: int,
+        flush_interval: float,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda raw: raw,
+        track_access: bool = False,
+    ):
+        self.backend = backend
+        self.track_access = track_access
+        self.encode = encode
+        self.decode = decode
+        self.max_size = max(1, max_size)
+        self.flush_interval = flush_interval
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._dirty: set = set()
+        # Прочитанные с последнего сброса (при track_access)
+        self._touched: set = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Только чтение из кеша, без обращения к диску."""
+        value = self._cache.get(key, _MISSING)
+        return None if value is _MISSING else value
+
+    async def get(self, key: str) -> Optional[Any]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            value = self._cache[key]
+            if value is _MISSING:
+                return None
+            if self.track_access:
+                self._touched.add(key)
+            return value
+        loaded = await asyncio.to_thread(self.backend.load, key)
+        # Пока читали с диска, ключ мог быть записан — свежие данные не затираем
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING and key not in self._cache:
+            value = _MISSING if loaded is None else self.decode(loaded)
+            self._cache[key] = value
+            self._trim(keep=key)
+        if value is _MISSING:
+            return None
+        if self.track_access:
+            self._touched.add(key)
+        return value
+
+    def size(self) -> int:
+        return len(self._cache)
+
+    def set(self, key: str, value: Any) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        self._dirty.add(key)
+        self._trim(keep=key)
+
+    def delete(self, key: str) -> None:
+        self.set(key, _MISSING)
+
+    def evict(self, keys: Iterable[str]) -> int:
+        """Убирает из кеша ключи, удалённые из базы в обход кеша (purge). Возвращает их число.
+
+        Ключ, изменённый или прочитанный после последнего сброса, остаётся
+        и будет записан заново при следующем сбросе.
+        """
+        evicted = 0
+        for key in keys:
+            if key in self._dirty:
+                continue
+            if key in self._touched:
+                self._dirty.add(key)
+                continue
+            if self._cache.pop(key, None) is not None:
+                evicted += 1
+        return evicted
+
+    def _trim(self, keep: Optional[str] = None) -> None:
+        """Вытесняет давние чистые записи; keep — только что добавленный ключ, его не трогаем.
+
+        Если все остальные записи грязные (например, сброс на диск не удаётся),
+        кеш временно превышает max_size до следующего успешного сброса.
+        """
+        if len(self._cache) <= self.max_size:
+            return
+        for key in list(self._cache):
+            if len(self._cache) <= self.max_size:
+                break
+            if key not in self._dirty and key != keep:
+                del self._cache[key]
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._dirty and not self._touched:
+                return 0
+            keys, self._dirty = self._dirty, set()
+            touched, self._touched = self._touched - keys, set()
+            batch: Dict[str, Optional[str]] = {}
+            for key in keys:
+                value = self._cache.get(key, _MISSING)
+                batch[key] = None if value is _MISSING else json.dumps(self.encode(value), ensure_ascii=False)
+            try:
+                await asyncio.to_thread(self.backend.write_many, batch, touched)
+            except Exception as e:
+                # Не теряем изменения: вернём ключи в очередь на следующий сброс
+                self._dirty.update(keys)
+                self._touched.update(touched)
+                logger.error(f"Ошибка записи в {self.backend.table}: {e}")
+                return 0
+            self._trim()
+            return len(batch)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self.backend.close()
+
+
+# ==================== ХРАНИЛИЩА КОРЗИН ====================
+
+class CartStore:
+    """Асинхронный интерфейс хранилища корзин: user_id -> Cart"""
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def peek(self, user_id: int) -> Cart:
+        """Корзина из памяти без ожидания диска (может быть пустой при промахе кеша)."""
+        raise NotImplementedError
+
+    async def get(self, user_id: int) -> Cart:
+        """Корзина пользователя; для нового пользователя — пустая и нигде не сохраняется."""
+        raise NotImplementedError
+
+    async def add(self, user_id: int, cake_id: str, qty: int = 1) -> Cart:
+        """Добавляет qty штук позиции и возвращает обновлённую корзину."""
+        raise NotImplementedError
+
+    async def pop(self, user_id: int) -> Cart:
+        """Удаляет корзину целиком и возвращает её содержимое."""
+        raise NotImplementedError
+
+    async def prune(self, user_id: int) -> List[str]:
+        """Убирает из корзины позиции, снятые из каталога. Возвращает их id."""
+        raise NotImplementedError
+
+    async def sweep(self) -> int:
+        """Выбрасывает давно не использованные корзины. Возвращает их число."""
+        return 0
+
+    def metrics(self) -> Dict[str, int]:
+        return {}
+
+
+class MemoryCartStore(CartStore):
+    """Корзины только в памяти процесса (теряются при перезапуске).
+
+    Корзины, к которым не обращались ttl секунд, выбрасывает фоновая задача;
+    при превышении max_entries сразу вытесняются самые давние.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, sweep_interval: float):
+        self._carts = IdleLRU(ttl, max_entries)
+        self.sweep_interval = sweep_interval
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(
+                _sweep_periodically(self.sweep, self.sweep_interval, "корзин")
+            )
+
+    async def close(self) -> None:
+        await _cancel(self._sweep_task)
+        self._sweep_task = None
+
+    def peek(self, user_id: int) -> Cart:
+        return self._carts.get(user_id) or Cart()
+
+    async def get(self, user_id: int) -> Cart:
+        return self.peek(user_id)
+
+    async def add(self, user_id: int, cake_id: str, qty: int = 1) -> Cart:
+        cart = self._carts.get(user_id)
+        if cart is None:
+            cart = Cart()
+            self._carts.set(user_id, cart)
+        cart.add(cake_id, qty)
+        return cart
+
+    async def pop(self, user_id: int) -> Cart:
+        return self._carts.pop(user_id) or Cart()
+
+    async def prune(self, user_id: int) -> List[str]:
+        cart = self._carts.get(user_id)
+        return cart.drop_unknown() if cart is not None else []
+
+    async def sweep(self) -> int:
+        return self._carts.sweep()
+
+    def metrics(self) -> Dict[str, int]:
+        return self._carts.metrics()
+
+
+class SqliteCartStore(CartStore):
+    """Корзины в SQLite с кешем в памяти и отложенной записью.
+
+    Память ограничена размером кеша; корзины, которые не открывали и не
+    меняли ttl секунд, фоновая задача удаляет из базы и из кеша.
+    """
+
+    def __init__(self, path: str, cache_size: int, flush_interval: float, ttl: float, sweep_interval: float):
+        self._kv = SqliteKV(path, "carts")
+        self._cache = WriteBehindCache(
+            self._kv, cache_size, flush_interval,
+            encode=Cart.to_dict, decode=Cart, track_access=True,
+        )
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._sweep_task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"evicted_idle": 0}
+
+    async def start(self) -> None:
+        await self._cache.start()
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(
+                _sweep_periodically(self.sweep, self.sweep_interval, "корзин")
+            )
+
+    async def close(self) -> None:
+        await _cancel(self._sweep_task)
+        self._sweep_task = None
+        await self._cache.close()
+
+    async def sweep(self) -> int:
+        # Сначала сбрасываем отметки о чтении: корзина, которую недавно открывали, не простаивает
+        await self._cache.flush()
+        removed = await asyncio.to_thread(self._kv.purge, time.time() - self.ttl)
+        # Удалённые из базы корзины не должны и дальше отдаваться из памяти
+        self._cache.evict(removed)
+        self.stats["evicted_idle"] += len(removed)
+        return len(removed)
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "live": self._cache.size()}
+
+    def peek(self, user_id: int) -> Cart:
+        return self._cache.peek(str(user_id)) or Cart()
+
+    async def get(self, user_id: int) -> Cart:
+        return await self._cache.get(str(user_id)) or Cart()
+
+    async def add(self, user_id: int, cake_id: str, qty: int = 1) -> Cart:
+        key = str(user_id)
+        cart = await self._cache.get(key) or Cart()
+        cart.add(cake_id, qty)
+        self._cache.set(key, cart)
+        return cart
+
+    async def pop(self, user_id: int) -> Cart:
+        key = str(user_id)
+        cart = await self._cache.get(key)
+        if cart is None:
+            return Cart()
+        self._cache.delete(key)
+        return cart
+
+    async def prune(self, user_id: int) -> List[str]:
+        key = str(user_id)
+        cart = await self._cache.get(key)
+        if cart is None:
+            return []
+        stale = cart.drop_unknown()
+        if stale:
+            self._cache.set(key, cart)
+        return stale
+
+
+# ==================== ХРАНИЛИЩЕ СОСТОЯНИЙ FSM ====================
+
+def _fsm_key(key: StorageKey) -> str:
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id:
+        parts.append(f"t{key.thread_id}")
+    if key.business_connection_id:
+        parts.append(f"b{key.business_connection_id}")
+    parts.append(key.destiny)
+    return ":".join(parts)
+
+
+class SqliteFSMStorage(BaseStorage):
+    """Состояния FSM и их данные в SQLite: оформление заказа переживает перезапуск.
+
+    Чтения обслуживаются из кеша в памяти, изменения сбрасываются на диск
+    пачками (тот же WriteBehindCache, что и у корзин). Сессии, не менявшиеся
+    дольше ttl секунд, считаются брошенными: при чтении они пусты, а фоновая
+    задача раз в purge_interval секунд удаляет их из базы.
+    """
+
+    def __init__(self, path: str, cache_size: int, flush_interval: float, ttl: float,
+                 purge_interval: float = 3600):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._kv = SqliteKV(path, "fsm")
+        # Значение: {"state": str | None, "data": dict, "touched_at": unix time}
+        self._cache = WriteBehindCache(self._kv, cache_size, flush_interval)
+        self._purge_task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"expired": 0, "purged": 0}
+
+    def _expired(self, record: dict) -> bool:
+        return time.time() - record.get("touched_at", 0) > self.ttl
+
+    async def _get(self, key: StorageKey) -> Optional[dict]:
+        cache_key = _fsm_key(key)
+        record = await self._cache.get(cache_key)
+        if record is not None and self._expired(record):
+            self._cache.delete(cache_key)
+            self.stats["expired"] += 1
+            return None
+        return record
+
+    async def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        cache_key = _fsm_key(key)
+        if state is None and not data:
+            # Пустую сессию не храним: state.clear() удаляет запись
+            if await self._cache.get(cache_key) is not None:
+                self._cache.delete(cache_key)
+            return
+        self._cache.set(cache_key, {"state": state, "data": data, "touched_at": time.time()})
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        new_state = state.state if isinstance(state, State) else state
+        await self._put(key, new_state, record["data"] if record else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get(key)
+        return record["state"] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        await self._put(key, record["state"] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get(key)
+        return record["data"].copy() if record else {}
+
+    async def purge(self) -> int:
+        """Удаляет из базы брошенные сессии"""
+        removed = len(await asyncio.to_thread(self._kv.purge, time.time() - self.ttl))
+        self.stats["purged"] += removed
+        return removed
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "live": self._cache.size()}
+
+    async def start(self) -> None:
+        await self._cache.start()
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(
+                _sweep_periodically(self.purge, self.purge_interval, "сессий оформления")
+            )
+
+    async def close(self) -> None:
+        await _cancel(self._purge_task)
+        self._purge_task = None
+        await self._cache.close()
+
+
+class MemoryFSMStorage(BaseStorage):
+    """Состояния FSM в памяти с вытеснением брошенных сессий.
+
+    В отличие от MemoryStorage из aiogram, чтение не создаёт записей, пустые
+    сессии не хранятся, а простаивающие дольше ttl секунд (и самые давние
+    сверх max_entries) выбрасываются.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, sweep_interval: float):
+        # StorageKey -> {"state": str | None, "data": dict}
+        self._sessions = IdleLRU(ttl, max_entries)
+        self.sweep_interval = sweep_interval
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        if state is None and not data:
+            self._sessions.pop(key)
+        else:
+            self._sessions.set(key, {"state": state, "data": data})
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._sessions.get(key)
+        new_state = state.state if isinstance(state, State) else state
+        self._put(key, new_state, record["data"] if record else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._sessions.get(key)
+        return record["state"] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self._sessions.get(key)
+        self._put(key, record["state"] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._sessions.get(key)
+        return record["data"].copy() if record else {}
+
+    async def sweep(self) -> int:
+        return self._sessions.sweep()
+
+    def metrics(self) -> Dict[str, int]:
+        return self._sessions.metrics()
+
+    async def start(self) -> None:
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(
+                _sweep_periodically(self.sweep, self.sweep_interval, "сессий оформления")
+            )
+
+    async def close(self) -> None:
+        await _cancel(self._sweep_task)
+        self._sweep_task = None
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Создаёт хранилище FSM по настройке FSM_STORAGE (memory | sqlite)."""
+    ttl = FSM_SESSION_TTL_HOURS * 3600
+    if FSM_STORAGE == "sqlite":
+        return SqliteFSMStorage(FSM_DB_PATH, FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL, ttl, purge_interval=SWEEP_INTERVAL)
+    if FSM_STORAGE != "memory":
+        logger.warning(f"Неизвестный FSM_STORAGE={FSM_STORAGE!r}, используется memory")
+    return MemoryFSMStorage(ttl, FSM_MAX_ENTRIES, SWEEP_INTERVAL)
+
+
+def create_cart_store() -> CartStore:
+    """Создаёт хранилище корзин по настройке CART_STORAGE (memory | sqlite)."""
+    ttl = CART_IDLE_TTL_HOURS * 3600
+    if CART_STORAGE == "sqlite":
+        return SqliteCartStore(CART_DB_PATH, CART_CACHE_SIZE, CART_FLUSH_INTERVAL, ttl, SWEEP_INTERVAL)
+    if CART_STORAGE != "memory":
+        logger.warning(f"Неизвестный CART_STORAGE={CART_STORAGE!r}, используется memory")
+    return MemoryCartStore(ttl, CART_MAX_ENTRIES, SWEEP_INTERVAL)
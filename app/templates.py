@@ -0,0 +1,309 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from html import escape
+from string import Formatter
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from .catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+
+# ===================== ШАБЛОНЫ =====================
+# Шаблон разбирается один раз при импорте: render() только склеивает готовые
+# куски текста и значения полей. Строка, состоящая из одного поля, пропускается
+# целиком, если значение пустое (например, адрес при самовывозе).
+
+class MessageTemplate:
+    """Разобранный заранее шаблон сообщения с полями {name}"""
+
+    __slots__ = ("name", "_lines")
+
+    def __init__(self, name: str, layout: str):
+        self.name = name
+        lines = []
+        for line in layout.strip("\n").split("\n"):
+            # Куски строки: (текст, имя поля после него или None)
+            parts = tuple((literal, field) for literal, field, _, _ in Formatter().parse(line))
+            only_field = parts[0][1] if len(parts) == 1 and not parts[0][0] else None
+            lines.append((parts, only_field))
+        self._lines = tuple(lines)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        out = []
+        for parts, only_field in self._lines:
+            if only_field is not None:
+                value = values[only_field]
+                if value != "":
+                    out.append(str(value))
+                continue
+            out.append("".join(
+                literal + (str(values[field]) if field is not None else "") for literal, field in parts
+            ))
+        return "\n".join(out)
+
+
+# ===================== ЗАКАЗ =====================
+
+_ITEM_BLOCK_CACHE_LIMIT = 1024
+_item_blocks: Dict[Tuple[int, Tuple[Tuple[str, int], ...]], str] = {}
+_item_block_stats = {"hits": 0, "misses": 0}
+
+
+def item_block(items: Mapping[str, int]) -> str:
+    """Строки позиций корзины для текста заказа, закешированные по составу корзины.
+
+    Cart.version считается заново у корзины, загруженной из хранилища, поэтому
+    ключ — сам состав корзины и версия каталога: одна и та же корзина на
+    экранах оформления, оплаты и подтверждения отрисовывается один раз.
+    """
+    catalog = get_catalog()
+    key = (catalog.version, tuple(items.items()))
+    block = _item_blocks.get(key)
+    if block is not None:
+        _item_block_stats["hits"] += 1
+        return block
+    _item_block_stats["misses"] += 1
+    if len(_item_blocks) >= _ITEM_BLOCK_CACHE_LIMIT:
+        _item_blocks.clear()
+    block = _item_blocks[key] = "\n".join(catalog.item_lines(items))
+    return block
+
+
+def item_block_cache_info() -> Dict[str, int]:
+    return {**_item_block_stats, "size": len(_item_blocks)}
+
+
+def _date_ru(date_iso: Optional[str]) -> str:
+    try:
+        y, m, d = (int(x) for x in (date_iso or "").split("-"))
+        return f"{d:02d}.{m:02d}.{y}"
+    except ValueError:
+        return date_iso or ""
+
+
+@dataclass(frozen=True)
+class OrderSnapshot:
+    """Неизменяемый снимок заказа: корзина и данные оформления на момент показа.
+
+    Все шаблоны заказа отрисовываются из одного снимка; поля для вывода
+    (экранированные для HTML) считаются один раз при первом обращении.
+    """
+
+    order_id: str
+    items: Tuple[Tuple[str, int], ...]
+    total: int
+    full_name: Optional[str] = None
+    phone: Optional[str] = None
+    delivery_method: Optional[str] = None
+    delivery_date: Optional[str] = None
+    delivery_time: Optional[str] = None
+    address: Optional[str] = None
+    comment: str = "без комментария"
+    ordered_at: Optional[datetime] = None
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+    @classmethod
+    def build(cls, order_id: str, cart, data: Mapping[str, Any], ordered_at: Optional[datetime] = None,
+              user=None) -> "OrderSnapshot":
+        """Снимок из корзины, данных оформления (FSM) и, если есть, пользователя Telegram"""
+        return cls(
+            order_id=order_id,
+            items=tuple(cart.items.items()),
+            total=cart.total,
+            full_name=data.get("full_name"),
+            phone=data.get("phone"),
+            delivery_method=data.get("delivery_method"),
+            delivery_date=data.get("delivery_date"),
+            delivery_time=data.get("delivery_time"),
+            address=data.get("address"),
+            comment=data.get("comment") or "без комментария",
+            ordered_at=ordered_at,
+            user_id=user.id if user is not None else None,
+            username=user.username if user is not None else None,
+            first_name=user.first_name if user is not None else None,
+            last_name=user.last_name if user is not None else None,
+        )
+
+    @cached_property
+    def values(self) -> Dict[str, Any]:
+        is_delivery = self.delivery_method == "доставка"
+        return {
+            "order_id": self.order_id,
+            "items": item_block(dict(self.items)),
+            "total": self.total,
+            "full_name": escape(str(self.full_name)),
+            "phone": escape(str(self.phone)),
+            "method": "доставка" if is_delivery else "самовывоз" if self.delivery_method else "",
+            "date": _date_ru(self.delivery_date),
+            "time": escape(str(self.delivery_time)),
+            "address_line": f"• Адрес: {escape(self.address or 'не указан')}" if is_delivery else "",
+            "comment": escape(self.comment),
+            "ordered_at": self.ordered_at.strftime("%d.%m.%Y %H:%M:%S") if self.ordered_at else "",
+            "user_id": self.user_id,
+            "username": f"@{escape(self.username)}" if self.username else "без никнейма",
+            "first_name": escape(self.first_name or "не указано"),
+            "last_name": escape(self.last_name or "не указана"),
+        }
+
+    def render(self, template: MessageTemplate, **extra: Any) -> str:
+        """Текст по шаблону; extra — поля не из заказа (номер карты, предупреждения)"""
+        return template.render({**self.values, **extra} if extra else self.values)
+
+    def to_record(self, **extra: Any) -> dict:
+        """Запись для журнала заказов (без экранирования)"""
+        return {
+            "order_id": self.order_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "user_id": self.user_id,
+            "username": self.username,
+            "full_name": self.full_name,
+            "phone": self.phone,
+            "delivery_method": self.delivery_method,
+            "delivery_date": self.delivery_date,
+            "delivery_time": self.delivery_time,
+            "address": self.address,
+            "comment": self.comment,
+            "items": dict(self.items),
+            "total": self.total,
+            **extra,
+        }
+
+
+# ===================== ТЕКСТЫ ЗАКАЗА =====================
+
+ORDER_CREATED = MessageTemplate("order_created", """
+🆕 ЗАКАЗ №{order_id} ОФОРМЛЕН
+
+📋 Содержимое:
+{items}
+Итого: {total}₽
+
+👤 Данные:
+• Ваше имя: {full_name}
+• Телефон: {phone}
+• Способ: {method}
+• Дата: {date}
+• Время: {time}
+{address_line}
+• Комментарий: {comment}
+
+⏰ Время заказа: {ordered_at}
+
+💳 Для завершения заказа нажмите кнопку 'Оплатить заказ' ниже.
+""")
+
+PAYMENT_DETAILS = MessageTemplate("payment_details", """
+💳 ОПЛАТА ЗАКАЗА №{order_id}
+
+💰 Сумма к оплате: {total}₽
+
+📱 Номер карты для оплаты:
+{card_number}
+
+📋 Содержимое заказа:
+{items}
+
+👤 Данные заказа:
+• Имя: {full_name}
+• Телефон: {phone}
+• Способ: {method}
+• Дата: {date}
+• Время: {time}
+{address_line}
+• Комментарий: {comment}
+
+⚠️ После перевода денег нажмите кнопку "Платёж выполнен" ниже.
+""")
+
+ORDER_PAID = MessageTemplate("order_paid", """
+✅ ПЛАТЁЖ ПОДТВЕРЖДЁН!
+
+💳 Заказ оплачен на сумму: {total}₽
+📱 Карта получателя: {card_number}
+
+🆕 ЗАКАЗ №{order_id} ПРИНЯТ И ОПЛАЧЕН
+
+📋 Содержимое заказа:
+{items}
+
+👤 Данные:
+• Имя: {full_name}
+• Телефон: {phone}
+• Способ: {method}
+• Дата: {date}
+• Время: {time}
+{address_line}
+• Комментарий: {comment}
+
+⏰ Время заказа: {ordered_at}
+
+✅ Ваш заказ принят и оплачен! Менеджер свяжется с вами в ближайшее время.
+""")
+
+# Уведомления менеджеру; выбираются настройкой ORDER_NOTIFICATION_TEMPLATE.
+# Поле {warnings} — предупреждения (по одному в строке) или пустая строка.
+MANAGER_TEMPLATES: Dict[str, MessageTemplate] = {
+    template.name: template for template in (
+        MessageTemplate("default", """
+💳 ПЛАТЁЖ ПОДТВЕРЖДЁН!
+
+🆕 НОВЫЙ ЗАКАЗ №{order_id}
+
+📋 Содержимое заказа:
+{items}
+Итого: {total}₽
+
+👤 Данные клиента:
+• Имя: {full_name}
+• Телефон: {phone}
+• Способ: {method}
+• Дата: {date}
+• Время: {time}
+{address_line}
+• Комментарий: {comment}
+
+👨‍💻 Информация о пользователе:
+• Username: {username}
+• ID: {user_id}
+• Имя: {first_name}
+• Фамилия: {last_name}
+
+⏰ Время заказа: {ordered_at}
+
+💰 СТАТУС: ПЛАТЁЖ ПОДТВЕРЖДЁН КЛИЕНТОМ
+⚠️ ТРЕБУЕТСЯ ПРОВЕРКА ПЛАТЕЖА
+{warnings}
+"""),
+        # Короткий вариант для загруженного чата менеджера: заказ целиком на одном экране
+        MessageTemplate("compact", """
+💳 Заказ №{order_id} — {total}₽, проверьте платёж
+📅 {date} {time}, {method}
+{address_line}
+👤 {full_name}, {phone} ({username}, id {user_id})
+{items}
+💬 {comment}
+{warnings}
+"""),
+    )
+}
+
+SLOT_OVERFLOW_WARNING = "⚠️ СЛОТ ПЕРЕПОЛНЕН: резерв истёк, время занято другими заказами"
+# Каталог перезагружен между показом реквизитов и подтверждением оплаты
+PRICE_CHANGED_WARNING = "⚠️ ЦЕНЫ ИЗМЕНИЛИСЬ: клиенту выставлено {quoted}₽, по текущему каталогу {current}₽"
+
+
+def select_manager_template(name: str) -> MessageTemplate:
+    template = MANAGER_TEMPLATES.get(name.lower())
+    if template is None:
+        logger.warning(
+            f"Неизвестный ORDER_NOTIFICATION_TEMPLATE={name!r}, используется default "
+            f"(доступны: {', '.join(MANAGER_TEMPLATES)})"
+        )
+        template = MANAGER_TEMPLATES["default"]
+    return template
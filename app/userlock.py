@@ -0,0 +1,42 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from .locks import KeyedLock
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """Обрабатывает обновления одного пользователя строго по очереди.
+
+    aiogram обрабатывает обновления параллельно, и два быстрых нажатия одного
+    клиента могли перемешать чтение и запись его корзины или состояния
+    оформления. Здесь обновления одного пользователя выстраиваются в очередь
+    за блокировкой его user_id, а разные пользователи по-прежнему
+    обрабатываются параллельно. Блокировки простаивающих пользователей
+    удаляются сразу после обработки.
+    """
+
+    def __init__(self):
+        self._locks = KeyedLock()
+        self.stats: Dict[str, int] = {"serialized": 0, "waited": 0, "max_queue": 0}
+
+    def metrics(self) -> Dict[str, int]:
+        return {**self.stats, "active_users": len(self._locks)}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        queued = self._locks.waiting(user.id)
+        self.stats["serialized"] += 1
+        if queued:
+            self.stats["waited"] += 1
+            self.stats["max_queue"] = max(self.stats["max_queue"], queued + 1)
+        async with self._locks.hold(user.id):
+            return await handler(event, data)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import secrets
+from typing import Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from .metrics import MetricsRegistry, add_metrics_route
+from .config import (
+    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEB_SERVER_HOST, WEB_SERVER_PORT
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def health(request: web.Request) -> web.Response:
+    """Проверка живости для балансировщика/платформы"""
+    return web.json_response({"status": "ok"})
+
+
+def create_web_app(
+    bot: Bot, dp: Dispatcher, secret_token: str, metrics: Optional[MetricsRegistry] = None
+) -> web.Application:
+    """aiohttp-приложение: POST WEBHOOK_PATH принимает обновления, GET /health — проверка,
+    GET /metrics — метрики в формате Prometheus (если передан metrics).
+
+    Telegram получает 200 сразу, а обработчики выполняются в фоновых задачах,
+    поэтому медленный обработчик не задерживает подтверждение и не вызывает
+    повторную доставку обновления.
+    """
+    app = web.Application()
+    app.router.add_get("/health", health)
+    if metrics is not None:
+        add_metrics_route(app, metrics)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, metrics: Optional[MetricsRegistry] = None) -> None:
+    """Запускает веб-сервер и регистрирует вебхук; работает до отмены задачи.
+
+    Накопившиеся обновления к этому моменту уже обработаны или отброшены
+    при запуске, а пришедшие позже Telegram доставит на вебхук.
+    """
+    if not WEBHOOK_BASE_URL:
+        raise RuntimeError("Для RUN_MODE=webhook задайте WEBHOOK_BASE_URL (публичный https-адрес бота).")
+    # Без заданного секрета генерируем свой на каждый запуск: вебхук всё равно
+    # переустанавливается при старте, и чужие запросы без токена отклоняются
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    app = create_web_app(bot, dp, secret_token, metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEB_SERVER_HOST, port=WEB_SERVER_PORT)
+    await site.start()
+    url = WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH
+    try:
+        await bot.set_webhook(
+            url,
+            secret_token=secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Вебхук установлен: {url}, сервер слушает {WEB_SERVER_HOST}:{WEB_SERVER_PORT}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,76 @@
+"""Микробенчмарк каталога: линейный поиск против индекса.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_catalog
+"""
+import timeit
+from typing import Dict, List, Optional
+
+from app.catalog import Cake, CatalogIndex
+
+SIZES = (5, 50, 500, 5000)
+CART_LINES = 5
+
+
+def make_cakes(n: int) -> List[Cake]:
+    return [
+        Cake(id=f"cake{i}", name=f"Торт №{i}", price=1000 + i, description="", photo_url="")
+        for i in range(n)
+    ]
+
+
+def linear_get(cakes: List[Cake], cake_id: str) -> Optional[Cake]:
+    for cake in cakes:
+        if cake.id == cake_id:
+            return cake
+    return None
+
+
+def linear_cart_text(cakes: List[Cake], items: Dict[str, int]) -> str:
+    # Повторяет прежний cart_text: поиск на каждую строку и повторный проход для итога
+    lines = ["Ваша корзина:"]
+    for cake_id, qty in items.items():
+        cake = linear_get(cakes, cake_id)
+        if cake:
+            lines.append(f"• {cake.name} × {qty} = {cake.price * qty}₽")
+    total = 0
+    for cake_id, qty in items.items():
+        cake = linear_get(cakes, cake_id)
+        if cake:
+            total += cake.price * qty
+    lines.append(f"Итого: {total}₽")
+    return "\n".join(lines)
+
+
+def indexed_cart_text(index: CatalogIndex, items: Dict[str, int]) -> str:
+    lines = ["Ваша корзина:"]
+    lines.extend(index.item_lines(items))
+    lines.append(f"Итого: {index.items_total(items)}₽")
+    return "\n".join(lines)
+
+
+def bench(stmt, number: int) -> float:
+    """Лучшее из трёх измерений, микросекунды на вызов"""
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    print(f"{'SKU':>6} | {'поиск, линейный':>16} | {'поиск, индекс':>14} | "
+          f"{'корзина, линейно':>17} | {'корзина, индекс':>16}  (мкс/вызов)")
+    for n in SIZES:
+        cakes = make_cakes(n)
+        index = CatalogIndex(cakes)
+        # Худший случай для линейного поиска — позиции из конца каталога
+        items = {cakes[-1 - i].id: i + 1 for i in range(min(CART_LINES, n))}
+        last_id = cakes[-1].id
+        number = max(200, 200000 // n)
+        lookup_linear = bench(lambda: linear_get(cakes, last_id), number)
+        lookup_index = bench(lambda: index.get(last_id), number)
+        render_linear = bench(lambda: linear_cart_text(cakes, items), number // 10 or 1)
+        render_index = bench(lambda: indexed_cart_text(index, items), number // 10 or 1)
+        print(f"{n:>6} | {lookup_linear:>16.3f} | {lookup_index:>14.3f} | "
+              f"{render_linear:>17.3f} | {render_index:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Бенчмарк журнала заказов: запись и построение индекса при запуске.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_journal [число_заказов]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from app.journal import OrderJournal
+
+ORDERS = 100_000
+
+
+def make_order(n: int) -> dict:
+    day = date(2026, 1, 1) + timedelta(days=n % 365)
+    return {
+        "order_id": f"{day:%y%m%d}-{n:06X}",
+        "created_at": f"{day.isoformat()}T12:00:00",
+        "user_id": 100000 + n % 20000,
+        "username": f"user{n % 20000}",
+        "full_name": "Иван Иванов",
+        "phone": f"+7 900 {n % 10000000:07d}",
+        "delivery_method": random.choice(["самовывоз", "доставка"]),
+        "delivery_date": day.isoformat(),
+        "delivery_time": f"{10 + n % 10}:00",
+        "address": "ул. Ленина, 1",
+        "comment": "без комментария",
+        "items": {"choco": 1, "honey": n % 3},
+        "total": 1500 + 1200 * (n % 3),
+        "slot_units": 1 + n % 3,
+        "slot_confirmed": True,
+    }
+
+
+async def run(count: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.jsonl")
+        journal = OrderJournal(path)
+        journal.start()
+        started = time.perf_counter()
+        for n in range(count):
+            journal.append(make_order(n))
+        await journal.close()
+        write_seconds = time.perf_counter() - started
+        print(f"запись {count} заказов: {write_seconds:.2f} с ({journal.stats['batches']:.0f} пачек), "
+              f"файл {os.path.getsize(path) / 1e6:.1f} МБ")
+
+        reloaded = OrderJournal(path)
+        loaded = await reloaded.load()
+        load_seconds = reloaded.stats["load_seconds"]
+        print(f"построение индекса: {load_seconds:.2f} с")
+        assert loaded == count
+        # Проверка: индексы находят те же заказы, что были записаны
+        probe = make_order(count // 2)
+        assert (await reloaded.get(probe["order_id"]))["phone"] == probe["phone"]
+        assert probe["order_id"] in {o["order_id"] for o in await reloaded.by_phone(probe["phone"])}
+        assert probe["order_id"] in {o["order_id"] for o in await reloaded.by_user(probe["user_id"])}
+        assert probe["order_id"] in {o["order_id"] for o in await reloaded.by_date(probe["delivery_date"])}
+        if count >= ORDERS:
+            assert load_seconds < 1.0, f"индекс строится слишком долго: {load_seconds:.2f} с"
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else ORDERS))
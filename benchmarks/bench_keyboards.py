@@ -0,0 +1,50 @@
+"""Микробенчмарк отрисовки клавиатур.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_keyboards
+"""
+import timeit
+
+from app.cart import Cart
+from app.catalog import get_catalog
+from app.keyboards import (
+    main_menu_kb, catalog_kb, cake_card_kb, cart_kb,
+    order_confirmation_kb, delivery_method_kb,
+    markup_cache_info,
+)
+
+NUMBER = 5000
+
+
+def bench(stmt) -> float:
+    """Лучшее из трёх измерений, микросекунды на вызов"""
+    return min(timeit.repeat(stmt, number=NUMBER, repeat=3)) / NUMBER * 1e6
+
+
+def main() -> None:
+    catalog = get_catalog()
+    cake = catalog.cakes[0]
+    cart = Cart({cake.id: 2, catalog.cakes[1].id: 1})
+
+    # Для сравнения: __wrapped__ строит разметку заново, минуя кеш
+    from app.keyboards import _main_menu_markup, _cake_card_markup
+    qty = cart.qty(cake.id)
+    cases = [
+        ("main_menu_kb(пустая)", lambda: main_menu_kb(), lambda: _main_menu_markup.__wrapped__(0)),
+        ("main_menu_kb(корзина)", lambda: main_menu_kb(cart),
+         lambda: _main_menu_markup.__wrapped__(cart.count)),
+        ("catalog_kb", catalog_kb, catalog_kb.__wrapped__),
+        ("cake_card_kb", lambda: cake_card_kb(cake, cart),
+         lambda: _cake_card_markup.__wrapped__(cake.id, qty)),
+        ("cart_kb", lambda: cart_kb(True), lambda: cart_kb.__wrapped__(True)),
+        ("order_confirmation_kb", order_confirmation_kb, order_confirmation_kb.__wrapped__),
+        ("delivery_method_kb", delivery_method_kb, delivery_method_kb.__wrapped__),
+    ]
+    print(f"{'клавиатура':<24} {'из кеша':>10} {'без кеша':>10}  (мкс/вызов)")
+    for name, stmt, build in cases:
+        print(f"{name:<24} {bench(stmt):>10.2f} {bench(build):>10.2f}")
+    print(f"кеш разметки: {markup_cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
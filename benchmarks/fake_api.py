@@ -0,0 +1,286 @@
+"""Локальная замена Telegram Bot API для нагрузочных тестов.
+
+aiohttp-сервер принимает запросы бота по адресу /bot<token>/<method>:
+getUpdates отдаёт обновления, которые сценарий кладёт через push_update(),
+а отправка и редактирование сообщений записываются в журнал вызовов чата
+и отвечают после искусственной задержки latency.
+
+Бот подключается к нему так:
+    AiohttpSession(api=TelegramAPIServer.from_base(api.base_url))
+
+FakeSession — то же без HTTP: сессия бота отвечает на запросы сама,
+что удобно для профилирования, где сетевой стек только мешает.
+"""
+import asyncio
+import itertools
+import json
+import time
+import zlib
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, List, Iterator, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+# Методы, которые возвращают отправленное или изменённое сообщение
+_MESSAGE_METHODS = frozenset({
+    "sendMessage", "sendPhoto", "sendSticker", "editMessageText",
+    "editMessageReplyMarkup", "editMessageMedia", "editMessageCaption",
+})
+
+_BOT_INFO = {"id": 1, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+
+
+def message_result(chat_id: int, message_id: int, params: Dict[str, Any]) -> dict:
+    """Ответ Bot API на отправку или изменение сообщения"""
+    message = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+    }
+    if "text" in params:
+        message["text"] = params["text"]
+    if "photo" in params:
+        message["photo"] = [{
+            "file_id": f"photo-{zlib.crc32(str(params['photo']).encode())}", "file_unique_id": "u",
+            "width": 800, "height": 600,
+        }]
+    if "sticker" in params:
+        message["sticker"] = {
+            "file_id": params["sticker"], "file_unique_id": "s", "type": "regular",
+            "width": 512, "height": 512, "is_animated": False, "is_video": False,
+        }
+    return message
+
+
+@dataclass
+class ApiCall:
+    method: str
+    params: Dict[str, Any]
+    at: float
+
+    @property
+    def reply_markup(self) -> Optional[dict]:
+        raw = self.params.get("reply_markup")
+        return json.loads(raw) if raw else None
+
+    def callback_buttons(self) -> List[str]:
+        """callback_data всех инлайн-кнопок сообщения"""
+        markup = self.reply_markup or {}
+        return [
+            button["callback_data"]
+            for row in markup.get("inline_keyboard", ())
+            for button in row
+            if "callback_data" in button
+        ]
+
+
+@dataclass
+class ChatLog:
+    calls: List[ApiCall] = field(default_factory=list)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    last_message_id: int = 0
+    # Как в Telegram, номера сообщений в личном чате общие для клиента и бота
+    message_ids: Iterator[int] = field(default_factory=lambda: itertools.count(1))
+    # Сообщения с фото: кнопка под ними приходит боту в сообщении с фото, а не с текстом
+    photo_messages: Set[int] = field(default_factory=set)
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.calls: Counter = Counter()
+        self.chats: Dict[int, ChatLog] = {}
+        self._updates: Deque[dict] = deque()
+        self._update_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 система выдала свободный порт
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def chat(self, chat_id: int) -> ChatLog:
+        log = self.chats.get(chat_id)
+        if log is None:
+            log = self.chats[chat_id] = ChatLog()
+        return log
+
+    # ---------- сценарий: обновления от «пользователей» ----------
+
+    def push_update(self, **payload) -> int:
+        update_id = next(self._update_ids)
+        self._updates.append({"update_id": update_id, **payload})
+        self._new_updates.set()
+        return update_id
+
+    def push_message(self, user: dict, text: str) -> None:
+        self.push_update(message={
+            "message_id": next(self.chat(user["id"]).message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        })
+
+    def push_callback(self, user: dict, data: str) -> str:
+        """Нажатие инлайн-кнопки под последним сообщением бота; возвращает id нажатия"""
+        callback_id = f"{user['id']}:{next(self._callback_ids)}"
+        log = self.chat(user["id"])
+        message = {
+            "message_id": log.last_message_id or next(log.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+        }
+        if message["message_id"] in log.photo_messages:
+            message["photo"] = [{"file_id": "photo", "file_unique_id": "u", "width": 800, "height": 600}]
+        else:
+            message["text"] = "…"
+        self.push_update(callback_query={
+            "id": callback_id,
+            "from": user,
+            "chat_instance": str(user["id"]),
+            "data": data,
+            "message": message,
+        })
+        return callback_id
+
+    async def wait_for(
+        self, chat_id: int, since: int, predicate: Callable[[ApiCall], bool], timeout: float
+    ) -> ApiCall:
+        """Ждёт вызов бота в чате (начиная с индекса since), подходящий под predicate"""
+        log = self.chat(chat_id)
+        deadline = time.monotonic() + timeout
+        position = since
+        while True:
+            while position < len(log.calls):
+                call = log.calls[position]
+                position += 1
+                if predicate(call):
+                    return call
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            log.changed.clear()
+            if position < len(log.calls):
+                continue
+            await asyncio.wait_for(log.changed.wait(), remaining)
+
+    # ---------- сторона бота ----------
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[dict]:
+        offset = int(params.get("offset", 0))
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                return []
+        limit = int(params.get("limit", 100))
+        return list(itertools.islice(self._updates, limit))
+
+    def _message(self, method: str, chat_id: int, params: Dict[str, Any]) -> dict:
+        log = self.chat(chat_id)
+        if "message_id" in params:
+            message_id = int(params["message_id"])
+        else:
+            message_id = next(log.message_ids)
+            log.last_message_id = message_id
+        if method in ("sendPhoto", "editMessageMedia"):
+            log.photo_messages.add(message_id)
+        return message_result(chat_id, message_id, params)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": _BOT_INFO})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "chat_id" in params:
+            chat_id = int(params["chat_id"])
+        elif method == "answerCallbackQuery":
+            chat_id = int(params["callback_query_id"].split(":", 1)[0])
+        else:
+            chat_id = None
+        result: Any = True
+        if method in _MESSAGE_METHODS and chat_id is not None:
+            result = self._message(method, chat_id, params)
+        if chat_id is not None:
+            log = self.chat(chat_id)
+            log.calls.append(ApiCall(method, params, time.monotonic()))
+            log.changed.set()
+        return web.json_response({"ok": True, "result": result})
+
+
+class FakeSession(BaseSession):
+    """Сессия бота, которая отвечает на запросы без сети.
+
+    Запросы проходят через middleware сессии (лимиты, метрики), как обычно,
+    а ответы разбираются штатным check_response, поэтому обработчики
+    получают те же объекты, что и от настоящего Bot API.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1_000_000)
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        name = method.__api_method__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result: Any = True
+        if name == "getMe":
+            result = _BOT_INFO
+        elif name == "getUpdates":
+            result = []
+        elif name in _MESSAGE_METHODS:
+            params = {
+                key: value if isinstance(value, (str, int)) else "upload"
+                for key in ("text", "photo", "sticker")
+                if (value := getattr(method, key, None)) is not None
+            }
+            message_id = getattr(method, "message_id", None) or next(self._message_ids)
+            result = message_result(int(getattr(method, "chat_id", 0) or 0), message_id, params)
+        content = json.dumps({"ok": True, "result": result})
+        response = self.check_response(bot=bot, method=method, status_code=200, content=content)
+        return response.result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
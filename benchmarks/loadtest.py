@@ -0,0 +1,216 @@
+"""Нагрузочный тест бота без Telegram: локальный фейковый Bot API и тысячи клиентов.
+
+Каждый клиент проходит весь путь покупателя: /start → каталог → карточка торта →
+«В корзину» (несколько быстрых нажатий) → корзина → оформление (самовывоз, дата,
+время, имя, телефон, комментарий) → оплата → «Платёж выполнен». Бот работает
+как в проде — long polling через getUpdates, только сервер Bot API локальный.
+
+Запуск из корня проекта:
+    python -m benchmarks.loadtest --users 2000 --concurrency 200 --latency 0.02
+
+Переменные окружения бота (CART_STORAGE, FSM_STORAGE, THROTTLE_WINDOW и т.д.)
+можно задать как обычно; файлы данных пишутся во временный каталог.
+Пиковый RSS включает и фейковый сервер, работающий в том же процессе.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import resource
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.sandbox import prepare_environment, start_components, stop_components
+
+MANAGER_CHAT_ID = 1
+_DATA_DIR = prepare_environment(
+    MANAGER_CHAT_ID=str(MANAGER_CHAT_ID),
+    # Тысячи клиентов не должны упираться во вместимость слотов
+    SLOT_CAPACITY="1000000",
+    RATE_LIMIT_ENABLED="false",
+)
+
+from aiogram import BaseMiddleware  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+import main as bot_main  # noqa: E402
+from benchmarks.fake_api import ApiCall, FakeBotAPI  # noqa: E402
+
+STEP_TIMEOUT = 30.0
+
+
+class HandlerSampler(BaseMiddleware):
+    """Точное время каждого запуска обработчика (гистограммы /metrics слишком грубые для p99)"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        name = getattr(getattr(data.get("handler"), "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Customer:
+    def __init__(self, api: FakeBotAPI, user_id: int, step_latencies: List[float], think_time: float):
+        self.api = api
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"Клиент{user_id}"}
+        self.step_latencies = step_latencies
+        self.think_time = think_time
+
+    @property
+    def chat_id(self) -> int:
+        return self.user["id"]
+
+    async def _pause(self) -> None:
+        if self.think_time:
+            await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+
+    async def say(self, text: str, until: Callable[[ApiCall], bool]) -> ApiCall:
+        await self._pause()
+        since = len(self.api.chat(self.chat_id).calls)
+        started = time.perf_counter()
+        self.api.push_message(self.user, text)
+        call = await self.api.wait_for(self.chat_id, since, until, STEP_TIMEOUT)
+        self.step_latencies.append(time.perf_counter() - started)
+        return call
+
+    async def press(self, *data: str) -> List[ApiCall]:
+        """Нажимает кнопки подряд, не дожидаясь ответа, и ждёт answerCallbackQuery на каждую"""
+        await self._pause()
+        since = len(self.api.chat(self.chat_id).calls)
+        started = time.perf_counter()
+        ids = [self.api.push_callback(self.user, d) for d in data]
+        answers = []
+        for callback_id in ids:
+            answers.append(await self.api.wait_for(
+                self.chat_id, since,
+                lambda c, cid=callback_id: c.method == "answerCallbackQuery" and c.params.get("callback_query_id") == cid,
+                STEP_TIMEOUT,
+            ))
+        self.step_latencies.append(time.perf_counter() - started)
+        return answers
+
+    def last_buttons(self, prefix: str) -> List[str]:
+        for call in reversed(self.api.chat(self.chat_id).calls):
+            buttons = [b for b in call.callback_buttons() if b.startswith(prefix)]
+            if buttons:
+                return buttons
+        raise LookupError(f"нет кнопок {prefix!r} в чате {self.chat_id}")
+
+    async def buy(self) -> None:
+        has_markup = lambda c: c.method == "sendMessage" and c.params.get("reply_markup")  # noqa: E731
+        await self.say("/start", has_markup)
+        await self.say("🍰 Каталог", has_markup)
+        cake_data = random.choice(self.last_buttons("cake:"))
+        await self.press(cake_data)
+        await self.press(*["add:" + cake_data.split(":", 1)[1]] * random.randint(1, 3))
+        await self.press("open:cart")
+        await self.press("cart:checkout")
+        await self.press("delivery:самовывоз")
+        await self.press(self.last_buttons("date:")[0])
+        await self.press(random.choice(self.last_buttons("time:")))
+        sent = lambda c: c.method == "sendMessage"  # noqa: E731
+        await self.say(self.user["first_name"], sent)
+        await self.say(f"+7900{self.chat_id % 10_000_000:07d}", sent)
+        await self.say("-", has_markup)
+        await self.press("payment:start")
+        await self.press(self.last_buttons("payment:confirm")[0])
+
+
+async def run(args: argparse.Namespace) -> None:
+    logging.getLogger().setLevel(logging.WARNING)
+    rss_start = rss_mb()
+
+    api = FakeBotAPI(latency=args.latency)
+    await api.start()
+    bot = bot_main.create_bot(AiohttpSession(api=TelegramAPIServer.from_base(api.base_url)))
+    dp = bot_main.create_dispatcher()
+    sampler = HandlerSampler()
+    dp.message.middleware(sampler)
+    dp.callback_query.middleware(sampler)
+
+    await start_components(bot_main, bot)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+
+    step_latencies: List[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    completed = 0
+    failures: Counter = Counter()
+
+    async def customer(user_id: int) -> None:
+        nonlocal completed
+        async with semaphore:
+            try:
+                await Customer(api, user_id, step_latencies, args.think_time).buy()
+                completed += 1
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    print(f"Клиентов: {args.users}, одновременно: {args.concurrency}, задержка API: {args.latency * 1000:.0f} мс")
+    started = time.perf_counter()
+    await asyncio.gather(*(customer(1000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    # Уведомления менеджеру уходят в фоне — дожидаемся их, чтобы учесть в расходе запросов
+    while bot_main.NOTIFIER.metrics()["pending"]:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+
+    await dp.stop_polling()
+    await polling
+    await stop_components(bot_main, bot)
+    await api.close()
+
+    updates = sum(len(v) for v in sampler.samples.values())
+    all_samples = [s for v in sampler.samples.values() for s in v]
+    print(f"\nЗаказов: {completed}, ошибок: {sum(failures.values())} {dict(failures) or ''}")
+    print(f"Время: {elapsed:.2f} с — {completed / elapsed:.1f} заказов/с, {updates / elapsed:.0f} обновлений/с")
+    print(f"Шаг клиента (от нажатия до ответа): p50 {percentile(step_latencies, 0.5) * 1000:.1f} мс, "
+          f"p99 {percentile(step_latencies, 0.99) * 1000:.1f} мс")
+    print(f"Обработчики: p50 {percentile(all_samples, 0.5) * 1000:.1f} мс, "
+          f"p99 {percentile(all_samples, 0.99) * 1000:.1f} мс")
+    for name, samples in sorted(sampler.samples.items(), key=lambda item: -statistics.fmean(item[1])):
+        print(f"  {name:<30} {len(samples):>7}  p50 {percentile(samples, 0.5) * 1000:7.1f} мс"
+              f"  p99 {percentile(samples, 0.99) * 1000:7.1f} мс")
+
+    api_calls = {m: n for m, n in api.calls.items() if m not in ("getUpdates", "getMe", "deleteWebhook")}
+    if completed:
+        print(f"Запросов к Bot API на заказ: {sum(api_calls.values()) / completed:.1f}")
+        for method, n in sorted(api_calls.items(), key=lambda item: -item[1]):
+            print(f"  {method:<30} {n / completed:.2f}")
+    print(f"Пиковый RSS: {rss_mb():.0f} МБ (до старта {rss_start:.0f} МБ)")
+    print(f"Данные прогона: {_DATA_DIR}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="число клиентов")
+    parser.add_argument("--concurrency", type=int, default=100, help="сколько клиентов действуют одновременно")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа фейкового Bot API, с")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза клиента между шагами, с")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
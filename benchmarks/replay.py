@@ -0,0 +1,249 @@
+"""Воспроизведение записанных обновлений через обработчики бота с профилированием.
+
+Запись делает сам бот, если задан UPDATE_RECORD_PATH (см. app/recorder.py).
+Здесь обновления из записи подаются в диспетчер из main.create_dispatcher() —
+со всеми middleware и обработчиками, — а запросы к Bot API обслуживает
+FakeSession без сети. Скорость: --speed 1 — как в записи, 10 — в 10 раз
+быстрее, 0 — без пауз. Без пауз обновления обрабатываются строго по одному:
+иначе все шаги клиента пришли бы разом и обогнали бы друг друга
+(сообщение с именем раньше нажатия, которое его запрашивает).
+Лимиты Bot API выключены, если не задан RATE_LIMIT_ENABLED=true.
+
+Запуск из корня проекта:
+    python -m benchmarks.replay data/updates.jsonl --speed 10
+    python -m benchmarks.replay data/updates.jsonl --speed 0 --profile profiles/ --tracemalloc
+
+--profile пишет профиль cProfile каждого обработчика в <каталог>/<обработчик>.prof
+(смотреть: python -m pstats или snakeviz) и печатает самые тяжёлые функции.
+cProfile не различает задачи asyncio, поэтому с --profile обновления
+обрабатываются строго по одному (как и с --sequential) — прогон детерминирован.
+--tracemalloc добавляет к отчёту память, выделенную каждым обработчиком
+(точно — при обработке по одному: параллельные обработчики делят счётчик),
+и места, где после прогона держится больше всего памяти.
+
+Обновления из записи относятся к датам записи: кнопки дат и слотов, которые
+к моменту воспроизведения ушли в прошлое, бот отклонит так же, как в проде.
+Команды менеджера воспроизводятся из его чата только для первого сеанса записи:
+у каждого сеанса свои псевдонимы id.
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import pstats
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from app.recorder import RECORD_FORMAT
+from benchmarks.fake_api import FakeSession
+from benchmarks.sandbox import prepare_environment, start_components, stop_components
+
+
+@dataclass
+class Recording:
+    manager_chat_id: Optional[int] = None
+    updates: List[Tuple[float, dict]] = field(default_factory=list)
+    sessions: int = 0
+    damaged: int = 0
+
+
+def load_recording(path: str) -> Recording:
+    """Читает запись; сеансы идут друг за другом, время каждого отсчитывается от конца предыдущего"""
+    recording = Recording()
+    offset = last = 0.0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Запись работающего бота может обрываться на недописанной строке
+                recording.damaged += 1
+                continue
+            if "format" in record:
+                if record["format"] != RECORD_FORMAT:
+                    raise ValueError(f"Неизвестный формат записи: {record['format']}")
+                if recording.sessions == 0:
+                    recording.manager_chat_id = record.get("manager_chat_id")
+                recording.sessions += 1
+                offset = last
+                continue
+            last = offset + record["t"]
+            recording.updates.append((last, record["u"]))
+    return recording
+
+
+class HandlerProfiler(BaseMiddleware):
+    """Время, профиль cProfile и выделенная память каждого обработчика"""
+
+    def __init__(self, cprofile: bool = False, trace_memory: bool = False):
+        self.cprofile = cprofile
+        self.trace_memory = trace_memory
+        self.durations: Dict[str, List[float]] = {}
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.allocated: Dict[str, int] = Counter()
+        self.peaks: Dict[str, int] = Counter()
+
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        name = getattr(getattr(data.get("handler"), "callback", None), "__name__", "unknown")
+        profile = None
+        if self.cprofile:
+            profile = self.profiles.get(name)
+            if profile is None:
+                profile = self.profiles[name] = cProfile.Profile()
+            profile.enable()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                self.allocated[name] += current - before
+                self.peaks[name] = max(self.peaks[name], peak - before)
+            self.durations.setdefault(name, []).append(elapsed)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def feed(bot, dp, recording: Recording, speed: float, sequential: bool) -> Counter:
+    """Подаёт обновления в диспетчер; возвращает число исключений по типам"""
+    errors: Counter = Counter()
+
+    async def process(update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors[type(e).__name__] += 1
+
+    started = time.monotonic()
+    pending = set()
+    for at, raw in recording.updates:
+        if speed:
+            delay = at / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.model_validate(raw, context={"bot": bot})
+        if sequential:
+            await process(update)
+        else:
+            # Как при polling: каждое обновление — отдельная задача
+            task = asyncio.create_task(process(update))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+    return errors
+
+
+def report_profiles(profiler: HandlerProfiler, directory: str, top: int) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for name, profile in profiler.profiles.items():
+        profile.dump_stats(os.path.join(directory, f"{name}.prof"))
+    print(f"\nПрофили обработчиков: {directory}/<обработчик>.prof")
+    heaviest = sorted(profiler.profiles, key=lambda name: -sum(profiler.durations.get(name, ())))
+    for name in heaviest[:3]:
+        print(f"\n=== {name} ===")
+        pstats.Stats(profiler.profiles[name], stream=sys.stdout).strip_dirs().sort_stats("cumulative").print_stats(top)
+
+
+def report_memory(top: int) -> None:
+    print("\nБольше всего памяти после прогона держат:")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        # Данные самих профилировщиков к боту отношения не имеют
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ))
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        print(f"  {stat.size / 1024:9.1f} КБ  {stat.count:>7} объектов  {frame.filename}:{frame.lineno}")
+
+
+async def run(args: argparse.Namespace, recording: Recording) -> None:
+    # main читает настройки при импорте — окружение к этому моменту уже подготовлено
+    import main as bot_main
+
+    logging.getLogger().setLevel(logging.WARNING)
+    sequential = args.sequential or bool(args.profile) or not args.speed
+    session = FakeSession(latency=args.latency)
+    bot = bot_main.create_bot(session)
+    dp = bot_main.create_dispatcher()
+    profiler = HandlerProfiler(cprofile=bool(args.profile), trace_memory=args.tracemalloc)
+    dp.message.middleware(profiler)
+    dp.callback_query.middleware(profiler)
+    await start_components(bot_main, bot)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    print(
+        f"Обновлений: {len(recording.updates)} (сеансов записи: {recording.sessions}"
+        + (f", повреждённых строк: {recording.damaged}" if recording.damaged else "")
+        + f"), скорость: {'без пауз' if not args.speed else f'×{args.speed:g}'}"
+        + (", по одному" if sequential else "")
+    )
+    started = time.perf_counter()
+    errors = await feed(bot, dp, recording, args.speed, sequential)
+    elapsed = time.perf_counter() - started
+    await stop_components(bot_main, bot)
+
+    handled = sum(len(v) for v in profiler.durations.values())
+    print(f"\nВремя: {elapsed:.2f} с, {len(recording.updates) / elapsed:.0f} обновлений/с, "
+          f"дошло до обработчиков: {handled}, исключений: {sum(errors.values())} {dict(errors) or ''}")
+    memory_header = "   выделено, КБ  пик, КБ" if args.tracemalloc else ""
+    print(f"  {'обработчик':<30} {'вызовов':>7} {'всего, мс':>10} {'ср., мс':>8} {'p99, мс':>8}{memory_header}")
+    for name, durations in sorted(profiler.durations.items(), key=lambda item: -sum(item[1])):
+        line = (f"  {name:<30} {len(durations):>7} {sum(durations) * 1000:>10.1f} "
+                f"{statistics.fmean(durations) * 1000:>8.2f} {percentile(durations, 0.99) * 1000:>8.2f}")
+        if args.tracemalloc:
+            line += f" {profiler.allocated[name] / 1024:>14.1f} {profiler.peaks[name] / 1024:>8.1f}"
+        print(line)
+    print("Запросы к Bot API:", ", ".join(f"{m} {n}" for m, n in session.calls.most_common()) or "нет")
+
+    if args.profile:
+        report_profiles(profiler, args.profile, args.top)
+    if args.tracemalloc:
+        report_memory(args.top)
+        tracemalloc.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="файл записи (UPDATE_RECORD_PATH)")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение относительно записи; 0 — без пауз")
+    parser.add_argument("--sequential", action="store_true", help="обрабатывать обновления строго по одному")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа фейковой сессии, с")
+    parser.add_argument("--profile", metavar="КАТАЛОГ", help="сохранить профили cProfile обработчиков")
+    parser.add_argument("--tracemalloc", action="store_true", help="замерять выделение памяти обработчиками")
+    parser.add_argument("--top", type=int, default=15, help="сколько строк профиля и памяти печатать")
+    args = parser.parse_args()
+
+    recording = load_recording(args.recording)
+    # Лимиты Bot API по умолчанию выключены: иначе профиль покажет в основном ожидание в их очереди
+    prepare_environment(RATE_LIMIT_ENABLED="false")
+    if recording.manager_chat_id is not None:
+        # В записи id чатов заменены псевдонимами, в том числе id чата менеджера
+        os.environ["MANAGER_CHAT_ID"] = str(recording.manager_chat_id)
+    asyncio.run(run(args, recording))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Запуск бота из main.py в изоляции: временный каталог данных и фоновые компоненты.
+
+Настройки бота читаются при импорте app.config, поэтому prepare_environment()
+вызывается до импорта main.
+"""
+import os
+import tempfile
+from typing import Dict
+
+
+def prepare_environment(**overrides: str) -> str:
+    """Направляет все файлы данных бота во временный каталог; возвращает его путь.
+
+    Переменные, уже заданные в окружении, не перезаписываются.
+    """
+    data_dir = tempfile.mkdtemp(prefix="bot-bench-")
+    defaults: Dict[str, str] = {
+        "BOT_TOKEN": "123456:benchmark",
+        "MEDIA_PREWARM": "false",
+        "CART_DB_PATH": os.path.join(data_dir, "carts.sqlite3"),
+        "FSM_DB_PATH": os.path.join(data_dir, "fsm.sqlite3"),
+        "ORDER_JOURNAL_PATH": os.path.join(data_dir, "orders.jsonl"),
+        "NOTIFY_SPOOL_DIR": os.path.join(data_dir, "notifications"),
+        "MEDIA_CACHE_PATH": os.path.join(data_dir, "media_cache.json"),
+        # Запись обновлений нужна только в проде
+        "UPDATE_RECORD_PATH": "",
+        **overrides,
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    return data_dir
+
+
+async def start_components(bot_main, bot) -> None:
+    """То же, что main() запускает до приёма обновлений"""
+    await bot_main.CART_STORE.start()
+    await bot_main.FSM_STORE.start()
+    await bot_main.NOTIFIER.start(bot)
+    await bot_main.JOURNAL.load()
+    bot_main.JOURNAL.start()
+    if bot_main.CATALOG_WATCHER is not None:
+        await bot_main.CATALOG_WATCHER.start()
+
+
+async def stop_components(bot_main, bot) -> None:
+    if bot_main.CATALOG_WATCHER is not None:
+        await bot_main.CATALOG_WATCHER.close()
+    await bot_main.NOTIFIER.close()
+    await bot_main.JOURNAL.close()
+    await bot_main.FSM_STORE.close()
+    await bot_main.CART_STORE.close()
+    await bot.session.close()
@@ -1,31 +1,63 @@
 import asyncio
 import logging
 import time
-from typing import Dict, DefaultDict, List
-from collections import defaultdict
-from datetime import datetime, timedelta, date, time as dt_time
+from dataclasses import replace
+from datetime import datetime
+from html import escape
+from typing import Optional, Tuple
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import Message, CallbackQuery, Sticker
 from aiogram.fsm.context import FSMContext
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
 from aiogram.enums import ParseMode
 
-from app.config import BOT_TOKEN, MANAGER_CHAT_ID, CARD_NUMBER
-from app.catalog import CATALOG, get_cake_by_id
+from app.config import BOT_TOKEN, MANAGER_CHAT_ID, CARD_NUMBER, RUN_MODE
+from app.config import PENDING_UPDATES_MODE, PENDING_UPDATE_MAX_AGE, PENDING_DRAIN_CONCURRENCY
+from app.config import NOTIFY_SPOOL_DIR, NOTIFY_WORKERS, NOTIFY_MAX_BACKOFF
+from app.config import RATE_LIMIT_ENABLED, RATE_LIMIT_GLOBAL, RATE_LIMIT_PER_CHAT, RATE_LIMIT_CHAT_BURST
+from app.config import THROTTLE_WINDOW, THROTTLE_COALESCE_PREFIXES
+from app.catalog import get_catalog, get_cake_by_id
 from app.keyboards import (
-    main_menu_kb, catalog_kb, cake_card_kb, cart_kb,
+    main_menu_kb, catalog_kb, cake_card_kb, cart_kb, markup_cache_info,
     order_confirmation_kb, payment_confirm_kb,
     delivery_method_kb, dates_kb, time_slots_kb
 )
 from app.states import CheckoutState, PaymentState
+from app.cart import Cart
+from app.storage import CartStore, create_cart_store, create_fsm_storage
+from app.schedule import create_schedule
+from app.slots import create_slot_reservations
 from app.config import (
-    BAKER_SCHEDULE_START_DATE, WORK_CYCLE_ON_DAYS, WORK_CYCLE_OFF_DAYS,
-    WORKING_HOURS_START, WORKING_HOURS_END, SLOT_MINUTES,
-    MIN_LEAD_HOURS, MAX_DAYS_AHEAD
+    WELCOME_EFFECT_ID, WELCOME_STICKER_ID, PAYMENT_STICKER_ID,
+    MEDIA_CACHE_PATH, MEDIA_PREWARM, MEDIA_PREWARM_CONCURRENCY
 )
-from app.config import WELCOME_EFFECT_ID
+from app.media import MediaCache
+from app.webhook import run_webhook
+from app.backlog import drain_pending_updates
+from app.notifications import NotificationDispatcher
+from app.ratelimit import RateLimitMiddleware
+from app.throttling import CallbackThrottleMiddleware
+from app.userlock import UserLockMiddleware
+from app.orders import OrderIdempotencyIndex, new_order_id
+from app.config import ORDER_IDEMPOTENCY_SIZE, ORDER_IDEMPOTENCY_TTL, ORDER_JOURNAL_PATH
+from app.journal import OrderJournal
+from app.reports import format_day_orders, format_found, format_plan, format_stats, parse_day, split_message
+from app.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, MetricsRegistry, start_metrics_server
+from app.config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+from app.config import UPDATE_RECORD_PATH
+from app.recorder import UpdateRecorder
+from app.config import EDIT_IN_PLACE, FSM_SESSION_TTL_HOURS, FSM_MAX_ENTRIES, SWEEP_INTERVAL
+from app.screens import ScreenRenderer
+from app.config import ORDER_NOTIFICATION_TEMPLATE
+from app.templates import (
+    ORDER_CREATED, ORDER_PAID, PAYMENT_DETAILS, PRICE_CHANGED_WARNING, SLOT_OVERFLOW_WARNING, OrderSnapshot,
+    item_block_cache_info, select_manager_template,
+)
+from app.config import CATALOG_PATH, CATALOG_RELOAD_INTERVAL
+from app.catalog_file import CatalogWatcher
 
 # Настройка логирования
 logging.basicConfig(
@@ -34,85 +66,108 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Память корзин пользователей: user_id -> {cake_id: qty}
-CARTS: DefaultDict[int, Dict[str, int]] = defaultdict(dict)
+# Хранилище корзин пользователей: user_id -> Cart
+CART_STORE: CartStore = create_cart_store()
+
+# Состояния оформления заказа (в памяти или в SQLite)
+FSM_STORE = create_fsm_storage()
+
+# file_id фотографий тортов, уже загруженных в Telegram
+MEDIA_CACHE = MediaCache(MEDIA_CACHE_PATH)
+
+# Уведомление менеджеру об оплаченном заказе (ORDER_NOTIFICATION_TEMPLATE)
+MANAGER_TEMPLATE = select_manager_template(ORDER_NOTIFICATION_TEMPLATE)
+
+# Экраны навигации: правка текущего сообщения вместо удаления и новой отправки
+SCREENS = ScreenRenderer(
+    MEDIA_CACHE, ttl=FSM_SESSION_TTL_HOURS * 3600, max_entries=FSM_MAX_ENTRIES,
+    sweep_interval=SWEEP_INTERVAL, edit_in_place=EDIT_IN_PLACE,
+)
+
+# Фоновая доставка уведомлений менеджеру (с сохранением на диск и повторами)
+NOTIFIER = NotificationDispatcher(NOTIFY_SPOOL_DIR, workers=NOTIFY_WORKERS, max_backoff=NOTIFY_MAX_BACKOFF)
+
+# Очередь исходящих запросов к Bot API (общий лимит и лимиты по чатам)
+RATE_LIMITER = RateLimitMiddleware(
+    global_rate=RATE_LIMIT_GLOBAL, chat_rate=RATE_LIMIT_PER_CHAT, chat_burst=RATE_LIMIT_CHAT_BURST
+)
+
+# Склейка и отброс повторных нажатий одной и той же кнопки
+THROTTLE = CallbackThrottleMiddleware(window=THROTTLE_WINDOW, coalesce_prefixes=THROTTLE_COALESCE_PREFIXES)
+
+# Последовательная обработка обновлений одного пользователя
+USER_LOCKS = UserLockMiddleware()
+
+# Уже подтверждённые заказы: повторное «Платёж выполнен» не создаёт дубль
+PAID_ORDERS = OrderIdempotencyIndex(max_size=ORDER_IDEMPOTENCY_SIZE, ttl=ORDER_IDEMPOTENCY_TTL)
+
+# Журнал оплаченных заказов с индексом по номеру, клиенту, телефону и дате
+JOURNAL = OrderJournal(ORDER_JOURNAL_PATH)
 
+# Запись входящих обновлений для воспроизведения (включается UPDATE_RECORD_PATH)
+RECORDER = UpdateRecorder(UPDATE_RECORD_PATH, MANAGER_CHAT_ID) if UPDATE_RECORD_PATH else None
 
-def cart_total(user_id: int) -> int:
-    total = 0
-    for cake_id, qty in CARTS[user_id].items():
-        cake = get_cake_by_id(cake_id)
-        if cake:
-            total += cake.price * qty
-    return total
+# Каталог из файла с подменой на лету (включается CATALOG_PATH)
+CATALOG_WATCHER = CatalogWatcher(CATALOG_PATH, CATALOG_RELOAD_INTERVAL) if CATALOG_PATH else None
 
+# Предупреждение клиенту, если из его корзины убраны снятые с продажи торты
+STALE_ITEMS_NOTICE = "⚠️ Некоторых тортов из вашей корзины больше нет в каталоге — мы убрали их из корзины."
 
-def cart_text(user_id: int) -> str:
-    if not CARTS[user_id]:
-        return "Ваша корзина пуста."
-    lines = ["Ваша корзина:"]
-    for cake_id, qty in CARTS[user_id].items():
-        cake = get_cake_by_id(cake_id)
-        if cake:
-            lines.append(f"• {cake.name} × {qty} = {cake.price * qty}₽")
-    lines.append(f"Итого: {cart_total(user_id)}₽")
+
+def cart_text(cart: Cart, stale: int = 0) -> str:
+    notice = f"{STALE_ITEMS_NOTICE}\n\n" if stale else ""
+    if not cart:
+        return f"{notice}Ваша корзина пуста."
+    lines = [f"{notice}Ваша корзина:"]
+    lines.extend(get_catalog().item_lines(cart.items))
+    lines.append(f"Итого: {cart.total}₽")
     return "\n".join(lines)
 
 
 # ==================== ВСПОМОГАТЕЛЬНОЕ: РАСПИСАНИЕ И СЛОТЫ ====================
 
-def _parse_schedule_start() -> date:
-    try:
-        y, m, d = [int(x) for x in BAKER_SCHEDULE_START_DATE.split("-")]
-        return date(y, m, d)
-    except Exception:
-        return date.today()
-
-
-def is_working_day(day: date) -> bool:
-    base = _parse_schedule_start()
-    cycle = WORK_CYCLE_ON_DAYS + WORK_CYCLE_OFF_DAYS
-    if cycle <= 0:
-        return True
-    delta = (day - base).days
-    mod = delta % cycle
-    return 0 <= mod < WORK_CYCLE_ON_DAYS
-
-
-def generate_available_dates(now_dt: datetime) -> List[str]:
-    dates: List[str] = []
-    for i in range(MAX_DAYS_AHEAD + 1):
-        d = (now_dt.date() + timedelta(days=i))
-        if not is_working_day(d):
-            continue
-        # Проверка минимального времени: если день текущий, должен быть хотя бы MIN_LEAD_HOURS
-        if i == 0:
-            if now_dt + timedelta(hours=MIN_LEAD_HOURS) < datetime.combine(d, dt_time(hour=WORKING_HOURS_END)):
-                dates.append(d.isoformat())
-        else:
-            dates.append(d.isoformat())
-    return dates
+# Рабочие дни и слоты предзаказа (таблицы пересобираются сами на границе слота)
+SCHEDULE = create_schedule()
+
+# Вместимость слотов и резервы клиентов
+RESERVATIONS = create_slot_reservations()
+
+# Метрики: время обработчиков, запросы к Bot API и состояние компонентов
+METRICS = MetricsRegistry()
+for _name, _collect in (
+    ("notifications", NOTIFIER.metrics),
+    ("ratelimit", RATE_LIMITER.metrics),
+    ("throttle", THROTTLE.metrics),
+    ("userlock", USER_LOCKS.metrics),
+    ("paid_orders", PAID_ORDERS.metrics),
+    ("journal", JOURNAL.metrics),
+    ("carts", CART_STORE.metrics),
+    ("fsm", FSM_STORE.metrics),
+    ("markup_cache", markup_cache_info),
+    ("screens", SCREENS.metrics),
+    ("item_blocks", item_block_cache_info),
+):
+    METRICS.register_collector(_name, _collect)
+if RECORDER is not None:
+    METRICS.register_collector("recorder", RECORDER.metrics)
+if CATALOG_WATCHER is not None:
+    METRICS.register_collector("catalog", CATALOG_WATCHER.metrics)
+
+
+def bookable_slots(date_iso: str, now_dt: datetime, cart: Cart, user_id: int) -> Tuple[str, ...]:
+    """Слоты даты, в которые ещё помещается корзина пользователя"""
+    return RESERVATIONS.available_slots(
+        date_iso, SCHEDULE.slots_for_date(date_iso, now_dt),
+        RESERVATIONS.cart_units(cart.items), owner=user_id,
+    )
 
 
-def generate_time_slots_for_date(target_date_iso: str, now_dt: datetime) -> List[str]:
-    try:
-        y, m, d = [int(x) for x in target_date_iso.split("-")]
-        target_date = date(y, m, d)
-    except Exception:
-        return []
-    if not is_working_day(target_date):
-        return []
-    slots: List[str] = []
-    start_dt = datetime.combine(target_date, dt_time(hour=WORKING_HOURS_START))
-    end_dt = datetime.combine(target_date, dt_time(hour=WORKING_HOURS_END))
-    step = timedelta(minutes=SLOT_MINUTES)
-    cursor = start_dt
-    min_dt = now_dt + timedelta(hours=MIN_LEAD_HOURS)
-    while cursor + step <= end_dt:
-        if cursor >= min_dt:
-            slots.append(cursor.strftime("%H:%M"))
-        cursor += step
-    return slots
+def bookable_dates(now_dt: datetime, cart: Cart, user_id: int) -> Tuple[str, ...]:
+    """Даты, на которые есть хотя бы один слот со свободной вместимостью"""
+    return tuple(
+        d for d in SCHEDULE.available_dates(now_dt)
+        if bookable_slots(d, now_dt, cart, user_id)
+    )
 
 
 def format_date_ru(date_iso: str) -> str:
@@ -123,30 +178,14 @@ def format_date_ru(date_iso: str) -> str:
         return date_iso
 
 
-def format_method_ru(method: str | None) -> str:
-    if not method:
-        return ""
-    return "самовывоз" if method == "самовывоз" else "доставка"
-
-
-def format_address_line(order_data: dict) -> str:
-    """Формирует строку с адресом только для доставки"""
-    method = order_data.get('delivery_method')
-    if method == "доставка":
-        address = order_data.get('address', 'не указан')
-        return f"• Адрес: {address}"
-    return ""
-
-
 async def cmd_start(message: Message, state: FSMContext):
     logger.info(f"Команда /start от пользователя {message.from_user.id}")
     await state.clear()
+    await RESERVATIONS.release(message.from_user.id)
     
     # Отправляем приветственный стикер
     try:
-        await message.answer_sticker(
-            "CAACAgIAAxkBAAEPUWpou_GAnCdMdk0HEhGmGzuw1PBipgACBQADwDZPE_lqX5qCa011NgQ"
-        )
+        await message.answer_sticker(WELCOME_STICKER_ID)
     except:
         pass
 
@@ -166,11 +205,10 @@ async def cmd_start(message: Message, state: FSMContext):
 """
 
     # Отправляем с эффектом салюта
-    await message.answer(
-        text,
-        reply_markup=main_menu_kb(message.from_user.id),
-        message_effect_id=WELCOME_EFFECT_ID
-    )
+    menu = main_menu_kb(await CART_STORE.get(message.from_user.id))
+    await message.answer(text, reply_markup=menu, message_effect_id=WELCOME_EFFECT_ID)
+    # Приветствие экраном не считается, но reply-клавиатуру чат теперь видит эту
+    SCREENS.remember_keyboard(message.chat.id, menu)
 
 
 
@@ -182,22 +220,7 @@ async def show_catalog(message: Message | CallbackQuery):
         "✨ Выберите понравившийся торт и нажмите на него, чтобы увидеть фото и подробности!\n\n"
         "💡 Все торты готовятся из свежих ингредиентов по домашним рецептам."
     )
-    if isinstance(message, Message):
-        # Удаляем предыдущее сообщение (главное меню) при переходе в каталог
-        try:
-            await message.delete()
-        except:
-            pass
-        # Отправляем новое сообщение с каталогом
-        await message.answer(text, reply_markup=catalog_kb())
-    else:
-        # Удаляем предыдущее сообщение при переходе в каталог
-        try:
-            await message.message.delete()
-        except:
-            pass
-        # Отправляем новое сообщение с каталогом
-        await message.message.answer(text, reply_markup=catalog_kb())
+    await SCREENS.show(message, text, reply_markup=catalog_kb())
 
 
 async def open_cake_card(callback: CallbackQuery):
@@ -209,28 +232,24 @@ async def open_cake_card(callback: CallbackQuery):
     
     # Формируем подпись к фото с полной информацией
     photo_caption = (
-        f"🍰 <b>{cake.name}</b>\n\n"
-        f"<blockquote>📝 {cake.description}\n\n"
+        f"🍰 <b>{escape(cake.name)}</b>\n\n"
+        f"<blockquote>📝 {escape(cake.description)}\n\n"
         f"💰 Цена: {cake.price}₽</blockquote>\n\n"
         f"✨ Добавьте в корзину и оформите заказ!"
     )
     
-    if callback.message:
-        # Удаляем предыдущее сообщение (каталог) при открытии карточки торта
-        try:
-            await callback.message.delete()
-        except:
-            pass
-        # Отправляем фото с полной информацией в подписи
-        await callback.message.answer_photo(
-            photo=cake.photo_url,
-            caption=photo_caption,
-            reply_markup=cake_card_kb(cake, callback.from_user.id)
-        )
+    # Фото с полной информацией в подписи (по file_id, если уже загружали)
+    await SCREENS.show(
+        callback,
+        photo_caption,
+        reply_markup=cake_card_kb(cake, await CART_STORE.get(callback.from_user.id)),
+        photo_url=cake.photo_url,
+    )
     await callback.answer()
 
 
-async def add_to_cart(callback: CallbackQuery):
+async def add_to_cart(callback: CallbackQuery, repeat: int = 1):
+    # repeat > 1, если несколько быстрых нажатий склеены в одно (см. THROTTLE)
     cake_id = callback.data.split(":", 1)[1]
     cake = get_cake_by_id(cake_id)
     if not cake:
@@ -238,22 +257,18 @@ async def add_to_cart(callback: CallbackQuery):
         return
     
     user_id = callback.from_user.id
-    current_qty = CARTS[user_id].get(cake_id, 0)
-    new_qty = current_qty + 1
-    CARTS[user_id][cake_id] = new_qty
+    cart = await CART_STORE.add(user_id, cake_id, repeat)
     
     # Формируем сообщение с полной корзиной
-    message_lines = [f"🎉 {cake.name} добавлен в корзину!"]
+    added = f" × {repeat}" if repeat > 1 else ""
+    message_lines = [f"🎉 {cake.name}{added} добавлен в корзину!"]
     message_lines.append("")
     message_lines.append("📦 Ваша корзина:")
     
-    # Добавляем все товары из корзины
-    for cart_cake_id, qty in CARTS[user_id].items():
-        cart_cake = get_cake_by_id(cart_cake_id)
-        if cart_cake:
-            message_lines.append(f"• {cart_cake.name} × {qty} = {cart_cake.price * qty}₽")
+    # Добавляем все товары из корзины (всплывающее окно показывает текст без разметки)
+    message_lines.extend(get_catalog().item_lines(cart.items, html=False))
     
-    message_lines.append(f"💰 Итого: {cart_total(user_id)}₽")
+    message_lines.append(f"💰 Итого: {cart.total}₽")
     message_lines.append("")
     message_lines.append("💡 Откройте корзину, чтобы оформить заказ!")
     
@@ -263,47 +278,39 @@ async def add_to_cart(callback: CallbackQuery):
     # Обновляем кнопку, чтобы показать новое количество
     try:
         if callback.message:
-            cake = get_cake_by_id(cake_id)
-            if cake:
-                # Обновляем клавиатуру для сообщения с фото
-                await callback.message.edit_reply_markup(
-                    reply_markup=cake_card_kb(cake, user_id)
-                )
+            # Обновляем клавиатуру для сообщения с фото
+            await callback.message.edit_reply_markup(
+                reply_markup=cake_card_kb(cake, cart)
+            )
     except Exception as e:
         logger.error(f"Ошибка при обновлении кнопки: {e}")
 
 
-async def open_cart(event: Message | CallbackQuery):
+async def open_cart(event: Message | CallbackQuery, stale: int = 0):
+    # stale — сколько снятых с продажи позиций уже убрал вызывающий обработчик
     user_id = event.from_user.id if isinstance(event, Message) else event.from_user.id
-    text = cart_text(user_id)
-    has_items = bool(CARTS[user_id])
-    if isinstance(event, Message):
-        # Удаляем предыдущее сообщение (главное меню) при открытии корзины
-        try:
-            await event.delete()
-        except:
-            pass
-        # Отправляем новое сообщение с корзиной
-        await event.answer(text, reply_markup=cart_kb(has_items))
-    else:
-        if event.message:
-            # Удаляем предыдущее сообщение при открытии корзины
-            try:
-                await event.message.delete()
-            except:
-                pass
-            # Отправляем новое сообщение с корзиной
-            await event.message.answer(text, reply_markup=cart_kb(has_items))
+    stale += len(await CART_STORE.prune(user_id))
+    cart = await CART_STORE.get(user_id)
+    text = cart_text(cart, stale)
+    has_items = bool(cart)
+    await SCREENS.show(event, text, reply_markup=cart_kb(has_items))
+    if isinstance(event, CallbackQuery):
         await event.answer()
 
 
 async def clear_cart(callback: CallbackQuery):
-    CARTS.pop(callback.from_user.id, None)
+    await CART_STORE.pop(callback.from_user.id)
+    await RESERVATIONS.release(callback.from_user.id)
     await open_cart(callback)
 
 
 async def start_checkout(callback: CallbackQuery, state: FSMContext):
-    if not CARTS[callback.from_user.id]:
+    stale = await CART_STORE.prune(callback.from_user.id)
+    if stale:
+        # Каталог сменился, пока корзина была открыта: показываем её заново
+        await open_cart(callback, stale=len(stale))
+        return
+    if not await CART_STORE.get(callback.from_user.id):
         await callback.answer("Корзина пуста", show_alert=True)
         return
     await state.set_state(CheckoutState.delivery_method)
@@ -320,7 +327,8 @@ async def choose_delivery_method(callback: CallbackQuery, state: FSMContext):
     # Далее — выбор даты
     await state.set_state(CheckoutState.delivery_date)
     now_dt = datetime.now()
-    dates = generate_available_dates(now_dt)
+    cart = await CART_STORE.get(callback.from_user.id)
+    dates = bookable_dates(now_dt, cart, callback.from_user.id)
     if not dates:
         await callback.message.edit_text(
             "К сожалению, ближайшие слоты недоступны. Попробуйте позже.")
@@ -337,11 +345,12 @@ async def choose_date(callback: CallbackQuery, state: FSMContext):
     await state.update_data(delivery_date=date_str)
     await state.set_state(CheckoutState.delivery_time)
     now_dt = datetime.now()
-    slots = generate_time_slots_for_date(date_str, now_dt)
+    cart = await CART_STORE.get(callback.from_user.id)
+    slots = bookable_slots(date_str, now_dt, cart, callback.from_user.id)
     if not slots:
         await callback.message.edit_text(
             "В выбранную дату нет доступных слотов. Выберите другую дату:",
-            reply_markup=dates_kb(generate_available_dates(now_dt))
+            reply_markup=dates_kb(bookable_dates(now_dt, cart, callback.from_user.id))
         )
         await callback.answer()
         return
@@ -355,6 +364,23 @@ async def choose_date(callback: CallbackQuery, state: FSMContext):
 async def choose_time(callback: CallbackQuery, state: FSMContext):
     payload = callback.data.split(":", 1)[1]
     time_str, date_str = payload.split("|")
+    user_id = callback.from_user.id
+    cart = await CART_STORE.get(user_id)
+    # Занимаем слот на время оформления; если его успели забрать — предлагаем другие
+    if not await RESERVATIONS.hold(user_id, date_str, time_str, RESERVATIONS.cart_units(cart.items)):
+        await callback.answer("Это время уже заняли, выберите другое.", show_alert=True)
+        slots = bookable_slots(date_str, datetime.now(), cart, user_id)
+        if slots:
+            await callback.message.edit_text(
+                f"Дата: {format_date_ru(date_str)}. Выберите время:",
+                reply_markup=time_slots_kb(date_str, slots)
+            )
+        else:
+            await callback.message.edit_text(
+                "В выбранную дату нет доступных слотов. Выберите другую дату:",
+                reply_markup=dates_kb(bookable_dates(datetime.now(), cart, user_id))
+            )
+        return
     await state.update_data(delivery_time=time_str, delivery_date=date_str)
     # Далее — ФИО
     await state.set_state(CheckoutState.full_name)
@@ -390,49 +416,25 @@ async def finish_checkout(message: Message, state: FSMContext):
     data = await state.get_data()
     comment = message.text if message.text != "-" else "без комментария"
     user_id = message.from_user.id
+    order_id = new_order_id()
 
     # Сохраняем данные заказа в состоянии для последующей оплаты
     await state.update_data(
+        order_id=order_id,
         full_name=data.get('full_name'),
         phone=data.get('phone'),
         address=data.get('address'),
         comment=comment
     )
 
-    # Формируем сообщение подтверждения заказа
-    user_order_lines = ["🆕 ЗАКАЗ ОФОРМЛЕН"]
-    user_order_lines.append("")
-    user_order_lines.append("📋 Содержимое:")
-    
-    # Добавляем содержимое корзины
-    for cake_id, qty in CARTS[user_id].items():
-        cake = get_cake_by_id(cake_id)
-        if cake:
-            user_order_lines.append(f"• {cake.name} × {qty} = {cake.price * qty}₽")
-    
-    user_order_lines.append(f"Итого: {cart_total(user_id)}₽")
-    user_order_lines.append("")
-    user_order_lines.append("👤 Данные:")
-    user_order_lines.append(f"• Ваше имя: {data.get('full_name')}")
-    user_order_lines.append(f"• Телефон: {data.get('phone')}")
-    user_order_lines.append(f"• Способ: {format_method_ru(data.get('delivery_method'))}")
-    user_order_lines.append(f"• Дата: {format_date_ru(data.get('delivery_date'))}")
-    user_order_lines.append(f"• Время: {data.get('delivery_time')}")
-    address_line = format_address_line(data)
-    if address_line:
-        user_order_lines.append(address_line)
-    user_order_lines.append(f"• Комментарий: {comment}")
-    user_order_lines.append("")
-    user_order_lines.append("⏰ Время заказа: " + message.date.strftime("%d.%m.%Y %H:%M:%S"))
-    user_order_lines.append("")
-    user_order_lines.append("💳 Для завершения заказа нажмите кнопку 'Оплатить заказ' ниже.")
-    
-    user_order_text = "\n".join(user_order_lines)
+    cart = await CART_STORE.get(user_id)
+    order = OrderSnapshot.build(order_id, cart, {**data, "comment": comment}, message.date)
+    user_order_text = order.render(ORDER_CREATED)
 
     # Отправляем подтверждение заказа с кнопкой оплаты
     await message.answer(user_order_text, reply_markup=order_confirmation_kb())
     
-    logger.info(f"Заказ пользователя {user_id} оформлен, ожидает оплаты")
+    logger.info(f"Заказ {order_id} пользователя {user_id} оформлен, ожидает оплаты")
 
 
 async def back_handler(callback: CallbackQuery):
@@ -449,25 +451,19 @@ async def back_handler(callback: CallbackQuery):
             "• /feedback - оставить отзыв\n\n"
             "💡 Выберите действие с помощью кнопок ниже!"
         )
-        # Удаляем старое сообщение
-        try:
-            await callback.message.delete()
-        except:
-            pass
-        # Отправляем новое сообщение с главным меню
-        await callback.message.answer(text, reply_markup=main_menu_kb(callback.from_user.id))
+        await SCREENS.show(callback, text, reply_markup=main_menu_kb(await CART_STORE.get(callback.from_user.id)))
     elif action == "catalog":
         await show_catalog(callback)
-    elif action == "cart":
-        await open_cart(callback)
     elif action == "delivery":
         await callback.message.edit_text(
             "Выберите способ получения заказа:", reply_markup=delivery_method_kb()
         )
     elif action == "dates":
         now_dt = datetime.now()
+        cart = await CART_STORE.get(callback.from_user.id)
         await callback.message.edit_text(
-            "Выберите дату получения заказа:", reply_markup=dates_kb(generate_available_dates(now_dt))
+            "Выберите дату получения заказа:",
+            reply_markup=dates_kb(bookable_dates(now_dt, cart, callback.from_user.id))
         )
     await callback.answer()
 
@@ -479,36 +475,26 @@ async def start_payment(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     
     # Проверяем, что у пользователя есть заказ
-    if not CARTS[user_id]:
+    cart = await CART_STORE.get(user_id)
+    if not cart:
         await callback.answer("Корзина пуста", show_alert=True)
         return
     
     # Получаем данные заказа
     order_data = await state.get_data()
-    
-    payment_text = f"""💳 ОПЛАТА ЗАКАЗА
-
-💰 Сумма к оплате: {cart_total(user_id)}₽
-
-📱 Номер карты для оплаты:
-{CARD_NUMBER}
-
-📋 Содержимое заказа:
-{chr(10).join([f"• {get_cake_by_id(cake_id).name} × {qty} = {get_cake_by_id(cake_id).price * qty}₽" for cake_id, qty in CARTS[user_id].items()])}
-
-👤 Данные заказа:
-• Имя: {order_data.get('full_name')}
-• Телефон: {order_data.get('phone')}
-• Способ: {format_method_ru(order_data.get('delivery_method'))}
-• Дата: {format_date_ru(order_data.get('delivery_date'))}
-• Время: {order_data.get('delivery_time')}
-{format_address_line(order_data)}
-• Комментарий: {order_data.get('comment', 'без комментария')}
-
-⚠️ После перевода денег нажмите кнопку "Платёж выполнен" ниже."""
-    
+    order_id = order_data.get('order_id')
+    if not order_id:
+        # Оформление начато до появления номеров заказов
+        order_id = new_order_id()
+        await state.update_data(order_id=order_id)
+    order = OrderSnapshot.build(order_id, cart, order_data)
+    payment_text = order.render(PAYMENT_DETAILS, card_number=CARD_NUMBER)
+
+    # Счёт фиксирует состав и сумму: подтверждается именно он, даже если до подтверждения
+    # клиент добавит торт со старой карточки или сменится каталог
+    await state.update_data(quoted_items=dict(order.items), quoted_total=order.total)
     await state.set_state(PaymentState.confirm)
-    await callback.message.edit_text(payment_text, reply_markup=payment_confirm_kb())
+    await callback.message.edit_text(payment_text, reply_markup=payment_confirm_kb(order_id))
     await callback.answer()
 
 
@@ -516,69 +502,64 @@ async def process_payment_confirmation(callback: CallbackQuery, state: FSMContex
     """Обрабатывает подтверждение оплаты"""
     user_id = callback.from_user.id
     order_data = await state.get_data()
-    
-    # Формируем сообщение об успешной оплате
-    success_text = f"""✅ ПЛАТЁЖ ПОДТВЕРЖДЁН!
-
-💳 Заказ оплачен на сумму: {cart_total(user_id)}₽
-📱 Карта получателя: {CARD_NUMBER}
 
-🆕 ЗАКАЗ ПРИНЯТ И ОПЛАЧЕН
+    # Номер заказа приходит в кнопке: повторное нажатие получает прежний ответ,
+    # а кнопка уже закрытого заказа не создаёт новый пустой заказ
+    parts = callback.data.split(":", 2)
+    order_id = parts[2] if len(parts) == 3 else order_data.get('order_id')
+    already_done = PAID_ORDERS.get(order_id) if order_id else None
+    if already_done is not None:
+        await callback.answer(already_done, show_alert=True)
+        return
+    if not order_id or order_id != order_data.get('order_id'):
+        await callback.answer("Этот заказ уже не активен. Откройте корзину, чтобы оформить заказ заново.", show_alert=True)
+        return
 
-📋 Содержимое заказа:
-{chr(10).join([f"• {get_cake_by_id(cake_id).name} × {qty} = {get_cake_by_id(cake_id).price * qty}₽" for cake_id, qty in CARTS[user_id].items()])}
+    cart = await CART_STORE.get(user_id)
+    quoted_items = order_data.get('quoted_items')
+    # Оформление, начатое до фиксации счёта, подтверждается по текущей корзине
+    ordered = Cart(quoted_items) if quoted_items is not None else cart
+    order = OrderSnapshot.build(order_id, ordered, order_data, callback.message.date, callback.from_user)
+    warnings = []
+    quoted_total = order_data.get('quoted_total')
+    if quoted_total is not None and quoted_total != order.total:
+        # Тот же состав по новому каталогу стоит иначе: заказ — по выставленной сумме
+        logger.warning(f"Заказ {order_id}: сумма {quoted_total}₽ по счёту, {order.total}₽ по новому каталогу")
+        warnings.append(PRICE_CHANGED_WARNING.format(quoted=quoted_total, current=order.total))
+        order = replace(order, total=quoted_total)
+
+    # Закрепляем слот за оплаченным заказом
+    slot_confirmed = True
+    slot_units = RESERVATIONS.cart_units(ordered.items)
+    if order_data.get('delivery_date') and order_data.get('delivery_time'):
+        slot_confirmed = await RESERVATIONS.confirm(
+            user_id, order_data['delivery_date'], order_data['delivery_time'], slot_units,
+        )
+        if not slot_confirmed:
+            logger.warning(f"Слот {order_data['delivery_date']} {order_data['delivery_time']} переполнен заказом пользователя {user_id}")
+            warnings.append(SLOT_OVERFLOW_WARNING)
 
-👤 Данные:
-• Имя: {order_data.get('full_name')}
-• Телефон: {order_data.get('phone')}
-• Способ: {format_method_ru(order_data.get('delivery_method'))}
-• Дата: {format_date_ru(order_data.get('delivery_date'))}
-• Время: {order_data.get('delivery_time')}
-{format_address_line(order_data)}
-• Комментарий: {order_data.get('comment', 'без комментария')}
+    JOURNAL.append(order.to_record(slot_units=slot_units, slot_confirmed=slot_confirmed))
 
-⏰ Время заказа: {callback.message.date.strftime("%d.%m.%Y %H:%M:%S")}
+    success_text = order.render(ORDER_PAID, card_number=CARD_NUMBER)
 
-✅ Ваш заказ принят и оплачен! Менеджер свяжется с вами в ближайшее время."""
-    
     # Отправляем уведомление менеджеру
     if MANAGER_CHAT_ID:
-        manager_text = f"""💳 ПЛАТЁЖ ПОДТВЕРЖДЁН!
-
-🆕 НОВЫЙ ЗАКАЗ
-
-📋 Содержимое заказа:
-{chr(10).join([f"• {get_cake_by_id(cake_id).name} × {qty} = {get_cake_by_id(cake_id).price * qty}₽" for cake_id, qty in CARTS[user_id].items()])}
-Итого: {cart_total(user_id)}₽
-
-👤 Данные клиента:
-• Имя: {order_data.get('full_name')}
-• Телефон: {order_data.get('phone')}
-• Способ: {format_method_ru(order_data.get('delivery_method'))}
-• Дата: {format_date_ru(order_data.get('delivery_date'))}
-• Время: {order_data.get('delivery_time')}
-{format_address_line(order_data)}
-• Комментарий: {order_data.get('comment', 'без комментария')}
-
-👨‍💻 Информация о пользователе:
-• Username: @{callback.from_user.username or 'без никнейма'}
-• ID: {callback.from_user.id}
-• Имя: {callback.from_user.first_name or 'не указано'}
-• Фамилия: {callback.from_user.last_name or 'не указана'}
-
-⏰ Время заказа: {callback.message.date.strftime("%d.%m.%Y %H:%M:%S")}
-
-💰 СТАТУС: ПЛАТЁЖ ПОДТВЕРЖДЁН КЛИЕНТОМ
-⚠️ ТРЕБУЕТСЯ ПРОВЕРКА ПЛАТЕЖА"""
-        
-        try:
-            await callback.bot.send_message(MANAGER_CHAT_ID, manager_text)
-            logger.info(f"Заказ с подтверждением платежа отправлен менеджеру {MANAGER_CHAT_ID}")
-        except Exception as e:
-            logger.error(f"Ошибка при отправке заказа: {e}")
+        manager_text = order.render(MANAGER_TEMPLATE, warnings="\n".join(warnings))
+
+        # Не ждём Bot API: уведомление сохраняется в спул и уходит в фоне
+        await NOTIFIER.enqueue(MANAGER_CHAT_ID, manager_text)
+        logger.info(f"Заказ {order_id} с подтверждением платежа поставлен в очередь для менеджера {MANAGER_CHAT_ID}")
+
+    PAID_ORDERS.record(order_id, f"Заказ №{order_id} уже подтверждён ✅ Менеджер свяжется с вами.")
     
-    # Очищаем корзину и состояние
-    CARTS.pop(user_id, None)
+    # Очищаем корзину и состояние; торты, добавленные после выставления счёта,
+    # в заказ не вошли и остаются в корзине
+    await CART_STORE.pop(user_id)
+    for cake_id, qty in cart.items.items():
+        extra = qty - ordered.qty(cake_id)
+        if extra > 0:
+            await CART_STORE.add(user_id, cake_id, extra)
     await state.clear()
     
     # Отправляем подтверждение пользователю
@@ -586,7 +567,7 @@ async def process_payment_confirmation(callback: CallbackQuery, state: FSMContex
     
     # Отправляем стикер после оплаты
     try:
-        await callback.message.answer_sticker("CAACAgIAAxkBAAEPUX1ou_UPzrbLgxAAAc6qcrkC74GQj70AAgEdAAJdjShIYFtNtyx1ELs2BA")
+        await callback.message.answer_sticker(PAYMENT_STICKER_ID)
     except:
         pass
     
@@ -610,12 +591,13 @@ https://t.me/+zdtovQ9SvMxjZTUy
     )
     await callback.answer()
     
-    logger.info(f"Заказ пользователя {user_id} с подтверждением платежа")
+    logger.info(f"Заказ {order_id} пользователя {user_id} с подтверждением платежа")
 
 
 async def cancel_payment(callback: CallbackQuery, state: FSMContext):
     """Отменяет процесс оплаты"""
     await state.clear()
+    await RESERVATIONS.release(callback.from_user.id)
     await callback.message.edit_text("❌ Оплата отменена. Заказ сохранен в корзине.")
     await callback.answer()
 
@@ -623,6 +605,7 @@ async def cancel_payment(callback: CallbackQuery, state: FSMContext):
 async def back_to_cart(callback: CallbackQuery, state: FSMContext):
     """Возвращает к корзине"""
     await state.clear()
+    await RESERVATIONS.release(callback.from_user.id)
     await open_cart(callback)
 
 
@@ -657,26 +640,108 @@ async def cmd_feedback(message: Message):
     await show_reviews(message)
 
 
-async def main():
-    logger.info("Запуск кулинарного бота...")
-    
-    # Проверяем критически важные настройки
-    if not MANAGER_CHAT_ID:
-        logger.error("❌ КРИТИЧЕСКАЯ ОШИБКА: MANAGER_CHAT_ID не настроен!")
-        logger.error("❌ Заказы НЕ будут отправляться в чат менеджера!")
-        logger.error("❌ Создайте файл .env с правильным MANAGER_CHAT_ID")
-        logger.error("❌ Или установите переменную окружения MANAGER_CHAT_ID")
-    else:
-        logger.info(f"✅ MANAGER_CHAT_ID настроен: {MANAGER_CHAT_ID}")
-    
-    bot = Bot(BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
+# ==================== КОМАНДЫ МЕНЕДЖЕРА ====================
+
+async def answer_long(message: Message, text: str):
+    for chunk in split_message(text):
+        await message.answer(chunk, disable_web_page_preview=True)
+
+
+async def cmd_orders(message: Message, command: CommandObject):
+    """/orders [дата] — заказы на дату получения (по умолчанию сегодня)"""
+    date_iso = parse_day(command.args, datetime.now().date())
+    if date_iso is None:
+        await message.answer("Формат: /orders 2026-10-20, /orders 20.10 или /orders завтра")
+        return
+    await answer_long(message, format_day_orders(await JOURNAL.day(date_iso)))
+
+
+async def cmd_plan(message: Message, command: CommandObject):
+    """/plan [дата] — что выпекать к каждому слоту (по умолчанию завтра)"""
+    date_iso = parse_day(command.args, datetime.now().date(), default_shift=1)
+    if date_iso is None:
+        await message.answer("Формат: /plan tomorrow, /plan 2026-10-20 или /plan 20.10")
+        return
+    await answer_long(message, format_plan(await JOURNAL.day(date_iso)))
+
+
+async def cmd_stats(message: Message):
+    """/stats — время обработчиков, запросы к Bot API и состояние очередей"""
+    if not METRICS_ENABLED:
+        await message.answer("Метрики отключены (METRICS_ENABLED=false).")
+        return
+    await answer_long(message, format_stats(METRICS, int(JOURNAL.stats["appended"])))
+
+
+async def cmd_find(message: Message, command: CommandObject):
+    """/find телефон|номер заказа — поиск заказов"""
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Формат: /find +7 900 123-45-67 или /find 261020-4F9A2C")
+        return
+    order = await JOURNAL.get(query.upper())
+    records = [order] if order is not None else await JOURNAL.by_phone(query)
+    await answer_long(message, format_found(query, records))
+
+
+async def cmd_catalog(message: Message):
+    """/catalog — перечитать файл каталога и показать, какая версия действует"""
+    if CATALOG_WATCHER is None:
+        await message.answer(f"Используется встроенный каталог: {len(get_catalog())} позиций. Файл не задан (CATALOG_PATH).")
+        return
+    reloaded = await CATALOG_WATCHER.check(force=True)
+    catalog = get_catalog()
+    lines = [
+        f"📦 Каталог {escape(CATALOG_PATH)}: версия {catalog.version}, позиций {len(catalog)}"
+        + (" — обновлён" if reloaded else ""),
+    ]
+    if CATALOG_WATCHER.last_error:
+        lines.append(f"⚠️ Файл не применён: {escape(CATALOG_WATCHER.last_error)}")
+    lines.extend(f"• {escape(cake.name)} — {cake.price}₽ ({escape(cake.id)})" for cake in catalog)
+    await answer_long(message, "\n".join(lines))
+
+
+def create_bot(session: Optional[BaseSession] = None) -> Bot:
+    """Создаёт бота; session позволяет направить запросы на другой сервер Bot API (например, в тестах)"""
+    bot = Bot(BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    if RATE_LIMIT_ENABLED:
+        bot.session.middleware(RATE_LIMITER)
+    if METRICS_ENABLED:
+        # Подключается после лимитов: меряет сам запрос, без ожидания в очереди
+        bot.session.middleware(ApiMetricsMiddleware(METRICS))
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Создаёт диспетчер и регистрирует все обработчики бота"""
+    dp = Dispatcher(storage=FSM_STORE)
+    if RECORDER is not None:
+        # Записываются все обновления, в том числе те, что потом отбросит склейка нажатий
+        dp.update.outer_middleware(RECORDER)
+    # Порядок важен: повторные нажатия склеиваются до того, как встанут в очередь пользователя
+    # (а любое другое обновление клиента сначала дожидается его склеенных нажатий)
+    dp.callback_query.outer_middleware(THROTTLE)
+    dp.callback_query.outer_middleware(USER_LOCKS)
+    dp.message.outer_middleware(THROTTLE)
+    dp.message.outer_middleware(USER_LOCKS)
+    if METRICS_ENABLED:
+        handler_metrics = HandlerMetricsMiddleware(METRICS)
+        dp.message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
 
     # Команды
     dp.message.register(cmd_start, CommandStart())
     dp.message.register(cmd_basket, Command("basket"))
     dp.message.register(cmd_feedback, Command("feedback"))
 
+    # Команды менеджера работают только в его чате
+    from_manager = F.chat.id == MANAGER_CHAT_ID
+    dp.message.register(cmd_orders, Command("orders"), from_manager)
+    dp.message.register(cmd_plan, Command("plan"), from_manager)
+    dp.message.register(cmd_find, Command("find"), from_manager)
+    dp.message.register(cmd_stats, Command("stats"), from_manager)
+    dp.message.register(cmd_catalog, Command("catalog"), from_manager)
+
     # Главное меню
     dp.message.register(show_catalog, F.text == "🍰 Каталог")
     dp.message.register(open_cart, F.text.startswith("🛒 Корзина"))
@@ -700,18 +765,97 @@ async def main():
     dp.message.register(ask_comment, CheckoutState.address)
     dp.message.register(finish_checkout, CheckoutState.comment)
 
-    # Навигация
+    # Навигация; «back:cart» уводит из оформления (снимает резерв слота), поэтому
+    # регистрируется раньше общего обработчика «back:»
+    dp.callback_query.register(back_to_cart, F.data == "back:cart")
     dp.callback_query.register(back_handler, F.data.startswith("back:"))
     
     # Платежи
     dp.callback_query.register(start_payment, F.data == "payment:start")
-    dp.callback_query.register(process_payment_confirmation, F.data == "payment:confirm")
+    dp.callback_query.register(process_payment_confirmation, F.data.startswith("payment:confirm"))
     dp.callback_query.register(cancel_payment, F.data == "payment:cancel")
-    dp.callback_query.register(back_to_cart, F.data == "back:cart")
 
-    logger.info("Бот успешно запущен и готов к работе!")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    return dp
+
+
+async def main():
+    logger.info("Запуск кулинарного бота...")
+    
+    # Проверяем критически важные настройки
+    if not MANAGER_CHAT_ID:
+        logger.error("❌ КРИТИЧЕСКАЯ ОШИБКА: MANAGER_CHAT_ID не настроен!")
+        logger.error("❌ Заказы НЕ будут отправляться в чат менеджера!")
+        logger.error("❌ Создайте файл .env с правильным MANAGER_CHAT_ID")
+        logger.error("❌ Или установите переменную окружения MANAGER_CHAT_ID")
+    else:
+        logger.info(f"✅ MANAGER_CHAT_ID настроен: {MANAGER_CHAT_ID}")
+    
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    await CART_STORE.start()
+    await FSM_STORE.start()
+    await NOTIFIER.start(bot)
+    await JOURNAL.load()
+    JOURNAL.start()
+    if CATALOG_WATCHER is not None:
+        await CATALOG_WATCHER.start()
+    # Оплаченные заказы снова занимают свои слоты
+    # (заодно готовятся сводки ближайших дней для команд менеджера)
+    for date_iso in JOURNAL.dates_from(datetime.now().date().isoformat()):
+        for order in (await JOURNAL.day(date_iso)).orders:
+            if order.get("delivery_time"):
+                RESERVATIONS.restore(date_iso, order["delivery_time"], order.get("slot_units", 1))
+    MEDIA_CACHE.load()
+    if RECORDER is not None:
+        RECORDER.open()
+    metrics_runner = None
+    if METRICS_ENABLED and METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS, METRICS_HOST, METRICS_PORT)
+    prewarm_task = None
+    if MEDIA_PREWARM and MANAGER_CHAT_ID:
+        # Прогреваем фото в фоне, чтобы не задерживать запуск
+        prewarm_task = asyncio.create_task(MEDIA_CACHE.prewarm(
+            bot, MANAGER_CHAT_ID, [cake.photo_url for cake in get_catalog()],
+            concurrency=MEDIA_PREWARM_CONCURRENCY,
+        ))
+        if CATALOG_WATCHER is not None:
+            async def prewarm_new_photos(catalog):
+                # Фото новых тортов загружаются заранее, как и при запуске
+                await MEDIA_CACHE.prewarm(
+                    bot, MANAGER_CHAT_ID, [cake.photo_url for cake in catalog],
+                    concurrency=MEDIA_PREWARM_CONCURRENCY,
+                )
+            CATALOG_WATCHER.on_reload = prewarm_new_photos
+    logger.info(f"Бот успешно запущен и готов к работе! Режим: {RUN_MODE}")
+    try:
+        # getUpdates работает только без вебхука, поэтому снимаем его в обоих режимах
+        drop_pending = PENDING_UPDATES_MODE == "drop"
+        await bot.delete_webhook(drop_pending_updates=drop_pending)
+        if not drop_pending:
+            await drain_pending_updates(
+                bot, dp, max_age=PENDING_UPDATE_MAX_AGE, concurrency=PENDING_DRAIN_CONCURRENCY
+            )
+        if RUN_MODE == "webhook":
+            await run_webhook(bot, dp, METRICS if METRICS_ENABLED else None)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        if prewarm_task is not None:
+            prewarm_task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if RECORDER is not None:
+            RECORDER.close()
+        if CATALOG_WATCHER is not None:
+            await CATALOG_WATCHER.close()
+        # Неотправленные уведомления остаются в спуле до следующего запуска
+        await NOTIFIER.close()
+        await JOURNAL.close()
+        # Сбрасываем на диск корзины, ещё не записанные фоновым сбросом
+        await CART_STORE.close()
+        await FSM_STORE.close()
+        await MEDIA_CACHE.save()
 
 if __name__ == "__main__":
     try:
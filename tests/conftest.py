@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+import os
+import sys
+
+import pytest
+
+# Тесты импортируют main и app из корня проекта
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.sandbox import prepare_environment  # noqa: E402
+
+# Настройки читаются при импорте app.config — файлы данных бота уходят во временный каталог.
+# Лимиты Bot API в тестах только замедляют ответы FakeSession
+prepare_environment(MANAGER_CHAT_ID="777", RATE_LIMIT_ENABLED="false")
+
+_update_ids = itertools.count(1)
+_user_ids = itertools.count(500_000)
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """Один цикл событий на все тесты: синглтоны main создают очереди и блокировки в нём"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def run(loop):
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def user_id():
+    """Новый пользователь на каждый тест — корзины и состояния тестов не пересекаются"""
+    return next(_user_ids)
+
+
+@pytest.fixture(scope="session")
+def bot_app(loop):
+    """Бот из main.py на FakeSession с запущенными фоновыми компонентами"""
+    import main
+    from benchmarks.fake_api import FakeSession
+    from benchmarks.sandbox import start_components, stop_components
+
+    bot = main.create_bot(FakeSession())
+    dp = main.create_dispatcher()
+    loop.run_until_complete(start_components(main, bot))
+    yield bot, dp
+    loop.run_until_complete(stop_components(main, bot))
+
+
+def callback_update(user_id: int, data: str, message_id: int = 100) -> dict:
+    update_id = next(_update_ids)
+    user = {"id": user_id, "is_bot": False, "first_name": "Тест"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": "tests",
+            "data": data,
+            # date=0 aiogram считает недоступным сообщением
+            "message": {"message_id": message_id, "date": 1, "chat": {"id": user_id, "type": "private"}, "text": "…"},
+        },
+    }
+
+
+@pytest.fixture
+def feed(bot_app):
+    """Прогоняет обновление через диспетчер, как при polling"""
+    from aiogram.types import Update
+
+    bot, dp = bot_app
+
+    async def feed(raw: dict):
+        return await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+
+    return feed
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from app.cart import Cart
+from app.catalog import get_catalog, reload_catalog
+from app.catalog_file import CatalogWatcher
+from app.templates import ORDER_CREATED, OrderSnapshot
+
+CAKES = [
+    {"id": "trio", "name": "Торт <Три> & шоколада", "price": 2500, "description": "Три шоколада"},
+    {"id": "honey", "name": "Медовик", "price": "1800"},
+]
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    original = get_catalog().cakes
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(CAKES, ensure_ascii=False), encoding="utf-8")
+    yield path
+    # Остальные тесты работают со встроенным каталогом
+    reload_catalog(list(original))
+
+
+def test_good_file_replaces_catalog(run, catalog_file):
+    version = get_catalog().version
+    watcher = CatalogWatcher(str(catalog_file), interval=0)
+
+    assert run(watcher.check())
+    catalog = get_catalog()
+    assert catalog.version == version + 1
+    assert [cake.id for cake in catalog] == ["trio", "honey"]
+    assert catalog.price("honey") == 1800
+    # Тот же файл повторно не разбирается
+    assert not run(watcher.check())
+    assert get_catalog().version == version + 1
+
+
+def test_bad_file_keeps_previous_catalog(run, catalog_file):
+    watcher = CatalogWatcher(str(catalog_file), interval=0)
+    run(watcher.check())
+    version = get_catalog().version
+
+    catalog_file.write_text(json.dumps([{**CAKES[0], "price": "дорого"}], ensure_ascii=False), encoding="utf-8")
+    assert not run(watcher.check())
+    assert get_catalog().version == version
+    assert get_catalog().get("honey") is not None
+    assert "цена" in watcher.last_error
+    assert watcher.metrics()["errors"] == 1
+
+
+def test_names_are_escaped_in_html_texts(run, catalog_file):
+    run(CatalogWatcher(str(catalog_file), interval=0).check())
+    catalog = get_catalog()
+
+    assert catalog.item_lines({"trio": 2}) == ["• Торт &lt;Три&gt; &amp; шоколада × 2 = 5000₽"]
+    # Всплывающее окно показывает текст как есть
+    assert catalog.item_lines({"trio": 1}, html=False) == ["• Торт <Три> & шоколада × 1 = 2500₽"]
+
+    text = OrderSnapshot.build("T-1", Cart({"trio": 1, "honey": 1}), {}).render(ORDER_CREATED)
+    assert "Торт &lt;Три&gt; &amp; шоколада" in text
+    assert "<Три>" not in text
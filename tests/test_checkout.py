@@ -0,0 +1,51 @@
+import asyncio
+from datetime import date, timedelta
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+import main
+from app.orders import new_order_id
+from app.states import PaymentState
+from conftest import callback_update
+
+
+def test_back_to_cart_releases_slot_hold(run, feed, user_id):
+    """«⬅️ К корзине» из оформления снимает временный резерв слота"""
+    day = (date.today() + timedelta(days=2)).isoformat()
+    free = main.RESERVATIONS.remaining(day, "12:00")
+
+    assert run(main.RESERVATIONS.hold(user_id, day, "12:00", 1))
+    assert main.RESERVATIONS.remaining(day, "12:00") == free - 1
+
+    run(feed(callback_update(user_id, "back:cart")))
+    assert main.RESERVATIONS.remaining(day, "12:00") == free
+
+
+def test_repeated_payment_confirmation_is_idempotent(run, feed, bot_app, user_id):
+    """Повторное «Я оплатил» не создаёт второй заказ и второе уведомление менеджеру"""
+    bot, _ = bot_app
+    cake = main.get_catalog().cakes[0]
+    order_id = new_order_id()
+
+    async def start_payment():
+        await main.CART_STORE.add(user_id, cake.id, 2)
+        state = FSMContext(main.FSM_STORE, StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id))
+        await state.update_data(
+            order_id=order_id, full_name="Тест", phone="+79990000000", address="-", comment="-",
+            quoted_items={cake.id: 2}, quoted_total=cake.price * 2,
+        )
+        await state.set_state(PaymentState.confirm)
+
+    run(start_payment())
+    enqueued = main.NOTIFIER.stats["enqueued"]
+
+    run(feed(callback_update(user_id, f"payment:confirm:{order_id}")))
+    # Ждём дольше окна антидребезга, чтобы второе нажатие дошло до обработчика
+    run(asyncio.sleep(main.THROTTLE.window + 0.1))
+    run(feed(callback_update(user_id, f"payment:confirm:{order_id}")))
+
+    orders = run(main.JOURNAL.by_user(user_id))
+    assert [order["order_id"] for order in orders] == [order_id]
+    assert main.NOTIFIER.stats["enqueued"] == enqueued + 1
+    assert not run(main.CART_STORE.get(user_id))
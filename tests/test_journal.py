@@ -0,0 +1,84 @@
+import json
+
+from app.journal import OrderJournal
+
+
+def order(order_id, user_id=1, delivery_date="2026-10-20", **extra):
+    return {"order_id": order_id, "user_id": user_id, "phone": "+7 999 000-00-00",
+            "delivery_date": delivery_date, "total": 1000, **extra}
+
+
+async def _start(journal):
+    journal.start()
+
+
+def reopen(run, path):
+    journal = OrderJournal(path)
+    count = run(journal.load())
+    return journal, count
+
+
+def test_append_and_reload_index(run, tmp_path):
+    path = str(tmp_path / "orders.jsonl")
+    journal = OrderJournal(path)
+    run(_start(journal))
+    journal.append(order("A-1"))
+    journal.append(order("A-2", user_id=2, comment='с "кавычками"'))
+    journal.append(order("A-3", delivery_date="2026-10-21"))
+    # Ещё не записанные заказы уже видны в индексе
+    assert run(journal.get("A-2"))["user_id"] == 2
+    run(journal.close())
+
+    journal, count = reopen(run, path)
+    assert count == len(journal) == 3
+    assert run(journal.get("A-2"))["comment"] == 'с "кавычками"'
+    assert [r["order_id"] for r in run(journal.by_user(1))] == ["A-1", "A-3"]
+    assert [r["order_id"] for r in run(journal.by_phone("89990000000"))] == ["A-1", "A-2", "A-3"]
+    assert journal.dates_from("2026-10-21") == ["2026-10-21"]
+
+
+def test_retry_truncates_torn_write(run, tmp_path):
+    """Хвост неудачной записи отрезается, и следующая пачка ложится на своё смещение"""
+    path = str(tmp_path / "orders.jsonl")
+    journal = OrderJournal(path)
+    run(_start(journal))
+    journal.append(order("A-1"))
+    run(journal._queue.join())
+    with open(path, "ab") as f:
+        f.write(b'{"order_id":"A-2","us')
+    journal.append(order("A-2"))
+    run(journal.close())
+
+    journal, count = reopen(run, path)
+    assert count == 2
+    assert run(journal.get("A-2"))["order_id"] == "A-2"
+
+
+def test_torn_last_line_is_dropped(run, tmp_path):
+    path = tmp_path / "orders.jsonl"
+    line = json.dumps(order("A-1"), ensure_ascii=False, separators=(",", ":")) + "\n"
+    path.write_text(line + '{"order_id":"A-2","user_id":1', encoding="utf-8")
+
+    journal, count = reopen(run, str(path))
+    assert count == 1
+    assert path.read_text(encoding="utf-8") == line
+
+    # Новый заказ не приклеивается к оборванной строке
+    run(_start(journal))
+    journal.append(order("A-3"))
+    run(journal.close())
+    journal, count = reopen(run, str(path))
+    assert count == 2
+    assert run(journal.get("A-3"))["order_id"] == "A-3"
+
+
+def test_corrupt_lines_are_skipped(run, tmp_path):
+    path = tmp_path / "orders.jsonl"
+    path.write_text(
+        "[]\n1\nне json\n" + json.dumps(order("A-1"), ensure_ascii=False) + "\n",
+        encoding="utf-8",
+    )
+
+    journal, count = reopen(run, str(path))
+    assert count == 1
+    assert run(journal.get("A-1"))["order_id"] == "A-1"
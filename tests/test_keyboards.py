@@ -0,0 +1,26 @@
+import main
+from app.catalog import get_catalog
+from app.keyboards import cake_card_kb, main_menu_kb
+
+
+def test_badges_follow_cart_store(run):
+    """Бейдж корзины и счётчик на карточке показывают корзину из CART_STORE"""
+    catalog = get_catalog()
+    cake, other = catalog.cakes[0], catalog.cakes[1]
+    user_id = 424242
+
+    async def scenario():
+        assert main_menu_kb(await main.CART_STORE.get(user_id)).keyboard[0][1].text == "🛒 Корзина"
+        assert cake_card_kb(cake, await main.CART_STORE.get(user_id)).inline_keyboard[0][0].text == "➕ В корзину"
+
+        await main.CART_STORE.add(user_id, cake.id, 2)
+        await main.CART_STORE.add(user_id, other.id)
+        cart = await main.CART_STORE.get(user_id)
+        assert main_menu_kb(cart).keyboard[0][1].text == "🛒 Корзина (3)"
+        assert cake_card_kb(cake, cart).inline_keyboard[0][0].text == "➕ В корзину (2)"
+        assert cake_card_kb(other, cart).inline_keyboard[0][0].text == "➕ В корзину (1)"
+
+        await main.CART_STORE.pop(user_id)
+        assert main_menu_kb(await main.CART_STORE.get(user_id)).keyboard[0][1].text == "🛒 Корзина"
+
+    run(scenario())
@@ -0,0 +1,15 @@
+from app.reports import split_message
+
+
+def test_split_message_keeps_lines_whole():
+    text = "\n".join(["x" * 30] * 10)
+    parts = list(split_message(text, limit=100))
+    assert all(len(part) <= 100 for part in parts)
+    assert "\n".join(parts) == text
+    assert all(len(line) == 30 for part in parts for line in part.split("\n"))
+
+
+def test_split_message_cuts_line_longer_than_limit():
+    text = "шапка\n" + "я" * 250 + "\nподвал"
+    parts = list(split_message(text, limit=100))
+    assert parts == ["шапка", "я" * 100, "я" * 100, "я" * 50 + "\nподвал"]
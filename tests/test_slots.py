@@ -0,0 +1,86 @@
+import asyncio
+from datetime import date, timedelta
+
+from app.slots import SlotReservations
+
+DAY = (date.today() + timedelta(days=3)).isoformat()
+
+
+def test_concurrent_holds_do_not_overbook(run):
+    """Одновременные резервы одного слота не превышают его вместимость"""
+    slots = SlotReservations(default_capacity=2)
+
+    async def scenario():
+        return await asyncio.gather(*(slots.hold(owner, DAY, "12:00", 1) for owner in range(5)))
+
+    assert sorted(run(scenario())) == [False, False, False, True, True]
+    assert slots.remaining(DAY, "12:00") == 0
+
+
+def test_rehold_replaces_own_hold(run):
+    """Повторный резерв того же клиента заменяет прежний, а не складывается с ним"""
+    slots = SlotReservations(default_capacity=2)
+
+    assert run(slots.hold(1, DAY, "12:00", 2))
+    # Собственный резерв считается свободным для его владельца
+    assert slots.remaining(DAY, "12:00", owner=1) == 2
+    assert run(slots.hold(1, DAY, "12:00", 2))
+    assert slots.remaining(DAY, "12:00") == 0
+
+    assert run(slots.hold(1, DAY, "14:00", 1))
+    assert slots.remaining(DAY, "12:00") == 2
+    assert slots.remaining(DAY, "14:00") == 1
+
+
+def test_hold_expires(run):
+    slots = SlotReservations(default_capacity=1, hold_seconds=0)
+
+    assert run(slots.hold(1, DAY, "12:00", 1))
+    assert slots.remaining(DAY, "12:00") == 1
+    assert run(slots.hold(2, DAY, "12:00", 1))
+
+
+def test_confirm_without_hold_takes_free_slot(run):
+    slots = SlotReservations(default_capacity=1)
+
+    assert run(slots.confirm(1, DAY, "12:00", 1))
+    assert slots.remaining(DAY, "12:00") == 0
+    # Подтверждённый заказ не снимается как временный резерв
+    run(slots.release(1))
+    assert slots.remaining(DAY, "12:00") == 0
+
+
+def test_confirm_after_expiry_on_full_slot_overbooks(run):
+    """Оплаченный заказ учитывается, даже если его слот успели занять"""
+    slots = SlotReservations(default_capacity=1, hold_seconds=0)
+    assert run(slots.hold(1, DAY, "12:00", 1))
+
+    slots.hold_seconds = 1800
+    assert run(slots.hold(2, DAY, "12:00", 1))
+    assert not run(slots.confirm(1, DAY, "12:00", 1))
+    assert slots.remaining(DAY, "12:00") == -1
+    assert 1 not in slots._holds
+
+
+def test_stale_heap_entry_keeps_replacing_hold(run):
+    """Истечение заменённого резерва не снимает новый резерв того же клиента"""
+    slots = SlotReservations(default_capacity=1, hold_seconds=0.05)
+    assert run(slots.hold(1, DAY, "12:00", 1))
+    slots.hold_seconds = 1800
+    assert run(slots.hold(1, DAY, "14:00", 1))
+
+    run(asyncio.sleep(0.1))
+    assert slots.remaining(DAY, "14:00") == 0
+    assert run(slots.confirm(1, DAY, "14:00", 1))
+    assert slots.remaining(DAY, "12:00") == 1
+    assert slots.remaining(DAY, "14:00") == 0
+
+
+def test_restore_skips_past_dates():
+    slots = SlotReservations(default_capacity=3)
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+
+    slots.restore(yesterday, "12:00", 2)
+    slots.restore(DAY, "12:00", 2)
+    assert slots._reserved == {(DAY, "12:00"): 2}
+    assert slots.remaining(DAY, "12:00") == 1
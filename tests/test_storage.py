@@ -0,0 +1,110 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.catalog import get_catalog
+from app.states import CheckoutState
+from app.storage import SqliteCartStore, SqliteFSMStorage, SqliteKV, WriteBehindCache
+
+
+def make_cache(tmp_path, max_size=2):
+    return WriteBehindCache(SqliteKV(str(tmp_path / "kv.sqlite3"), "kv"), max_size, flush_interval=3600)
+
+
+def test_dirty_entries_are_not_evicted(run, tmp_path):
+    cache = make_cache(tmp_path)
+    for key in "abcd":
+        cache.set(key, {"key": key})
+    # Несохранённые записи держатся сверх max_size до сброса
+    assert cache.size() == 4
+    assert all(cache.peek(key) == {"key": key} for key in "abcd")
+
+    assert run(cache.flush()) == 4
+    assert cache.size() == 2
+    run(cache.close())
+
+
+def test_get_with_only_dirty_entries(run, tmp_path):
+    """Регрессия: промах кеша, когда все прочие записи грязные, не роняет get() с KeyError"""
+    cache = make_cache(tmp_path)
+    cache.backend.write_many({"zzz": "3"})
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert run(cache.get("zzz")) == 3
+    # Только что прочитанная запись остаётся в кеше, хоть он и переполнен
+    assert cache.peek("zzz") == 3
+    assert run(cache.get("missing")) is None
+    assert run(cache.get("a")) == 1
+    run(cache.close())
+
+
+def test_close_flushes_pending_writes(run, tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("a", {"x": 1})
+    cache.set("b", {"x": 2})
+    cache.delete("b")
+    run(cache.close())
+
+    backend = SqliteKV(str(tmp_path / "kv.sqlite3"), "kv")
+    assert backend.load("a") == {"x": 1}
+    assert backend.load("b") is None
+    backend.close()
+
+
+def test_cart_survives_reload(run, tmp_path):
+    """Корзина, прочитанная заново из SQLite, совпадает с сохранённой"""
+    first, second = get_catalog().cakes[:2]
+    path = str(tmp_path / "carts.sqlite3")
+
+    store = SqliteCartStore(path, cache_size=10, flush_interval=3600, ttl=3600, sweep_interval=3600)
+    run(store.add(1, first.id, 2))
+    cart = run(store.add(1, second.id))
+    run(store.close())
+
+    reopened = SqliteCartStore(path, cache_size=10, flush_interval=3600, ttl=3600, sweep_interval=3600)
+    loaded = run(reopened.get(1))
+    assert loaded.items == cart.items
+    assert (loaded.count, loaded.total) == (cart.count, cart.total)
+    run(reopened.close())
+
+
+def test_expired_checkout_session_reads_empty(run, tmp_path):
+    """Брошенное оформление старше ttl читается как пустое"""
+    storage = SqliteFSMStorage(str(tmp_path / "fsm.sqlite3"), cache_size=10, flush_interval=3600, ttl=0.05)
+    key = StorageKey(bot_id=1, chat_id=1, user_id=1)
+
+    async def scenario():
+        await storage.set_state(key, CheckoutState.phone)
+        await storage.set_data(key, {"full_name": "Тест"})
+        assert await storage.get_state(key) == CheckoutState.phone.state
+        await asyncio.sleep(0.1)
+        assert await storage.get_state(key) is None
+        assert await storage.get_data(key) == {}
+        await storage.close()
+
+    run(scenario())
+    assert storage.stats["expired"] == 1
+
+
+def test_sweep_drops_idle_carts_only(run, tmp_path):
+    """Уборка удаляет простаивающие корзины из базы и из памяти, а недавно открытая остаётся"""
+    cake = get_catalog().cakes[0]
+    store = SqliteCartStore(str(tmp_path / "carts.sqlite3"), cache_size=10, flush_interval=3600,
+                            ttl=0.05, sweep_interval=3600)
+
+    async def scenario():
+        await store.add(1, cake.id)
+        await store.add(2, cake.id, 3)
+        await store._cache.flush()
+        await asyncio.sleep(0.1)
+        # Корзину 2 открыли — она больше не простаивает
+        await store.get(2)
+        assert await store.sweep() == 1
+
+        assert not store.peek(1)
+        assert store._kv.load("1") is None
+        assert (await store.get(1)).items == {}
+        assert (await store.get(2)).items == {cake.id: 3}
+        await store.close()
+
+    run(scenario())
@@ -0,0 +1,52 @@
+import asyncio
+
+from aiogram.types import CallbackQuery, User
+
+from app.throttling import CallbackThrottleMiddleware
+from app.userlock import UserLockMiddleware
+
+USER = User(id=1, is_bot=False, first_name="Тест")
+
+
+def press(data: str) -> CallbackQuery:
+    return CallbackQuery(id=data, from_user=USER, chat_instance="tests", data=data)
+
+
+def test_rapid_add_presses_collapse_into_one_call(run):
+    throttle = CallbackThrottleMiddleware(window=0.05)
+    calls = []
+
+    async def handler(event, data):
+        calls.append((event.data, data["repeat"]))
+
+    async def scenario():
+        await asyncio.gather(*(throttle(handler, press("add:napoleon"), {}) for _ in range(5)))
+
+    run(scenario())
+    assert calls == [("add:napoleon", 5)]
+    assert throttle.stats["coalesced"] == 4
+
+
+def test_other_press_waits_for_pending_add(run):
+    """Нажатие «Корзина» после «В корзину» обрабатывается после склеенного добавления"""
+    throttle = CallbackThrottleMiddleware(window=1.0)
+    locks = UserLockMiddleware()
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.data)
+
+    async def chain(event):
+        # Порядок как в create_dispatcher: склейка, затем очередь пользователя
+        return await throttle(lambda e, d: locks(handler, e, d), event, {"event_from_user": USER})
+
+    async def scenario():
+        add = asyncio.create_task(chain(press("add:napoleon")))
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(chain(press("open:cart")), 0.5)
+        await add
+
+    run(scenario())
+    # Окно склейки закрылось досрочно, а не через секунду
+    assert calls == ["add:napoleon", "open:cart"]
+    assert throttle.stats["flushed"] == 1
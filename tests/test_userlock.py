@@ -0,0 +1,28 @@
+import asyncio
+
+from aiogram.types import User
+
+from app.userlock import UserLockMiddleware
+
+
+def test_updates_of_one_user_run_one_at_a_time(run):
+    locks = UserLockMiddleware()
+    log = []
+
+    async def handler(event, data):
+        log.append(("start", event))
+        await asyncio.sleep(0.01)
+        log.append(("end", event))
+
+    async def scenario():
+        first, second = ({"event_from_user": User(id=1, is_bot=False, first_name="Тест")} for _ in range(2))
+        other = {"event_from_user": User(id=2, is_bot=False, first_name="Другой")}
+        await asyncio.gather(locks(handler, "a", first), locks(handler, "b", second), locks(handler, "c", other))
+
+    run(scenario())
+    own = [entry for entry in log if entry[1] != "c"]
+    assert own == [("start", "a"), ("end", "a"), ("start", "b"), ("end", "b")]
+    # Другой пользователь не ждёт в чужой очереди
+    assert log.index(("start", "c")) < log.index(("end", "a"))
+    assert locks.stats["waited"] == 1
+    assert locks.metrics()["active_users"] == 0